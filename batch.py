@@ -0,0 +1,303 @@
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from engine import (
+    AGENT_COLUMNS, CONTRACT_COLUMNS, OPTIONAL_CONTRACT_COLUMNS, SUM_COLUMNS, agent_context, agent_positions, agent_summary,
+    contract_base, contract_commissions, contract_months_between, int_bincount, resolve_tiers,
+)
+from master import MasterIndex, load_master_index
+
+# =========================
+# 원장 컬럼 정규화 (상품 마스터 _norm과 동일한 방식)
+# =========================
+LEDGER_ALIASES = {
+    "agent_id": ["agent_id", "agent", "설계사", "설계사코드", "설계사id", "사번"],
+    "위임년월": ["위임년월", "위임월", "appointed", "appoint_ym", "ym"],
+    "product": ["상품명", "product", "상품"],
+    "type": ["유형", "type", "상품유형"],
+    "pay_year": ["납기", "납입", "납입년도", "pay_year", "payyears", "납입년수"],
+    "premium": ["월초보험료", "월초", "premium", "보험료"],
+    "sale_date": ["계약일", "판매일", "청약일", "sale_date", "contract_date"],
+    "contract_id": ["contract_id", "증권번호", "계약번호", "policy_no"],
+    "std_activity": ["표준활동", "std_activity", "표준활동달성"],
+    "retention_1st": ["retention_1st", "당월유지율"],
+    "retention_13th": ["retention_13th", "13회차유지율"],
+    "retention_25th": ["retention_25th", "25회차유지율"],
+    "refund_p": ["refund_p", "환수성적", "당월예상환수성적"],
+    "refund_amt": ["refund_amt", "환수금", "당월예상환수금"],
+    "direct_recruits": ["direct_recruits", "직도입", "직도입인원"],
+    "branch": ["지점", "지점명", "branch"],
+}
+_ALIAS_LOOKUP = {a.lower().replace(" ", ""): std for std, alts in LEDGER_ALIASES.items() for a in alts}
+
+CONTRACT_REQUIRED = {"agent_id", "product", "type", "pay_year", "premium"}
+# 배치 출력의 문자열 키 컬럼 (숫자처럼 보여도 문자열 그대로: 증권번호 "0008460187"의 앞자리 0 등)
+TEXT_COLUMNS = ["agent_id", "contract_id", "product", "type", "pay_year", "sale_date"]
+AGENT_INPUT_COLUMNS = ["위임년월"] + AGENT_COLUMNS[1:]  # 원장의 설계사 입력 (위임년월 또는 year/month)
+TRUE_TOKENS = ["Y", "YES", "1", "TRUE", "O"]
+
+def ledger_column(name) -> str:
+    return _ALIAS_LOOKUP.get(str(name).strip().lower().replace(" ", ""), name)
+
+def normalize_ledger_columns(df: pd.DataFrame) -> pd.DataFrame:
+    return df.rename(columns={c: ledger_column(c) for c in df.columns})
+
+def _to_number(s: pd.Series, default=0) -> pd.Series:
+    # "1,500,000" 같은 콤마 입력 허용, 빈 값은 default
+    if s.dtype == object or pd.api.types.is_string_dtype(s):
+        s = s.astype(str).str.replace(r"[^0-9.\-]", "", regex=True)
+    s = pd.to_numeric(s, errors="coerce")
+    return s.where(s.notna(), default)
+
+def prepare_contracts(df: pd.DataFrame) -> pd.DataFrame:
+    df = normalize_ledger_columns(df)
+    missing = CONTRACT_REQUIRED - set(df.columns)
+    if missing:
+        raise ValueError(f"원장에 필수 컬럼이 없습니다: {sorted(missing)}")
+    for col in ["product", "type", "pay_year"]:
+        df[col] = df[col].astype(str).str.strip()
+    df["agent_id"] = df["agent_id"].astype(str).str.strip()
+    if "contract_id" in df.columns:
+        df["contract_id"] = df["contract_id"].astype(str).str.strip()
+    df["premium"] = _to_number(df["premium"]).astype(np.int64)
+    return df
+
+def prepare_agents(df: pd.DataFrame, as_of: datetime = None, tiers=None) -> pd.DataFrame:
+    # 화면 입력값(표준활동/유지율/환수/직도입)을 엔진 입력으로 정리, 없는 값은 화면 기본값
+    df = normalize_ledger_columns(df)
+    if "agent_id" not in df.columns or ("위임년월" not in df.columns and not {"year", "month"} <= set(df.columns)):
+        raise ValueError("설계사 입력에는 agent_id와 위임년월(또는 year/month)이 필요합니다.")
+    out = pd.DataFrame({"agent_id": df["agent_id"].astype(str).str.strip()})
+    if "위임년월" in df.columns:
+        ym = df["위임년월"].astype(str).str.replace(r"[^0-9]", "", regex=True)
+        out["year"] = pd.to_numeric(ym.str[:4], errors="coerce").fillna(0).astype(int)
+        out["month"] = pd.to_numeric(ym.str[4:6], errors="coerce").fillna(1).astype(int)
+    else:
+        out["year"] = _to_number(df["year"]).astype(int)
+        out["month"] = _to_number(df["month"]).astype(int)
+
+    months = contract_months_between(out["year"].to_numpy(), out["month"].to_numpy(), as_of)
+    std_now = resolve_tiers(tiers, as_of).std_retention(months)
+    defaults = {
+        "retention_1st": np.nan_to_num(std_now, nan=0.0),
+        "retention_13th": 85, "retention_25th": 85,
+        "refund_p": 0, "refund_amt": 0, "direct_recruits": 0,
+    }
+    if "std_activity" in df.columns:
+        out["std_activity"] = df["std_activity"].astype(str).str.upper().str.strip().isin(TRUE_TOKENS).to_numpy()
+    else:
+        out["std_activity"] = False
+    for col, default in defaults.items():
+        out[col] = _to_number(df[col].reset_index(drop=True), default).to_numpy() if col in df.columns else default
+    return out[AGENT_COLUMNS].reset_index(drop=True)
+
+# =========================
+# 청크 스트리밍
+# =========================
+def iter_ledger(path: str, chunksize: int, encoding: str = "utf-8-sig", columns: list = None):
+    # columns: 필요한 표준 컬럼만 읽기 (별칭 헤더 포함, None이면 전체)
+    # "portfolios.db#YYYY-MM" → 포트폴리오 저장소의 해당 기준월 (CSV 원장과 같은 컬럼)
+    # "<원장 디렉터리>#YYYY-MM[/지점,...]" → 컬럼형 파티션 원장 (ledger.py, 해당 파티션·컬럼만)
+    from ledger import iter_partitions, parse_ledger_ref
+    from store import PortfolioStore, parse_store_ref
+    ref = parse_ledger_ref(path)
+    if ref is not None:
+        yield from iter_partitions(ref[0], ref[1], chunksize, ref[2], columns)
+        return
+    ref = parse_store_ref(path)
+    if ref is not None:
+        yield from PortfolioStore(ref[0]).iter_ledger(ref[1], chunksize)
+        return
+    usecols = None if columns is None else (lambda c: ledger_column(c) in columns)
+    with pd.read_csv(path, chunksize=chunksize, dtype=str, encoding=encoding, keep_default_na=False, usecols=usecols) as reader:
+        for chunk in reader:
+            yield chunk
+
+def ledger_columns(agent_inputs: bool, extra_columns=()) -> list:
+    # 배치가 원장에서 읽는 컬럼 (설계사 입력 파일이 따로 있으면 계약 컬럼만)
+    return CONTRACT_COLUMNS + OPTIONAL_CONTRACT_COLUMNS + (AGENT_INPUT_COLUMNS if agent_inputs else []) + list(extra_columns)
+
+def iter_table(path: str, chunksize: int, columns: list = None):
+    # 배치 출력 (.csv/.parquet) 청크 읽기, columns=None이면 전체 컬럼 (경로 대신 CSV 파일 객체도 가능)
+    if str(path).lower().endswith((".parquet", ".pq")):
+        import pyarrow.parquet as pq
+        for b in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield b.to_pandas()
+    else:
+        dtype = {c: str for c in TEXT_COLUMNS}
+        with pd.read_csv(path, chunksize=chunksize, usecols=columns, encoding="utf-8-sig", dtype=dtype) as reader:
+            for chunk in reader:
+                text = [c for c in TEXT_COLUMNS if c in chunk.columns]
+                chunk[text] = chunk[text].fillna("")  # 빈 키는 원장과 같이 "" (NaN이면 "nan"으로 대사됨)
+                yield chunk
+
+class Progress:
+    def __init__(self, label: str, enabled: bool = True, stream=sys.stderr):
+        self.label, self.enabled, self.stream = label, enabled, stream
+        self.rows = 0
+        self.t0 = time.perf_counter()
+
+    def update(self, n: int):
+        self.rows += n
+        if self.enabled:
+            dt = max(time.perf_counter() - self.t0, 1e-9)
+            self.stream.write(f"\r[{self.label}] {self.rows:,} rows  {self.rows / dt:,.0f} rows/s")
+            self.stream.flush()
+
+    def done(self):
+        if self.enabled:
+            dt = time.perf_counter() - self.t0
+            self.stream.write(f"\r[{self.label}] {self.rows:,} rows in {dt:,.1f}s\n")
+            self.stream.flush()
+
+class TableWriter:
+    # 확장자(.csv / .parquet)에 따라 청크 단위로 이어쓰기
+    def __init__(self, path: str):
+        self.path = path
+        self.kind = "parquet" if path.lower().endswith((".parquet", ".pq")) else "csv"
+        self._pq = None
+        self._first = True
+
+    def write(self, df: pd.DataFrame):
+        if self.kind == "csv":
+            df.to_csv(self.path, mode="w" if self._first else "a", header=self._first, index=False, encoding="utf-8-sig" if self._first else "utf-8")
+        else:
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError as exc:
+                raise RuntimeError("Parquet 출력에는 pyarrow가 필요합니다.") from exc
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._pq is None:
+                self._pq = pq.ParquetWriter(self.path, table.schema)
+            self._pq.write_table(table.cast(self._pq.schema))
+        self._first = False
+
+    def close(self):
+        if self._pq is not None:
+            self._pq.close()
+        elif self._first and self.kind == "csv":
+            open(self.path, "w").close()
+
+# =========================
+# 2-pass 배치: (1) 설계사 집계 → (2) 계약별 산출 스트리밍
+# =========================
+def collect_agents(ledger_path: str, chunksize: int, master, agents_path: str = None, as_of: datetime = None,
+                   progress: bool = True, tiers=None):
+    # pass 1: 설계사별 환산 합계/전략건강 건수 (메모리 = 설계사 수에 비례)
+    prog = Progress("pass1", progress)
+    totals, agent_rows, seen = None, [], set()
+    for chunk in iter_ledger(ledger_path, chunksize, columns=ledger_columns(agents_path is None)):
+        contracts = prepare_contracts(chunk)
+        base = contract_base(contracts, master, as_of, tiers)
+        sums = pd.DataFrame({"agent_id": contracts["agent_id"], "y1": base["y1"], "sh": base["sh_count"]}).groupby("agent_id", sort=False).sum()
+        totals = sums if totals is None else totals.add(sums, fill_value=0).astype({"y1": np.int64})
+        if agents_path is None:
+            first = contracts.drop_duplicates("agent_id")
+            first = first[~first["agent_id"].isin(seen)]
+            seen.update(first["agent_id"])
+            agent_rows.append(first)
+        prog.update(len(chunk))
+    prog.done()
+
+    if agents_path is not None:
+        agents = prepare_agents(pd.read_csv(agents_path, dtype=str, encoding="utf-8-sig", keep_default_na=False), as_of, tiers)
+    elif agent_rows:
+        agents = prepare_agents(pd.concat(agent_rows, ignore_index=True), as_of, tiers)
+    else:
+        agents = prepare_agents(pd.DataFrame(columns=["agent_id", "위임년월"]), as_of, tiers)
+    if not agents["agent_id"].is_unique:
+        raise ValueError("설계사 입력의 agent_id가 중복되었습니다.")
+
+    if totals is None:
+        return agents, np.zeros(len(agents), dtype=np.int64), np.zeros(len(agents))
+    totals = totals.reindex(agents["agent_id"], fill_value=0)
+    return agents, totals["y1"].to_numpy(dtype=np.int64), totals["sh"].to_numpy(dtype=float)
+
+def load_master(master_path: str) -> MasterIndex:
+    index = load_master_index(master_path)
+    if index is None:
+        raise FileNotFoundError(f"상품 마스터를 읽을 수 없습니다: {master_path}")
+    return index
+
+def run_batch(ledger_path: str, master_path: str, out_contracts: str, out_agents: str,
+              agents_path: str = None, chunksize: int = 200_000, as_of: datetime = None, progress: bool = True,
+              master: MasterIndex = None, extra_columns=(), tiers=None):
+    if master is None:
+        master = load_master(master_path)
+    tiers = resolve_tiers(tiers, as_of)  # 실행 중 규정 교체와 무관하게 1개 버전 고정
+
+    agents, total_converted_raw, total_sh_count = collect_agents(ledger_path, chunksize, master, agents_path, as_of, progress, tiers)
+    ctx = agent_context(agents, total_converted_raw, total_sh_count, as_of, tiers)
+    n = len(agents)
+    sums = {c: np.zeros(n, dtype=np.int64) for c in SUM_COLUMNS}
+
+    # pass 2: 계약별 수수료를 청크 단위로 기록하면서 설계사 합계 누적
+    prog = Progress("pass2", progress)
+    writer = TableWriter(out_contracts) if out_contracts else None
+    try:
+        for chunk in iter_ledger(ledger_path, chunksize, columns=ledger_columns(False, extra_columns)):
+            contracts = prepare_contracts(chunk)
+            contracts = contracts[CONTRACT_COLUMNS + [c for c in OPTIONAL_CONTRACT_COLUMNS if c in contracts.columns] + list(extra_columns)]
+            pos = agent_positions(agents["agent_id"], contracts["agent_id"])
+            per_contract = contract_commissions(contracts, contract_base(contracts, master, as_of, tiers), pos, ctx)
+            for c in SUM_COLUMNS:
+                sums[c] += int_bincount(pos, per_contract[c].to_numpy(), n)
+            if writer is not None:
+                writer.write(per_contract)
+            prog.update(len(chunk))
+    finally:
+        if writer is not None:
+            writer.close()
+    prog.done()
+
+    per_agent = agent_summary(agents, ctx, sums, as_of, tiers)
+    if out_agents:
+        agent_writer = TableWriter(out_agents)
+        agent_writer.write(per_agent)
+        agent_writer.close()
+    return per_agent
+
+# =========================
+# CLI
+# =========================
+def _parse_as_of(text: str) -> datetime:
+    return datetime.strptime(text, "%Y-%m")
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="DB생명 수수료 배치 계산 (계약 원장 → 설계사/계약별 수수료)")
+    p.add_argument("ledger", help="계약 원장 CSV (agent_id, 위임년월, 상품명, 유형, 납기, 월초보험료, ...), 저장소 portfolios.db#YYYY-MM 또는 파티션 원장 data/ledger#YYYY-MM[/지점,...]")
+    p.add_argument("--agents", help="설계사 입력 CSV (없으면 원장의 설계사 컬럼 사용)")
+    p.add_argument("--master", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "product_master.csv"))
+    p.add_argument("--out-agents", default="agent_commissions.csv", help=".csv 또는 .parquet")
+    p.add_argument("--out-contracts", default="contract_commissions.csv", help=".csv 또는 .parquet (빈 값이면 생략)")
+    p.add_argument("--chunksize", type=int, default=200_000)
+    p.add_argument("--as-of", type=_parse_as_of, help="기준 년월 YYYY-MM (기본: 오늘)")
+    p.add_argument("--workers", type=int, default=1, help="프로세스 수 (0=전체 코어, 1=단일 프로세스)")
+    p.add_argument("--shards", type=int, help="설계사 샤드 수 (기본: 워커 수 × 4)")
+    p.add_argument("--quiet", action="store_true", help="진행률 출력 생략")
+    return p
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.workers != 1:
+        from parallel import run_batch_parallel
+        run_batch_parallel(
+            args.ledger, args.master, args.out_contracts or None, args.out_agents,
+            agents_path=args.agents, chunksize=args.chunksize, as_of=args.as_of, progress=not args.quiet,
+            workers=args.workers or None, shards=args.shards,
+        )
+        return
+    run_batch(
+        args.ledger, args.master, args.out_contracts or None, args.out_agents,
+        agents_path=args.agents, chunksize=args.chunksize, as_of=args.as_of, progress=not args.quiet,
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from engine import AGENT_COLUMNS, compute_commissions, compute_single
+from incremental import Portfolio
+from master import load_master_index, read_products_tree
+from memo import LRUCache
+
+# =========================
+# 성능 기준선 (엔진 / 마스터 로드 / 화면 재실행)
+#   합성 포트폴리오: product_master.csv의 (상품, 유형, 납기) 조합에서 균등 추출, 시드 고정
+#     설계사당 1 / 50 / 500건 × 설계사 1천 ~ 100만 명 (총 계약 수 --max-contracts 이하만)
+#   케이스별 warmup 1회 후 repeat회 측정 → 중앙값/최소/p95 (초)
+#   기준선 JSON: 케이스별 중앙값 + 보정값(calibration, 같은 기계 속도 기준)
+#     비교 시 (중앙값 / 보정값) 비율이 기준선 대비 threshold배를 넘으면 회귀 → 종료 코드 1
+#   화면 재실행은 Streamlit AppTest로 demo2.py를 브라우저 없이 실행 (계약 n건 입력 후 rerun)
+# =========================
+HERE = os.path.dirname(os.path.abspath(__file__))
+MASTER_CSV = os.path.join(HERE, "data", "product_master.csv")
+BASELINE_PATH = os.path.join(HERE, "bench_baseline.json")
+AS_OF = datetime(2025, 8, 1)
+PER_AGENT = (1, 50, 500)
+AGENT_COUNTS = (1_000, 10_000, 100_000, 1_000_000)
+SINGLE_SIZES = (1, 50, 500)
+APP_SIZES = (0, 50, 500)
+THRESHOLD = 1.25
+SUITES = {
+    "quick": {"max_contracts": 500_000, "repeat": 3, "app": (0, 50)},
+    "full": {"max_contracts": 20_000_000, "repeat": 5, "app": APP_SIZES},
+}
+
+# =========================
+# 합성 데이터
+# =========================
+def product_combos(master) -> list:
+    # (상품, 유형, 납기) 전체 조합 (마스터 트리 순서)
+    tree = master.tree()
+    return [(p, t, py) for p in tree for t in tree[p] for py in tree[p][t]["payyears"]]
+
+def synthetic_contracts(combos: list, n_agents: int, per_agent: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    n = n_agents * per_agent
+    pick = rng.integers(0, len(combos), n)
+    products, types, pays = (np.array(col, dtype=object) for col in zip(*combos))
+    return pd.DataFrame({
+        "agent_id": np.repeat(np.arange(n_agents), per_agent),
+        "product": products[pick],
+        "type": types[pick],
+        "pay_year": pays[pick],
+        "premium": rng.integers(1, 300, n) * 1_000,
+    })
+
+def synthetic_agents(n_agents: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed + 1)
+    return pd.DataFrame({
+        "agent_id": np.arange(n_agents),
+        "year": rng.integers(2015, 2026, n_agents),
+        "month": rng.integers(1, 13, n_agents),
+        "std_activity": rng.random(n_agents) < 0.5,
+        "retention_1st": rng.integers(60, 101, n_agents),
+        "retention_13th": rng.integers(60, 101, n_agents),
+        "retention_25th": rng.integers(60, 101, n_agents),
+        "refund_p": 0, "refund_amt": 0,
+        "direct_recruits": rng.integers(0, 3, n_agents),
+    }, columns=AGENT_COLUMNS)
+
+def synthetic_entries(combos: list, n: int, seed: int = 0) -> list:
+    df = synthetic_contracts(combos, 1, n, seed)
+    return [{"id": i + 1, **r} for i, r in enumerate(df.drop(columns="agent_id").to_dict("records"))]
+
+# =========================
+# 측정
+# =========================
+def timed(fn, repeat: int, setup=None) -> dict:
+    # setup()은 측정 밖에서 매회 실행, 반환값을 fn에 전달
+    args = setup() if setup else None
+    fn(args) if setup else fn()  # warmup
+    times = []
+    for _ in range(repeat):
+        args = setup() if setup else None
+        t0 = time.perf_counter()
+        fn(args) if setup else fn()
+        times.append(time.perf_counter() - t0)
+    times = np.array(times)
+    return {"median": float(np.median(times)), "min": float(times.min()), "p95": float(np.percentile(times, 95)), "repeat": repeat}
+
+def calibrate(repeat: int = 5) -> float:
+    # 기계 속도 보정: 파이썬 루프 + numpy 정렬 (엔진 경로와 비슷한 혼합)
+    rng = np.random.default_rng(0)
+    x = rng.random(500_000)
+
+    def work():
+        s = 0
+        for i in range(200_000):
+            s += i % 7
+        np.sort(x)
+        pd.Series(x).groupby((x * 100).astype(int)).sum()
+    return timed(work, repeat)["median"]
+
+# 케이스 = (이름, 실행 함수) — --only로 거른 케이스는 데이터 생성도 하지 않음
+def engine_cases(master, combos: list, max_contracts: int, repeat: int):
+    def batch(n_agents, per):
+        if n_agents * per > max_contracts:
+            return {"skipped": f"{n_agents * per:,} contracts > max {max_contracts:,}"}
+        contracts, agents = synthetic_contracts(combos, n_agents, per), synthetic_agents(n_agents)
+        return {**timed(lambda: compute_commissions(contracts, agents, master, AS_OF), repeat), "contracts": len(contracts)}
+
+    def single(n):
+        entries, agent = synthetic_entries(combos, n), synthetic_agents(1).iloc[0].to_dict()
+        return timed(lambda: compute_single(entries, agent, master, AS_OF), repeat)
+
+    def portfolio(n):
+        # 증분 계산기 (캐시 비어 있는 새 세션: sync + 요약 + 계약별)
+        entries, agent = synthetic_entries(combos, n), synthetic_agents(1).iloc[0].to_dict()
+
+        def run(pf):
+            pf.sync(entries)
+            pf.agent_result(agent)
+            pf.contract_results(agent)
+        return timed(run, repeat, lambda: Portfolio(master, AS_OF, contract_cache=LRUCache(10_000), agent_cache=LRUCache(100)))
+
+    for n_agents in AGENT_COUNTS:
+        for per in PER_AGENT:
+            yield f"engine/batch/{n_agents}x{per}", lambda a=n_agents, p=per: batch(a, p)
+    for n in SINGLE_SIZES:
+        yield f"engine/single/{n}", lambda n=n: single(n)
+        yield f"portfolio/cold/{n}", lambda n=n: portfolio(n)
+
+def master_cases(repeat: int):
+    def sidecar():
+        load_master_index(MASTER_CSV)  # 사이드카 생성
+        return timed(lambda: load_master_index(MASTER_CSV).tree(), repeat)
+    yield "master/parse_compile", lambda: timed(lambda: read_products_tree(MASTER_CSV), repeat)
+    yield "master/sidecar_load", sidecar
+
+def app_cases(combos: list, sizes, repeat: int):
+    # demo2.py 전체 재실행 (상대 경로 ./data 기준이라 저장소 루트에서 실행)
+    def rerun(n):
+        from streamlit.testing.v1 import AppTest
+        cwd = os.getcwd()
+        os.chdir(HERE)
+        try:
+            at = AppTest.from_file(os.path.join(HERE, "demo2.py"), default_timeout=120)
+            at.run()
+            if n:
+                lines = ["상품명\t유형\t납기\t월초"] + [
+                    f"{e['product']}\t{e['type']}\t{e['pay_year']}\t{e['premium']}" for e in synthetic_entries(combos, n)
+                ]
+                at.text_area(key="bulk_paste").set_value("\n".join(lines)).run()
+                at.button(key="bulk_add").click().run()
+            if at.exception:
+                raise RuntimeError(f"demo2.py 실행 오류: {at.exception[0].message}")
+            return timed(at.run, repeat)
+        finally:
+            os.chdir(cwd)
+
+    for n in sizes:
+        yield f"app/rerun/{n}", lambda n=n: rerun(n)
+
+# =========================
+# 기준선 비교
+# =========================
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    # → [(케이스, 기준선 대비 배율, 허용 배율)] 중 회귀만
+    scale = results["calibration"] / baseline["calibration"]
+    out = []
+    for name, cur in results["cases"].items():
+        base = baseline["cases"].get(name)
+        if not base or "median" not in base or "median" not in cur:
+            continue
+        ratio = cur["median"] / (base["median"] * scale)
+        limit = base.get("threshold", threshold)
+        if ratio > limit:
+            out.append((name, ratio, limit))
+    return out
+
+def run_suite(suite: str, only: str = None, app: bool = True, max_contracts: int = None) -> dict:
+    cfg = SUITES[suite]
+    master = load_master_index(MASTER_CSV)
+    combos = product_combos(master)
+    results = {
+        "created": datetime.now().isoformat(timespec="seconds"), "suite": suite,
+        "python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count(),
+        "calibration": calibrate(), "cases": {},
+    }
+    groups = [master_cases(cfg["repeat"]), engine_cases(master, combos, max_contracts or cfg["max_contracts"], cfg["repeat"])]
+    if app:
+        groups.append(app_cases(combos, cfg["app"], cfg["repeat"]))
+    for group in groups:
+        for name, run in group:
+            if only and only not in name:
+                continue
+            results["cases"][name] = res = run()
+            print(f"{name:<32} " + (f"median {res['median'] * 1000:10.2f} ms  p95 {res['p95'] * 1000:10.2f} ms" if "median" in res else res["skipped"]), flush=True)
+    return results
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="수수료 엔진 / 마스터 로드 / 화면 재실행 성능 기준선")
+    p.add_argument("--suite", choices=sorted(SUITES), default="quick")
+    p.add_argument("--only", help="케이스 이름 일부 (예: engine/batch)")
+    p.add_argument("--max-contracts", type=int, help="배치 케이스 총 계약 수 상한 (기본: 스위트 설정)")
+    p.add_argument("--no-app", action="store_true", help="AppTest 화면 재실행 생략")
+    p.add_argument("--baseline", default=BASELINE_PATH, help="비교할 기준선 JSON")
+    p.add_argument("--save-baseline", action="store_true", help="이번 결과를 기준선으로 저장 (비교 생략)")
+    p.add_argument("--threshold", type=float, default=THRESHOLD, help="허용 배율 (케이스별 threshold가 있으면 그 값)")
+    p.add_argument("--out", help="이번 결과 JSON 저장 경로")
+    return p
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    results = run_suite(args.suite, args.only, not args.no_app, args.max_contracts)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"기준선 저장 → {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"기준선 없음 ({args.baseline}) — --save-baseline으로 먼저 저장하세요")
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    for name, ratio, limit in regressions:
+        print(f"회귀: {name} 기준선 대비 {ratio:.2f}배 (허용 {limit:.2f}배)")
+    if not regressions:
+        print("회귀 없음")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
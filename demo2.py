@@ -2,9 +2,21 @@ import streamlit as st
 from datetime import datetime
 import re
 import base64
+import hmac
 import os
+import numpy as np
 import pandas as pd
-from io import StringIO
+
+from editor import Entry, EditorOptions, entries_page, import_entries, new_entry, page_count, read_contract_table
+from engine import std_retention
+from incremental import Portfolio
+from master import MasterStore
+from memo import AGENT_RESULTS, LRUCache, cache_stats, input_key
+from metrics import APP_EXPORTER, APP_METRICS, PROFILERS, SESSION_BUDGET_BYTES, Profiler, StageClock, approx_size, process_rss
+from solver import products_for_agent, solve_next_tier
+from statements import PAY_CONDITIONS, contract_sections, init2_reasons, next_month_items, settle_reasons, summary_items
+from store import PortfolioStore, month_key
+from tiers import default_tiers
 
 # =========================
 # 기본 설정
@@ -20,12 +32,34 @@ st.markdown(
     unsafe_allow_html=True
 )
 
+# =========================
+# 실행 계측 (단계별 시간 · 세션별 실행 횟수 · 선택 시 프로파일, 관리자 화면에서 확인)
+# =========================
+CLOCK = StageClock(APP_METRICS)
+st.session_state.reruns = st.session_state.get("reruns", 0) + 1
+APP_METRICS.incr("reruns")
+if st.session_state.reruns == 1:
+    APP_METRICS.incr("sessions")
+# 직전 실행이 st.stop() · 새 실행 요청으로 끊겨 프로파일러가 켜진 채 남았으면 먼저 해제 (남아 있으면 이후 캡처가 모두 건너뜀)
+LEAKED = st.session_state.pop("profiler_active", None)
+if LEAKED is not None:
+    st.session_state.profile_report = LEAKED.stop()
+PROFILER = Profiler(st.session_state.get("profile_mode", PROFILERS[0])) if st.session_state.get("profile_next") else None
+if PROFILER is not None:
+    st.session_state.profiler_active = PROFILER
+    PROFILER.start()
+
+# 로고는 프로세스당 1회만 읽어 base64로 보관 (세션/실행마다 파일 읽기·인코딩 없음)
+@st.cache_resource(show_spinner=False)
+def logo_base64(logo_path: str) -> str:
+    with open(logo_path, "rb") as f:
+        return base64.b64encode(f.read()).decode("utf-8")
+
 def render_title_with_logo_right(logo_path: str, title_text: str, logo_width: int = 100):
     try:
         if not os.path.exists(logo_path):
             raise FileNotFoundError(logo_path)
-        with open(logo_path, "rb") as f:
-            b64 = base64.b64encode(f.read()).decode("utf-8")
+        b64 = logo_base64(logo_path)
         st.markdown(
             f"""
             <div style="display:flex; align-items:center; justify-content:space-between; margin-bottom:6px; border-bottom:1px solid #ddd; padding-bottom:4px;">
@@ -39,6 +73,7 @@ def render_title_with_logo_right(logo_path: str, title_text: str, logo_width: in
         st.title(f"📊 {title_text}")
 
 render_title_with_logo_right("DB_logo.png", "당월 수수료 계산기", 120)
+CLOCK.lap("title")
 
 def SP(px: int = 16):
     st.markdown(f"<div style='height:{px}px'></div>", unsafe_allow_html=True)
@@ -54,6 +89,60 @@ if "entry_seq" not in st.session_state:
     st.session_state.entry_seq = 0
 if "product_selector" not in st.session_state:
     st.session_state.product_selector = "— 상품을 선택하세요 —"
+# 입력 위젯 기본값 (저장소에서 불러온 값으로 덮어쓸 수 있도록 위젯 인자 대신 세션 상태로)
+for _key, _default in {"year_select": 2025, "month_select": 8, "std_activity": False, "direct_recruits": 0}.items():
+    if _key not in st.session_state:
+        st.session_state[_key] = _default
+
+# =========================
+# 포트폴리오 저장소 (설계사 코드 × 기준월, 새로고침/재시작 후에도 유지 · 배치와 같은 파일)
+#   주소의 ?agent=… 로 새 세션에서 자동으로 불러오고, 입력이 바뀌면 실행 끝에 자동 저장
+# =========================
+STORE_PATH = os.environ.get("COMMISSION_STORE", "./data/portfolios.db")
+STORE_MONTH = month_key(datetime.today())
+
+@st.cache_resource(show_spinner=False)
+def get_store(path: str) -> PortfolioStore:
+    return PortfolioStore(path)
+
+STORE = get_store(STORE_PATH)
+
+def load_portfolio(agent_id: str):
+    # 저장된 입력값/계약을 위젯 상태와 entries로 (없으면 현재 입력을 그 설계사로 새로 저장)
+    inputs, rows = STORE.load(agent_id, STORE_MONTH)
+    st.session_state.store_agent = agent_id
+    st.query_params["agent"] = agent_id
+    if inputs is None:
+        st.session_state.store_sig = None
+        return
+    ss = st.session_state
+    ss.entries = [Entry(*r) for r in rows]
+    ss.entry_seq = max((e.id for e in ss.entries), default=0)
+    ss.entries_page, ss.editor_rev = 0, ss.get("editor_rev", 0) + 1
+    ss.pop("portfolio_key", None)
+    if 1989 <= inputs.get("year", 0) <= 2025 and 1 <= inputs.get("month", 0) <= 12:
+        ss.year_select, ss.month_select = inputs["year"], inputs["month"]
+        ss._ret_anchor = (inputs["year"], inputs["month"])
+    ss.std_activity = inputs.get("std_activity", False)
+    for key in ("retention_1st", "retention_13th", "retention_25th"):
+        if key in inputs:
+            ss[f"{key}_val"] = int(inputs[key])
+    for key in ("refund_p", "refund_amt"):
+        ss[f"{key}_text"] = f"{int(inputs.get(key, 0)):,}" if inputs.get(key) else ""
+    ss.direct_recruits = int(inputs.get("direct_recruits", 0))
+    ss.store_sig = None
+    ss.store_loaded = len(rows)
+
+def on_store_agent():
+    agent_id = st.session_state.store_agent_input.strip()
+    if agent_id:
+        load_portfolio(agent_id)
+
+if "store_agent" not in st.session_state:
+    st.session_state.store_agent = None
+    if st.query_params.get("agent"):
+        st.session_state.store_agent_input = st.query_params["agent"]
+        load_portfolio(st.query_params["agent"])
 
 # =========================
 # 유틸: 통화 입력(3자리 콤마)
@@ -76,7 +165,22 @@ def currency_input(label: str, key: str, default: int = 0, label_visibility: str
 # 기본 정보 입력
 # =========================
 st.subheader("📝 기본 정보 입력")
-SP(25)
+SP(10)
+
+c_agent, c_store = st.columns([0.3, 0.7])
+with c_agent:
+    st.text_input("설계사 코드 (저장/불러오기)", key="store_agent_input", on_change=on_store_agent, placeholder="예: A0001")
+with c_store:
+    SP(28)
+    if st.session_state.store_agent:
+        loaded = st.session_state.pop("store_loaded", None)
+        st.caption(
+            f"💾 {st.session_state.store_agent} · {STORE_MONTH} 포트폴리오"
+            + (f" — 저장된 계약 {loaded:,}건을 불러왔습니다" if loaded is not None else " — 변경 내용은 자동 저장됩니다")
+        )
+    else:
+        st.caption("설계사 코드를 입력하면 입력 내용이 저장되어 새로고침 후에도 유지됩니다")
+SP(15)
 
 st.markdown("<div style='font-size:1.08rem; font-weight:700;'>✔️위임년월 입력</div>", unsafe_allow_html=True)
 SP(12)
@@ -86,12 +190,12 @@ c_year, c_gap, c_month, c_fill = st.columns([0.22, 0.02, 0.18, 0.58])
 with c_year:
     y_col, _ = st.columns([0.45, 0.55])
     with y_col:
-        year = st.selectbox("위임년도", options=years, index=0, key="year_select")
+        year = st.selectbox("위임년도", options=years, key="year_select")
 with c_gap: st.write("")
 with c_month:
     m_col, _ = st.columns([0.45, 0.55])
     with m_col:
-        month = st.selectbox("위임월", options=list(range(1, 13)), index=7, key="month_select")
+        month = st.selectbox("위임월", options=list(range(1, 13)), key="month_select")
 with c_fill: st.write("")
 
 st.markdown("""
@@ -104,7 +208,7 @@ div[data-testid="stSelectbox"]:has(#month_select) { width: 90px !important; }
 SP(20)
 st.markdown("<div style='font-size:1.08rem; font-weight:700;'>✔️표준활동 입력</div>", unsafe_allow_html=True)
 SP(8)
-std_activity = st.checkbox("당월 표준활동 달성 여부", value=False)
+std_activity = st.checkbox("당월 표준활동 달성 여부", key="std_activity")
 
 SP(20)
 st.markdown("<div style='font-size:1.08rem; font-weight:700;'>✔️유지율 입력</div>", unsafe_allow_html=True)
@@ -113,15 +217,9 @@ SP(8)
 today = datetime.today()
 contract_months_now = (today.year - year) * 12 + (today.month - month) + 1  # 1=1차월 ...
 
-def _std_retention(month_idx: int):
-    if month_idx <= 2:  return None
-    elif month_idx <= 6:  return 93
-    elif month_idx <= 12: return 90
-    else:                 return 85
-
-_std_now_dynamic = _std_retention(contract_months_now)
-_std_13 = _std_retention(13)
-_std_25 = _std_retention(25)
+_std_now_dynamic = std_retention(contract_months_now)
+_std_13 = std_retention(13)
+_std_25 = std_retention(25)
 
 if "_ret_anchor" not in st.session_state:
     st.session_state._ret_anchor = (year, month)
@@ -159,449 +257,283 @@ with cA:
 with cB:
     refund_amt = currency_input("당월 예상 환수금 (* 모집+성과1+초기2 환수금)", key="refund_amt", default=0)
 with cC:
-    direct_recruits = st.number_input("당월 직도입 인원(명)", min_value=0, max_value=99, value=0, step=1)
+    direct_recruits = st.number_input("당월 직도입 인원(명)", min_value=0, max_value=99, step=1, key="direct_recruits")
 
 st.markdown("---")
+CLOCK.lap("inputs")
 
 # =========================
 # [변경] 백엔드에서 마스터 로드 (업로드/미리보기 제거)
 # =========================
 MASTER_CSV_PATH = "./data/product_master.csv"
 
-@st.cache_data(show_spinner=False)
-def load_products_tree_from_csv(path: str):
-    if not os.path.exists(path):
-        return None, None, None  # TREE, DF, STRATEGIC
-    # 인코딩 가변 처리
-    with open(path, "rb") as f:
-        data_bytes = f.read()
-    try:
-        raw = data_bytes.decode("utf-8-sig")
-    except UnicodeDecodeError:
-        raw = data_bytes.decode("cp949")
-
-    df = pd.read_csv(StringIO(raw))
-    # 컬럼 정규화
-    def _norm(c: str) -> str:
-        k = c.strip().lower().replace(" ", "")
-        mapping = {
-            "상품명": ["상품명", "product", "상품"],
-            "유형": ["유형", "type", "상품유형"],
-            "납기": ["납기", "납입", "납입년도", "payyears", "납입년수"],
-            "1차년성적률": ["1차년성적률", "성적률1", "rate1", "yr1", "y1"],
-            "2차년성적률": ["2차년성적률", "성적률2", "rate2", "yr2", "y2"],
-            "3차년성적률": ["3차년성적률", "성적률3", "rate3", "yr3", "y3"],
-            "전략건강여부": ["전략건강여부", "전략건강", "strategic", "strategic_health", "sh"],
-        }
-        for std, alts in mapping.items():
-            if k in [a.lower().replace(" ", "") for a in alts]:
-                return std
-        return c
-    df = df.rename(columns={c: _norm(c) for c in df.columns})
-
-    req = {"상품명", "유형", "납기", "1차년성적률", "2차년성적률", "3차년성적률", "전략건강여부"}
-    if not req.issubset(set(df.columns)):
-        return None, None, None
-
-    # 정제
-    df["상품명"] = df["상품명"].astype(str).str.strip()
-    df["유형"] = df["유형"].astype(str).str.strip()
-    df["납기"] = df["납기"].astype(str).str.strip()
-    for col in ["1차년성적률", "2차년성적률", "3차년성적률"]:
-        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype(float)
-    df["전략건강여부"] = df["전략건강여부"].astype(str).str.upper().str.strip()
-
-    PRODUCTS_TREE = {}
-    STRATEGIC_HEALTH = set()
-
-    for _, row in df.iterrows():
-        name = row["상품명"]
-        tpe  = row["유형"]
-        r1, r2, r3 = float(row["1차년성적률"]), float(row["2차년성적률"]), float(row["3차년성적률"])
-        pay_list = [x for x in re.split(r"[,\s/]+", row["납기"]) if x] or ["기타"]
-
-        if name not in PRODUCTS_TREE:
-            PRODUCTS_TREE[name] = {}
-        if tpe not in PRODUCTS_TREE[name]:
-            PRODUCTS_TREE[name][tpe] = {"payyears": [], "rates": {}, "strategic": False}
-
-        for py in pay_list:
-            if py not in PRODUCTS_TREE[name][tpe]["payyears"]:
-                PRODUCTS_TREE[name][tpe]["payyears"].append(py)
-            PRODUCTS_TREE[name][tpe]["rates"][py] = (r1, r2, r3)
-
-        if row["전략건강여부"] in ["Y", "YES", "1", "TRUE"]:
-            PRODUCTS_TREE[name][tpe]["strategic"] = True
-            STRATEGIC_HEALTH.add(name)
-
-    for nm in PRODUCTS_TREE:
-        for tp in PRODUCTS_TREE[nm]:
-            PRODUCTS_TREE[nm][tp]["payyears"].sort(key=lambda s: (len(s), s))
-
-    return PRODUCTS_TREE, df, STRATEGIC_HEALTH
-
-PRODUCTS_TREE, master_df, STRATEGIC_HEALTH = load_products_tree_from_csv(MASTER_CSV_PATH)
-if not PRODUCTS_TREE:
+# 프로세스당 1개: 컴파일된 사이드카를 mmap으로 공유, CSV 재배포는 백그라운드에서 교체
+@st.cache_resource(show_spinner=False)
+def get_master_store(path: str) -> MasterStore:
+    store = MasterStore(path)
+    store.start_watcher()
+    return store
+
+MASTER = get_master_store(MASTER_CSV_PATH).get()
+if MASTER is None or not len(MASTER):
     st.error("상품 마스터를 찾을 수 없습니다. 백엔드에 product_master.csv를 배포해 주세요.")
     st.stop()
+PRODUCTS_TREE = MASTER.tree()
+CLOCK.lap("master")
 
 # =========================
-# [변경] 칼럼 비율 동적 산정 (상품명/유형 폭 확대)
+# 계약 편집기 옵션 (마스터 버전당 1회)
 # =========================
-def compute_col_weights(tree: dict):
-    # 길이에 따라 가변폭 계산 (대략적 문자폭 가중)
-    max_name = max((len(nm) for nm in tree.keys()), default=8)
-    max_type = max((len(tp) for nm in tree for tp in tree[nm].keys()), default=4)
-
-    name_w = min(6.5, max(4.4, max_name * 0.14))  # 상품명: 더 넓게
-    type_w = min(3.8, max(2.4, max_type * 0.12))  # 유형: 넓게
-    py_w   = 1.6                                  # 납입년도: 조금 축소
-    prem_w = 1.8                                  # 월초 보험료: 조금 축소
-    del_w  = 1.0
-
-    return [name_w, type_w, py_w, prem_w, del_w]
+@st.cache_resource(show_spinner=False, max_entries=8)
+def get_editor_options(master_version: str, _tree: dict) -> EditorOptions:
+    return EditorOptions(_tree)
+
+OPTIONS = get_editor_options(MASTER.version, PRODUCTS_TREE)
+if "editor_rev" not in st.session_state:
+    st.session_state.editor_rev = 0
+if "entries_page" not in st.session_state:
+    st.session_state.entries_page = 0
+CLOCK.lap("editor_options")
+
+# 증분 계산기 (세션당 1개, 마스터/규정/기준일이 바뀌면 현재 entries로 다시 구성)
+def get_portfolio() -> Portfolio:
+    key = (MASTER.version, default_tiers().version, datetime.today().date())
+    if st.session_state.get("portfolio_key") != key:
+        pf = Portfolio(MASTER)
+        pf.sync(st.session_state.entries)
+        st.session_state.portfolio, st.session_state.portfolio_key = pf, key
+    return st.session_state.portfolio
+
+# 다음 구간 역산 (설계사 결과가 같으면 다시 풀지 않음 — 마스터/규정 버전 · 기준일 · 결과 해시 키)
+def next_tier_view(agent_result: dict):
+    key = ("next_tier", MASTER.version, default_tiers().version, datetime.today().date().isoformat(), input_key(agent_result))
+    view = AGENT_RESULTS.get(key)
+    if view is None:
+        nxt = solve_next_tier(pd.DataFrame([agent_result])).iloc[0]
+        view = (nxt, products_for_agent(agent_result, MASTER, top_k=5, sol=nxt))
+        AGENT_RESULTS.put(key, view)
+    return view
 
 # =========================
 # 상품 선택 → 자동 추가 (상품명 → 유형 → 납입년도)
 # =========================
-all_products = ["— 상품을 선택하세요 —"] + sorted(PRODUCTS_TREE.keys())
+# 선택 목록에는 검색 결과만 올림 (상품명 일부 · 초성 "ㅈㅅ" · 상품코드 "2301")
+SEARCH_TOP_K = 30
+BROWSE_LIMIT = 200
+product_query = st.session_state.get("product_query", "")
+all_products = ["— 상품을 선택하세요 —"] + OPTIONS.find_products(product_query, SEARCH_TOP_K, BROWSE_LIMIT)
 
 def on_select_change():
     choice = st.session_state.product_selector
     if choice and choice != all_products[0]:
         st.session_state.entry_seq += 1
-        new_id = st.session_state.entry_seq
-
-        types = sorted(PRODUCTS_TREE[choice].keys())
-        default_type = types[0] if types else "기타"
-        payyears = PRODUCTS_TREE[choice][default_type]["payyears"] if types else ["기타"]
-        default_pay = payyears[0] if payyears else "기타"
-
-        st.session_state.entries.append({
-            "id": new_id,
-            "product": choice,
-            "type": default_type,
-            "pay_year": default_pay,
-            "type_key": f"type_{new_id}",
-            "pay_year_key": f"payyear_{new_id}",
-            "premium_key": f"premium_{new_id}",
-            "premium": 0,
-        })
+        e = new_entry(st.session_state.entry_seq, choice, OPTIONS)
+        st.session_state.entries.append(e)
+        get_portfolio().upsert([e])
+        st.session_state.entries_page = page_count(len(st.session_state.entries)) - 1
+        st.session_state.editor_rev += 1
         st.session_state.product_selector = all_products[0]
 
+def on_editor_change(editor_key: str, page_ids: list):
+    # 표 위젯의 변경분(edited/added/deleted)만 entries에 반영
+    delta = st.session_state[editor_key]
+    by_id = {e["id"]: e for e in st.session_state.entries}
+    touched = []
+    for pos, changes in delta.get("edited_rows", {}).items():
+        e = by_id[page_ids[int(pos)]]
+        product_changed = "product" in changes and changes["product"] != e["product"]
+        for col, val in changes.items():
+            if col == "premium":
+                e["premium"] = int(val or 0)
+            elif col in ("product", "type", "pay_year") and val:
+                e[col] = val
+        touched.append(OPTIONS.fix(e, product_changed))
+    removed = {page_ids[int(pos)] for pos in delta.get("deleted_rows", [])}
+    if removed:
+        st.session_state.entries = [e for e in st.session_state.entries if e["id"] not in removed]
+    for row in delta.get("added_rows", []):
+        if row.get("product") in OPTIONS.types:
+            st.session_state.entry_seq += 1
+            touched.append(new_entry(
+                st.session_state.entry_seq, row["product"], OPTIONS, row.get("type"), row.get("pay_year"), row.get("premium") or 0,
+            ))
+            st.session_state.entries.append(touched[-1])
+    pf = get_portfolio()
+    pf.remove(removed)
+    pf.upsert(touched)
+    st.session_state.editor_rev += 1  # 반영된 변경분이 새 데이터에 다시 적용되지 않도록 위젯 교체
+
+def on_bulk_import(table):
+    added, unknown = import_entries(table, OPTIONS, st.session_state.entry_seq + 1)
+    st.session_state.entries.extend(added)
+    st.session_state.entry_seq += len(added)
+    get_portfolio().upsert(added)
+    st.session_state.editor_rev += 1
+    st.session_state.import_result = (len(added), unknown)
+
 st.markdown("<div style='font-size:1.08rem; font-weight:700; color:#000000;'>✔️상품 선택</div>", unsafe_allow_html=True)
 st.caption("※ 선택 즉시 아래에 계약이 추가됩니다")
+st.text_input("상품 검색", key="product_query", placeholder="상품명 일부, 초성(ㅈㅅ), 상품코드(2301)", label_visibility="collapsed")
+if product_query.strip():
+    st.caption(f"검색 결과 {len(all_products) - 1:,}개" if len(all_products) > 1 else "검색 결과가 없습니다")
+elif len(OPTIONS.products) > BROWSE_LIMIT:
+    st.caption(f"전체 {len(OPTIONS.products):,}개 중 {BROWSE_LIMIT:,}개 표시 · 검색어를 입력하세요")
 st.selectbox("", options=all_products, key="product_selector", on_change=on_select_change)
 
+with st.expander("📋 계약 일괄 입력 (엑셀 붙여넣기 / CSV·엑셀 파일)"):
+    st.caption("열 순서: 상품명, 유형, 납입년도, 월초 보험료 (머리글이 있으면 이름으로 인식)")
+    pasted = st.text_area("엑셀에서 복사한 표 붙여넣기", key="bulk_paste", height=120)
+    upload = st.file_uploader("CSV/엑셀 파일", type=["csv", "xlsx"], key="bulk_file")
+    if st.button("➕ 일괄 추가", key="bulk_add"):
+        try:
+            if upload is not None:
+                on_bulk_import(read_contract_table(upload, upload.name))
+            elif pasted.strip():
+                on_bulk_import(read_contract_table(pasted))
+        except ValueError as err:
+            st.error(f"일괄 입력 실패: {err}")
+    if "import_result" in st.session_state:
+        n_added, unknown = st.session_state.import_result
+        st.success(f"{n_added:,}건 추가")
+        if unknown:
+            st.warning("마스터에 없는 상품 제외: " + ", ".join(unknown))
+
+CLOCK.lap("product_select")
+
 # =========================
-# 등록된 계약 렌더링 (상품명 → 유형 → 납입년도) — 가변 칼럼 폭 적용
+# 등록된 계약 (표 위젯 1개 + 페이지 단위 렌더링)
 # =========================
 SP(10)
 st.subheader("🧾 상품 목록")
 
-col_weights = compute_col_weights(PRODUCTS_TREE)
+page_ids = []
 
 if not st.session_state.entries:
     st.info("상품을 선택하면 아래에 계약이 추가됩니다. 동일 상품을 여러 건 추가할 수 있습니다.")
 else:
-    h1, h2, h3, h4, h5 = st.columns(col_weights)
-    with h1: st.markdown("**상품명**")
-    with h2: st.markdown("**유형**")
-    with h3: st.markdown("**납입년도**")
-    with h4: st.markdown("**월초 보험료(원)**")
-    with h5: st.markdown("**삭제**")
-
-    remove_id = None
-    for e in st.session_state.entries:
-        c1, c2, c3, c4, c5 = st.columns(col_weights)
-
-        # 상품명
-        with c1:
-            prod_opts = sorted(PRODUCTS_TREE.keys())
-            cur_prod_idx = prod_opts.index(e["product"]) if e["product"] in prod_opts else 0
-            new_prod = st.selectbox("상품명", prod_opts, index=cur_prod_idx, key=f"prod_{e['id']}", label_visibility="collapsed")
-            if new_prod != e["product"]:
-                e["product"] = new_prod
-                types = sorted(PRODUCTS_TREE[new_prod].keys())
-                e["type"] = types[0]
-                e["pay_year"] = PRODUCTS_TREE[new_prod][e["type"]]["payyears"][0]
-
-        # 유형
-        with c2:
-            types = sorted(PRODUCTS_TREE[e["product"]].keys())
-            if e["type"] not in types:
-                e["type"] = types[0]
-            new_type = st.selectbox("유형", types, index=types.index(e["type"]), key=e["type_key"], label_visibility="collapsed")
-            if new_type != e["type"]:
-                e["type"] = new_type
-                e["pay_year"] = PRODUCTS_TREE[e["product"]][e["type"]]["payyears"][0]
-
-        # 납입년도
-        with c3:
-            py_opts = PRODUCTS_TREE[e["product"]][e["type"]]["payyears"]
-            if e["pay_year"] not in py_opts:
-                e["pay_year"] = py_opts[0]
-            e["pay_year"] = st.selectbox("납입년도", py_opts, index=py_opts.index(e["pay_year"]), key=e["pay_year_key"], label_visibility="collapsed")
-
-        # 월초 보험료
-        with c4:
-            e["premium"] = currency_input("월초 보험료(원)", key=e["premium_key"], default=e.get("premium", 0), label_visibility="collapsed")
-
-        with c5:
-            if st.button("🗑 삭제", key=f"del_{e['id']}", use_container_width=True):
-                remove_id = e["id"]
-        st.markdown("")
-
-    if remove_id is not None:
-        st.session_state.entries = [x for x in st.session_state.entries if x["id"] != remove_id]
+    n_pages = page_count(len(st.session_state.entries))
+    page = min(st.session_state.entries_page, n_pages - 1)
+    if n_pages > 1:
+        page = st.number_input(f"페이지 (총 {n_pages}쪽 · {len(st.session_state.entries):,}건)", 1, n_pages, page + 1) - 1
+        st.session_state.entries_page = page
+    page_df, page_ids = entries_page(st.session_state.entries, page)
+    type_opts, py_opts = OPTIONS.column_options(page_df["product"])
+    editor_key = f"entries_editor_{st.session_state.editor_rev}"
+    st.data_editor(
+        page_df,
+        key=editor_key,
+        on_change=on_editor_change,
+        args=(editor_key, page_ids),
+        num_rows="dynamic",
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            "product": st.column_config.SelectboxColumn("상품명", options=OPTIONS.products, required=True, width="large"),
+            "type": st.column_config.SelectboxColumn("유형", options=type_opts, width="medium"),
+            "pay_year": st.column_config.SelectboxColumn("납입년도", options=py_opts, width="small"),
+            "premium": st.column_config.NumberColumn("월초 보험료(원)", min_value=0, step=1, format="localized"),
+        },
+    )
+    st.caption("※ 상품을 바꾸면 유형/납입년도는 해당 상품 기준으로 자동 보정됩니다 · 행 선택 후 Delete로 삭제")
+
+CLOCK.lap("product_table")
 
 # =========================
-# 계산 로직
+# 계산 로직 (incremental.Portfolio 위임)
 # =========================
-def get_rates(product: str, tpe: str, payyear: str):
-    try:
-        r1, r2, r3 = PRODUCTS_TREE[product][tpe]["rates"][payyear]
-        return float(r1), float(r2), float(r3)
-    except Exception:
-        return 0.0, 0.0, 0.0
-
-if st.button("📌 계산하기"):
+agent_inputs = {
+    "year": year, "month": month, "std_activity": std_activity,
+    "retention_1st": retention_1st, "retention_13th": retention_13th, "retention_25th": retention_25th,
+    "refund_p": refund_p, "refund_amt": refund_amt, "direct_recruits": direct_recruits,
+}
+
+# 저장소 자동 저장 (입력/계약이 바뀐 실행에서만, 트랜잭션 1개)
+if st.session_state.store_agent:
+    store_sig = hash((tuple(agent_inputs.items()), tuple((e.id, e.product, e.type, e.pay_year, e.premium) for e in st.session_state.entries)))
+    if st.session_state.get("store_sig") != store_sig:
+        STORE.save(st.session_state.store_agent, STORE_MONTH, agent_inputs, st.session_state.entries)
+        st.session_state.store_sig = store_sig
+
+# 입력이 바뀔 때마다 바로 갱신 (계약 합계는 증분 유지, 상세는 현재 페이지 계약만)
+if st.session_state.entries:
     st.divider()
     summary_placeholder = st.container()
 
-    # 유지율 보정 계수
-    def retention_factor(user_rate: int, standard_rate):
-        if standard_rate is None:
-            return 1.0
-        delta = user_rate - standard_rate
-        if delta >= 0:   return 1.00
-        elif delta > -5: return 0.85
-        else:            return 0.70
-
-    # 성과수수료 기준율 테이블
-    def performance_rate_by_months(months: int, eff: float) -> float:
-        if eff < 700_000:
-            return 0.0
-        if months <= 12:
-            if eff >= 10_000_000: return 0.75
-            if eff >= 5_000_000:  return 0.72
-            if eff >= 2_000_000:  return 0.70
-            if eff >= 1_000_000:  return 0.60
-            return 0.35
-        elif months <= 24:
-            if eff >= 10_000_000: return 0.80
-            if eff >= 5_000_000:  return 0.77
-            if eff >= 2_000_000:  return 0.75
-            if eff >= 1_000_000:  return 0.65
-            return 0.40
-        elif months <= 36:
-            if eff >= 10_000_000: return 0.85
-            if eff >= 5_000_000:  return 0.82
-            if eff >= 2_000_000:  return 0.80
-            if eff >= 1_000_000:  return 0.70
-            return 0.45
-        else:
-            if eff >= 10_000_000: return 0.90
-            if eff >= 5_000_000:  return 0.87
-            if eff >= 2_000_000:  return 0.85
-            if eff >= 1_000_000:  return 0.75
-            return 0.50
-
-    # 유효환산P 산정(1차년 환산 합)
-    total_converted_raw = 0
-    for e in st.session_state.entries:
-        r1, r2, r3 = get_rates(e["product"], e["type"], e["pay_year"])
-        total_converted_raw += e["premium"] * (r1 / 100.0)
-
-    effective_converted = max(0, total_converted_raw - refund_p)
-
-    today = datetime.today()
-    contract_months = (today.year - year) * 12 + (today.month - month) + 1
-
-    base_rate_raw = performance_rate_by_months(contract_months, effective_converted)
-    base_rate = base_rate_raw
-
-    # 초기정착2 전제조건
-    cond_std = bool(std_activity)
-    cond_month = contract_months <= 12
-    cond_amt_init2 = effective_converted >= 1_000_000
-    eligible_init2 = cond_std and cond_month and cond_amt_init2
-
-    Rmax = 0.75
-    delta_R_raw = max(0.0, Rmax - base_rate) if eligible_init2 else 0.0
-
-    _std_now_dynamic_calc = _std_retention(contract_months)
-    f1  = retention_factor(retention_1st, _std_now_dynamic_calc)
-    f13 = retention_factor(retention_13th, _std_13)
-    f25 = retention_factor(retention_25th, _std_25)
-
-    # 전략건강 건수/단가
-    def strategic_count(p: int) -> float:
-        if p >= 50_000: return 1.0
-        if p >= 30_000: return 0.5
-        return 0.0
-
-    total_sh_count = 0.0
-    for e in st.session_state.entries:
-        if e["product"] in STRATEGIC_HEALTH:
-            total_sh_count += strategic_count(e["premium"])
-
-    def per_unit_bonus(cnt: float) -> int:
-        if cnt >= 5: return 70_000
-        if cnt >= 3: return 60_000
-        if cnt >= 2: return 55_000
-        if cnt >= 1: return 50_000
-        return 0
-
-    sh_unit = per_unit_bonus(total_sh_count)
-
-    # 상품별 계산
-    results = []
-    sum_recruit = sum_perf1 = sum_init2_1 = sum_sh_bonus = 0
-
-    for e in st.session_state.entries:
-        prod, tpe, pay_year, premium = e["product"], e["type"], e["pay_year"], e["premium"]
-        r1, r2, r3 = get_rates(prod, tpe, pay_year)
-
-        y1 = premium * (r1 / 100.0)
-        y2 = premium * (r2 / 100.0)
-        y3 = premium * (r3 / 100.0)
-
-        if direct_recruits >= 3:   dr_bonus = 0.15
-        elif direct_recruits == 2: dr_bonus = 0.10
-        elif direct_recruits == 1: dr_bonus = 0.05
-        else:                      dr_bonus = 0.0
-
-        perf1_rate_effective = (base_rate * f1) + (dr_bonus if base_rate > 0 else 0.0)
-        perf1 = y1 * perf1_rate_effective
-        perf2 = y2 * base_rate * f13
-        perf3 = y3 * base_rate * f25
-
-        init2_1 = y1 * (delta_R_raw * f1)
-        init2_2 = y2 * (delta_R_raw * f13)
-        init2_3 = y3 * (delta_R_raw * f25)
-
-        retention1_amt = y2 / 12
-        retention2_amt = y3 / 12
-
-        sh_flag = (prod in STRATEGIC_HEALTH)
-        this_count = strategic_count(premium) if sh_flag else 0.0
-        sh_bonus = int(this_count * sh_unit) if sh_flag else 0
-        sh_tag = " <span style='color:#dc2626'>[전략건강]</span>" if sh_flag else ""
-
-        recruit_fee = y1
-
-        sum_recruit += recruit_fee
-        sum_perf1   += perf1
-        sum_init2_1 += init2_1
-        sum_sh_bonus += sh_bonus
-
-        results.append({
-            "prod": prod, "type": tpe, "pay_year": pay_year, "premium": premium,
-            "recruit_fee": recruit_fee, "perf1": perf1, "perf2": perf2, "perf3": perf3,
-            "init2_1": init2_1, "init2_2": init2_2, "init2_3": init2_3,
-            "retention1_amt": retention1_amt, "retention2_amt": retention2_amt,
-            "sh_bonus": sh_bonus, "sh_tag": sh_tag,
-        })
-
-    # 정착보장 수수료
-    def guarantee_amount_base(effP: int) -> int:
-        if effP >= 5_000_000: return 5_000_000
-        if effP >= 4_000_000: return 4_500_000
-        if effP >= 3_000_000: return 4_000_000
-        if effP >= 2_500_000: return 3_500_000
-        if effP >= 2_000_000: return 3_000_000
-        if effP >= 1_500_000: return 2_500_000
-        if effP >= 1_000_000: return 1_500_000
-        return 0
-
-    base_guarantee = guarantee_amount_base(effective_converted)
-    add_guarantee = 1_000_000 if direct_recruits == 1 else (2_000_000 if direct_recruits >= 2 else 0)
-    final_guarantee = base_guarantee + add_guarantee
-
-    cond_ret = (_std_now_dynamic is None) or (retention_1st >= _std_now_dynamic)
-    eligible_settle = (contract_months <= 12) and std_activity and cond_ret and (final_guarantee > 0)
-
-    base_comp = sum_recruit + sum_perf1 + sum_init2_1
-    base_comp_after_refund = max(0, base_comp - refund_amt)
-
-    settle_bonus = (final_guarantee - base_comp_after_refund) if eligible_settle else 0
-    if settle_bonus < 0: settle_bonus = 0
+    portfolio = get_portfolio()
+    agent_result = portfolio.agent_result(agent_inputs)
+    results = portfolio.contract_results(agent_inputs, page_ids)
+    for r in results:
+        r["prod"] = r["product"]
+        r["sh_tag"] = " <span style='color:#dc2626'>[전략건강]</span>" if r["sh_flag"] else ""
+    CLOCK.lap("calculation")
+
+    next_month_total = agent_result["next_month_total"]
 
     # ── 상단 요약
     with summary_placeholder:
         st.markdown("<div style='font-size:1.8rem; font-weight:700;'>📢당월 수수료 요약</div>", unsafe_allow_html=True)
 
-        info_lines = [
-            f"- **당월환산보험료**: {int(total_converted_raw):,}P",
-            f"- **당월 예상 환수성적**: {int(refund_p):,}P",
-            f"- **유효환산보험료**: {int(effective_converted):,}P",
-            f"- **기준 유지율**: {('해당사항없음' if _std_now_dynamic is None else str(_std_now_dynamic)+'%')}",
-            f"- **현재 유지율**: {retention_1st}%",
-        ]
-
-        perf_rate_has_base = base_rate_raw > 0
-        perf_rate_display = base_rate_raw * f1
-        perf_rate_pct = int(perf_rate_display * 100)
-
-        perf_caption_parts = []
-        if perf_rate_has_base:
-            if f1 != 1.0:
-                perf_caption_parts.append(f"지급률 {int(base_rate_raw*100)}% × 유지율 가감 {int(f1*100)}%")
-            if direct_recruits >= 1 and base_rate_raw > 0:
-                dr_txt = "5%p" if direct_recruits == 1 else ("10%p" if direct_recruits == 2 else "15%p")
-                if f1 != 1.0:
-                    perf_caption_parts.append(f"+ 직도입우대 {dr_txt}")
-                else:
-                    perf_caption_parts.append(f"지급률 {int(base_rate_raw*100)}% + 직도입우대 {dr_txt}")
-
-        if perf_caption_parts:
-            info_lines.append(f"- **성과수수료 지급률**: {perf_rate_pct}%  ( * " + " ".join(perf_caption_parts) + " )")
-        else:
-            info_lines.append(f"- **성과수수료 지급률**: {perf_rate_pct}%")
-
-        if contract_months <= 12:
-            if add_guarantee > 0:
-                info_lines.append(f"- **정착보장수수료 보장금액**: {final_guarantee:,.0f}원 (* 직도입 +{add_guarantee//10000:,}만원)")
-            else:
-                info_lines.append(f"- **정착보장수수료 보장금액**: {final_guarantee:,.0f}원")
-
+        info_lines = [f"- **{k}**: {v}" for k, v in summary_items(agent_result, _std_now_dynamic)]
         st.info("  \n".join(info_lines))
 
-        if contract_months <= 12 and settle_bonus == 0:
-            reasons_settle = []
-            if final_guarantee == 0: reasons_settle.append("유효환산 구간 미달")
-            if not std_activity: reasons_settle.append("표준활동 미달성")
-            if (_std_now_dynamic is not None) and (retention_1st < _std_now_dynamic): reasons_settle.append("당월 유지율 기준 미달")
-            if reasons_settle: st.markdown("**＊ 정착보장수수료 미산출 이유:** " + ", ".join(reasons_settle))
-
-        if not eligible_init2:
-            reasons_i2 = []
-            if not std_activity: reasons_i2.append("표준활동 미달성")
-            if not cond_month: reasons_i2.append("위임 13차월 이상")
-            if not cond_amt_init2: reasons_i2.append("유효환산 100만원 미만")
-            if cond_month and cond_amt_init2 and base_rate_raw >= 0.75 and contract_months <= 12:
-                reasons_i2.append("성과수수료 최대 지급률 달성 상태")
-            if reasons_i2: st.markdown("**＊ 초기정착수수료2 미산출 이유:** " + ", ".join(reasons_i2))
+        reasons_settle = settle_reasons(agent_result, _std_now_dynamic)
+        if reasons_settle: st.markdown("**＊ 정착보장수수료 미산출 이유:** " + ", ".join(reasons_settle))
+        reasons_i2 = init2_reasons(agent_result)
+        if reasons_i2: st.markdown("**＊ 초기정착수수료2 미산출 이유:** " + ", ".join(reasons_i2))
 
         # 익월 요약
         st.markdown("<div style='font-size:1.8rem; font-weight:700; margin-top:8px;'>📢익월 예상 수수료</div>", unsafe_allow_html=True)
-        lines = [
-            f"- **모집수수료** : {sum_recruit:,.0f}원",
-            f"- **성과수수료1** : {sum_perf1:,.0f}원",
-            f"- **초기정착수수료2-1** : {sum_init2_1:,.0f}원",
-            f"- **전략건강 보너스** : {sum_sh_bonus:,.0f}원",
-        ]
-        if contract_months <= 12:
-            lines.append(f"- **정착보장 수수료** : {settle_bonus:,.0f}원")
-        next_month_total = sum_recruit + sum_perf1 + sum_init2_1 + sum_sh_bonus + (settle_bonus if contract_months <= 12 else 0)
+        lines = [f"- **{k}** : {v}" for k, v in next_month_items(agent_result)]
         lines.append(f"\n**총합 : {next_month_total:,.0f}원**")
         st.warning("\n".join(lines))
 
+        # 다음 구간까지 (필요 환산P / 상품별 최소 추가 보험료)
+        nxt, next_opts = next_tier_view(agent_result)
+        if not next_opts.empty:
+            st.info(
+                f"🎯 **다음 구간({nxt['next_tier_source']}) {nxt['next_threshold']:,.0f}P까지** : "
+                f"유효환산 {max(nxt['gap_converted'], 0):,.0f}P 추가 시 익월 총합 +{nxt['gain']:,.0f}원 이상"
+            )
+            st.dataframe(
+                next_opts.rename(columns={
+                    "product": "상품", "type": "유형", "pay_year": "납기",
+                    "add_premium": "추가 월초(원)", "gain": "익월 총합 증가(원)",
+                })[["상품", "유형", "납기", "추가 월초(원)", "익월 총합 증가(원)"]],
+                hide_index=True, use_container_width=True,
+            )
+
         SP(50)
+    CLOCK.lap("summary")
+
+    # ── 36개월 수수료 흐름 (13/25회차 예상 유지율 반영)
+    # 펼친 경우에만 계산 (접힌 패널은 실행마다 비용 없음, 모듈도 그때 import)
+    projection_panel = st.expander("📈 36개월 수수료 흐름 (예상 유지율 반영)", key="panel_projection", on_change="rerun")
+    with projection_panel:
+        if projection_panel.open:
+            from projection import STREAM_LABELS, book_frame, stream_totals, survival_curve
+            all_rows = pd.DataFrame(portfolio.contract_results(agent_inputs))
+            curve = survival_curve([retention_13th], [retention_25th])
+            flow = book_frame(stream_totals(all_rows, np.repeat(curve, len(all_rows), axis=0)))
+            long = flow.melt(id_vars="month", value_vars=list(STREAM_LABELS), var_name="stream", value_name="amount")
+            long = long[long["amount"] > 0].assign(stream=lambda d: d["stream"].map(STREAM_LABELS))
+            import altair as alt
+            st.altair_chart(
+                alt.Chart(long).mark_bar().encode(
+                    x=alt.X("month:O", title="회차"),
+                    y=alt.Y("amount:Q", title="예상 지급액(원)", stack=True),
+                    color=alt.Color("stream:N", title="항목"),
+                    tooltip=[alt.Tooltip("month:O", title="회차"), alt.Tooltip("stream:N", title="항목"), alt.Tooltip("amount:Q", title="금액", format=",.0f")],
+                ),
+                use_container_width=True,
+            )
+            st.caption(f"36개월 합계 {flow['total'].sum():,.0f}원 · 13회차 {retention_13th}% / 25회차 {retention_25th}% 유지율을 잇는 월별 유지 곡선 적용")
+
+    CLOCK.lap("projection")
 
     # ── [변경] 상품별 상세 (차년 성적률 표시는 제거)
     st.subheader("📆 상품별 예상 수수료 계산")
+    if len(page_ids) < len(st.session_state.entries):
+        st.caption(f"※ 상품 목록 현재 페이지의 {len(page_ids):,}건만 표시합니다 (합계는 전체 {len(st.session_state.entries):,}건 기준)")
     for r in results:
         st.markdown("---")
         st.markdown(f"### ✅ {r['prod']} ({r['type']}){r['sh_tag']}", unsafe_allow_html=True)
@@ -609,23 +541,164 @@ if st.button("📌 계산하기"):
         st.markdown(f"<div style='font-size:1.05rem'><b>납입년도</b>: {r['pay_year']}</div>", unsafe_allow_html=True)
         SP(10)
 
-        st.markdown("#### 1차년(익월) 수수료")
-        st.write(f"- 모집수수료 : {r['recruit_fee']:,.0f}원")
-        st.write(f"- 성과수수료1 : {r['perf1']:,.0f}원")
-        st.write(f"- 초기정착수수료2-1 : {r['init2_1']:,.0f}원")
-        if r['sh_bonus'] > 0:
-            st.write(f"- 전략건강 보너스 : {r['sh_bonus']:,.0f}원")
+        for title, items in contract_sections(r):
+            st.markdown(f"#### {title}")
+            st.write("\n".join(f"- {k} : {v}" for k, v in items))
 
-        st.markdown("#### 2차년 수수료")
-        st.write(f"- 유지수수료1 (13~24회차 보험료 납입시): {r['retention1_amt']:,.0f}원")
-        st.write(f"- 성과수수료2 : {r['perf2']:,.0f}원")
-        st.write(f"- 초기정착수수료2-2 : {r['init2_2']:,.0f}원")
+        SP(40)
 
-        st.markdown("#### 3차년 수수료")
-        st.write(f"- 유지수수료2 (25~36회차 보험료 납입시): {r['retention2_amt']:,.0f}원")
-        st.write(f"- 성과수수료3 : {r['perf3']:,.0f}원")
-        st.write(f"- 초기정착수수료2-3 : {r['init2_3']:,.0f}원")
+        st.success("**✔️지급조건**\n\n" + "\n\n".join(f"**＊ {c}**" for c in PAY_CONDITIONS))
 
-        SP(40)
+    CLOCK.lap("details")
+
+# =========================
+# What-if 시나리오 분석 (격자 전체를 한 번에 계산)
+# =========================
+@st.cache_data(show_spinner=False, max_entries=64)
+def run_sweep(entries_key: tuple, agent_key: tuple, axes_key: tuple, master_version: str, tiers_version: str):
+    # 마스터/규정 버전이 키에 포함되어 변경 시 자동 무효화
+    from scenarios import sweep
+    entries = [{"product": p, "type": t, "pay_year": py, "premium": pr} for p, t, py, pr in entries_key]
+    return sweep(entries, dict(agent_key), {k: list(v) for k, v in axes_key}, MASTER)
+
+def sweep_values(param: str, slot: str) -> list:
+    from scenarios import SWEEP_PARAMS, value_range
+    cur = agent_inputs[param]
+    key = f"sweep_{slot}_{param}"
+    if param == "std_activity":
+        return [False, True]
+    if param == "direct_recruits":
+        lo, hi = st.slider(SWEEP_PARAMS[param], 0, 5, (0, 3), key=key)
+        return value_range(lo, hi, 1)
+    if param.startswith("retention"):
+        floor = 0 if param == "retention_1st" else 50
+        lo, hi = st.slider(SWEEP_PARAMS[param], floor, 100, (max(floor, int(cur) - 20), 100), key=key)
+        return value_range(lo, hi, 1)
+    lo, hi = st.slider(SWEEP_PARAMS[param], 0, 5_000_000, (0, 1_000_000), step=50_000, key=key, format="%d")
+    return value_range(lo, hi, 50_000)
+
+SP(30)
+sweep_panel = st.expander("🔀 What-if 시나리오 분석 (익월 총합)", key="panel_sweep", on_change="rerun")
+with sweep_panel:
+    if not st.session_state.entries:
+        st.caption("상품을 추가하면 유지율/환수/직도입 조합별 익월 총합을 한 번에 비교할 수 있습니다.")
+    elif sweep_panel.open:
+        from scenarios import SWEEP_PARAMS
+        params = list(SWEEP_PARAMS)
+        cx, cy = st.columns(2)
+        with cx:
+            x_param = st.selectbox("가로축", params, index=0, format_func=SWEEP_PARAMS.get, key="sweep_x")
+            x_vals = sweep_values(x_param, "x")
+        with cy:
+            y_opts = [p for p in params if p != x_param]
+            y_param = st.selectbox("세로축", y_opts, index=y_opts.index("refund_p") if "refund_p" in y_opts else 0, format_func=SWEEP_PARAMS.get, key="sweep_y")
+            y_vals = sweep_values(y_param, "y")
+
+        grid = run_sweep(
+            tuple((e["product"], e["type"], e["pay_year"], e["premium"]) for e in st.session_state.entries),
+            tuple(sorted(agent_inputs.items())),
+            ((x_param, tuple(x_vals)), (y_param, tuple(y_vals))),
+            MASTER.version, default_tiers().version,
+        )
+
+        import altair as alt
+        chart = alt.Chart(grid).mark_rect().encode(
+            x=alt.X(f"{x_param}:O", title=SWEEP_PARAMS[x_param]),
+            y=alt.Y(f"{y_param}:O", title=SWEEP_PARAMS[y_param], sort="descending"),
+            color=alt.Color("next_month_total:Q", title="익월 총합(원)", scale=alt.Scale(scheme="blues")),
+            tooltip=[
+                alt.Tooltip(f"{x_param}:O", title=SWEEP_PARAMS[x_param]),
+                alt.Tooltip(f"{y_param}:O", title=SWEEP_PARAMS[y_param]),
+                alt.Tooltip("effective_converted:Q", title="유효환산P", format=",.0f"),
+                alt.Tooltip("next_month_total:Q", title="익월 총합", format=",.0f"),
+            ],
+        )
+        st.altair_chart(chart, use_container_width=True)
+        st.caption(f"총 {len(grid):,}개 조합 · 현재 입력값 기준, 나머지 항목은 고정")
+        st.dataframe(
+            grid.pivot(index=y_param, columns=x_param, values="next_month_total").round(0).sort_index(ascending=False),
+            use_container_width=True,
+        )
+
+CLOCK.lap("sweep")
+
+# =========================
+# 해지 몬테카를로 (청철/반송/무효/해지 → 익월 총합/환수 분포)
+# =========================
+@st.cache_data(show_spinner=False, max_entries=32)
+def run_simulation(entries_key: tuple, agent_key: tuple, rate: float, draws: int, seed: int, master_version: str, tiers_version: str):
+    entries = [{"product": p, "type": t, "pay_year": py, "premium": pr} for p, t, py, pr in entries_key]
+    from simulation import simulate_single
+    return simulate_single(entries, dict(agent_key), MASTER, draws=draws, seed=seed, default_rate=rate)
 
-        st.success("**✔️지급조건**\n\n**＊ 성과수수료 : 지급월 기준 환산가동인 자**\n\n**＊ 초기정착수수료2 : 지급월 기준 표준활동 달성 및 유효환산 100만P 이상인 자**")
+SP(10)
+simulation_panel = st.expander("🎲 해지 시뮬레이션 (P10 / P50 / P90)", key="panel_simulation", on_change="rerun")
+with simulation_panel:
+    if not st.session_state.entries:
+        st.caption("상품을 추가하면 계약별 해지 확률로 익월 총합과 환수 범위를 추정합니다.")
+    elif simulation_panel.open:
+        c1, c2, c3 = st.columns(3)
+        with c1:
+            lapse_pct = st.slider("계약별 해지율 (%)", 0.0, 30.0, 3.0, step=0.5, key="mc_rate")
+        with c2:
+            mc_draws = st.select_slider("시행 횟수", options=[1_000, 5_000, 10_000, 20_000, 50_000], value=10_000, key="mc_draws")
+        with c3:
+            mc_seed = st.number_input("시드", min_value=0, value=0, step=1, key="mc_seed")
+        mc = run_simulation(
+            tuple((e["product"], e["type"], e["pay_year"], e["premium"]) for e in st.session_state.entries),
+            tuple(sorted(agent_inputs.items())),
+            lapse_pct / 100.0, int(mc_draws), int(mc_seed),
+            MASTER.version, default_tiers().version,
+        )
+        labels = {"next_month_total": "익월 총합", "effective_converted": "유효환산P", "refund_p": "환수성적(P)", "refund_amt": "환수금"}
+        st.dataframe(
+            pd.DataFrame(
+                {"P10": [mc[f"{k}_p10"] for k in labels], "P50": [mc[f"{k}_p50"] for k in labels], "P90": [mc[f"{k}_p90"] for k in labels]},
+                index=list(labels.values()),
+            ).round(0),
+            use_container_width=True,
+        )
+        st.caption(f"{int(mc_draws):,}회 시행 · 해지 계약은 환산/수수료에서 제외하고 구간을 다시 판정 · 환수금 = 해지 계약의 1차년 수수료")
+
+CLOCK.lap("simulation")
+
+# =========================
+# 관리자 화면 (주소 뒤 ?admin=… — COMMISSION_ADMIN_KEY가 설정되어 있고 그 값과 같을 때만, 미설정이면 항상 닫힘)
+#   단계별 p50/p95/p99 (프로세스 공용), 세션 실행 횟수, 캐시 적중, 프로파일 캡처
+# =========================
+if PROFILER is not None:
+    st.session_state.pop("profiler_active", None)
+    st.session_state.profile_report = PROFILER.stop()
+CLOCK.finish()
+APP_METRICS.set_gauge("process_rss_bytes", process_rss())
+APP_EXPORTER.maybe_export()
+
+admin_key = st.query_params.get("admin", "")
+expected_key = os.environ.get("COMMISSION_ADMIN_KEY", "")
+if expected_key and admin_key and hmac.compare_digest(admin_key.encode("utf-8"), expected_key.encode("utf-8")):
+    SP(10)
+    with st.expander("🛠 운영 지표"):
+        stages = pd.DataFrame(APP_METRICS.snapshot()).T
+        st.dataframe(stages.sort_values("p95_ms", ascending=False) if len(stages) else stages, use_container_width=True)
+        counters = dict(APP_METRICS.counters)
+        st.caption(
+            f"이 세션 실행 {st.session_state.reruns:,}회 · 이번 실행 {sum(CLOCK.stages.values()) * 1000:,.1f}ms · "
+            f"프로세스 전체 실행 {counters.get('reruns', 0):,}회 / 세션 {counters.get('sessions', 0):,}개"
+        )
+        # 세션 고유 상태만 (마스터/규정/프로세스 캐시는 공유)
+        session_bytes = approx_size({k: st.session_state[k] for k in st.session_state}, (type(MASTER), type(default_tiers().at()), LRUCache))
+        st.caption(
+            f"이 세션 상태 약 {session_bytes / 1024:,.0f} KiB (예산 {SESSION_BUDGET_BYTES / 1024 ** 2:,.1f} MiB · "
+            f"{session_bytes / SESSION_BUDGET_BYTES:.1%}) · 프로세스 RSS {process_rss() / 1024 ** 2:,.0f} MiB"
+        )
+        st.dataframe(pd.DataFrame(cache_stats()).T, use_container_width=True)
+        if "portfolio" in st.session_state:
+            st.caption("증분 계산: " + ", ".join(f"{k} {v:,}" for k, v in st.session_state.portfolio.stats.items()))
+        st.download_button("⬇️ Prometheus 텍스트", APP_METRICS.prometheus().encode("utf-8"), file_name="commission_metrics.prom", mime="text/plain")
+        c1, c2 = st.columns(2)
+        with c1:
+            st.checkbox("다음 실행부터 프로파일 캡처", key="profile_next")
+        with c2:
+            st.radio("프로파일러", PROFILERS, key="profile_mode", horizontal=True)
+        if st.session_state.get("profile_report"):
+            st.code(st.session_state.profile_report, language="text")
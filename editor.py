@@ -0,0 +1,132 @@
+import io
+import re
+
+import pandas as pd
+
+from batch import _to_number, normalize_ledger_columns
+from search import ProductSearch
+
+# =========================
+# 계약 표 편집기 (행 수와 무관하게 표 위젯 1개)
+#   옵션 목록/기본값은 마스터 버전당 1회 계산 (EditorOptions)
+#   표 위젯은 선택지가 열 단위로 고정 → 상품 변경 시 유형/납기를 상품 기준으로 보정
+#   상품 검색 색인(search.ProductSearch)도 옵션과 함께 1회 생성
+#   계약 1건 = Entry (슬롯 고정, dict의 약 1/3 크기) — 세션마다 계약 수만큼 보관되므로 최소 필드만
+# =========================
+PAGE_SIZE = 50
+ENTRY_COLUMNS = ["product", "type", "pay_year", "premium"]
+
+class Entry:
+    # e["premium"] / e.get("type") 형태 접근은 dict와 같게 (엔진/증분 계산기는 키 접근만 사용)
+    __slots__ = ("id", "product", "type", "pay_year", "premium")
+
+    def __init__(self, id: int, product: str, type: str, pay_year: str, premium: int = 0):
+        self.id, self.product, self.type, self.pay_year, self.premium = id, product, type, pay_year, premium
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def __repr__(self):
+        return f"Entry({self.id}, {self.product!r}, {self.type!r}, {self.pay_year!r}, {self.premium})"
+
+def _digits(s) -> str:
+    return re.sub(r"[^0-9]", "", str(s))
+
+class EditorOptions:
+    def __init__(self, tree: dict):
+        self.products = sorted(tree)
+        self.types = {nm: sorted(tree[nm]) for nm in self.products}
+        self.payyears = {(nm, tp): list(node["payyears"]) for nm in self.products for tp, node in tree[nm].items()}
+        self.all_types = sorted({tp for tps in self.types.values() for tp in tps})
+        self.all_payyears = sorted({py for pys in self.payyears.values() for py in pys}, key=lambda s: (len(s), s))
+        self.search_index = ProductSearch(self.products)
+
+    def find_products(self, query: str, k: int, browse_limit: int) -> list:
+        # 검색어가 있으면 상위 k개, 없으면 앞에서 browse_limit개 (선택 목록에 올릴 상품만)
+        if query and query.strip():
+            return self.search_index.search(query, k)
+        return self.products[:browse_limit]
+
+    def default_for(self, product: str):
+        types = self.types.get(product) or ["기타"]
+        pys = self.payyears.get((product, types[0])) or ["기타"]
+        return types[0], pys[0]
+
+    def column_options(self, products) -> tuple:
+        # 현재 페이지 상품들에 해당하는 유형/납기만 (열 단위 선택지를 최대한 좁힘)
+        products = [p for p in dict.fromkeys(products) if p in self.types]
+        if not products:
+            return self.all_types, self.all_payyears
+        types = sorted({tp for p in products for tp in self.types[p]})
+        pys = {py for p in products for tp in self.types[p] for py in self.payyears[(p, tp)]}
+        return types, sorted(pys, key=lambda s: (len(s), s))
+
+    def fix(self, e, product_changed: bool = False):
+        # 유형/납기를 상품에 맞게 보정 (납기는 "10" → "10년납"처럼 숫자만 같아도 인정)
+        types = self.types.get(e["product"])
+        if not types:
+            return e
+        if product_changed or e.get("type") not in types:
+            e["type"] = types[0]
+        pys = self.payyears[(e["product"], e["type"])]
+        if product_changed or e.get("pay_year") not in pys:
+            same = [py for py in pys if _digits(py) and _digits(py) == _digits(e.get("pay_year", ""))]
+            e["pay_year"] = same[0] if same else pys[0]
+        return e
+
+def new_entry(entry_id: int, product: str, options: EditorOptions, type_: str = None, pay_year: str = None, premium: int = 0) -> Entry:
+    default_type, default_pay = options.default_for(product)
+    return options.fix(Entry(entry_id, product, type_ or default_type, pay_year or default_pay, int(premium)))
+
+def entries_page(entries: list, page: int, page_size: int = PAGE_SIZE):
+    # → (표에 넘길 프레임(RangeIndex), 행 위치별 entry id)
+    rows = entries[page * page_size:(page + 1) * page_size]
+    return pd.DataFrame([[e[c] for c in ENTRY_COLUMNS] for e in rows], columns=ENTRY_COLUMNS), [e["id"] for e in rows]
+
+def page_count(n: int, page_size: int = PAGE_SIZE) -> int:
+    return max(1, -(-n // page_size))
+
+# =========================
+# 일괄 입력 (CSV/엑셀 파일, 엑셀 복사 붙여넣기)
+#   컬럼명은 배치 원장과 같은 별칭 사용, 머리글이 없으면 상품명/유형/납기/월초 순서
+# =========================
+def read_contract_table(data, filename: str = "") -> pd.DataFrame:
+    if isinstance(data, str):
+        df = pd.read_csv(io.StringIO(data), sep="\t" if "\t" in data else ",", dtype=str, header=None, keep_default_na=False)
+        head = normalize_ledger_columns(pd.DataFrame(columns=df.iloc[0].astype(str).str.strip())) if len(df) else df
+        if {"product", "premium"} <= set(head.columns):
+            df = df.iloc[1:].set_axis(df.iloc[0].astype(str).str.strip(), axis=1)
+        else:
+            df = df.iloc[:, :len(ENTRY_COLUMNS)].set_axis(ENTRY_COLUMNS[:df.shape[1]], axis=1)
+    elif filename.lower().endswith(".xlsx"):
+        try:
+            import openpyxl  # noqa: F401
+        except ImportError as exc:
+            raise ValueError("엑셀 파일을 읽으려면 openpyxl이 필요합니다. (pip install openpyxl 또는 CSV로 저장해 올려 주세요)") from exc
+        df = pd.read_excel(data, dtype=str, engine="openpyxl").fillna("")
+    else:
+        df = pd.read_csv(data, dtype=str, encoding="utf-8-sig", keep_default_na=False)
+    df = normalize_ledger_columns(df)
+    if "product" not in df.columns:
+        raise ValueError("상품명 컬럼이 없습니다.")
+    out = pd.DataFrame({"product": df["product"].astype(str).str.strip()})
+    for col in ["type", "pay_year"]:
+        out[col] = df[col].astype(str).str.strip() if col in df.columns else ""
+    out["premium"] = _to_number(df["premium"]).astype("int64") if "premium" in df.columns else 0
+    return out[out["product"] != ""].reset_index(drop=True)
+
+def import_entries(table: pd.DataFrame, options: EditorOptions, first_id: int):
+    # → (추가할 entries, 마스터에 없는 상품명 목록)
+    entries, unknown = [], []
+    for row in table.itertuples(index=False):
+        if row.product not in options.types:
+            unknown.append(row.product)
+            continue
+        entries.append(new_entry(first_id + len(entries), row.product, options, row.type or None, row.pay_year or None, row.premium))
+    return entries, sorted(set(unknown))
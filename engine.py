@@ -0,0 +1,291 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from master import to_days
+from tiers import TierSet, default_tiers
+
+# =========================
+# 수수료 계산 엔진 (컬럼 단위 벡터 연산)
+#   contracts: agent_id, product, type, pay_year, premium [, sale_date]
+#   agents   : agent_id, year, month, std_activity,
+#              retention_1st, retention_13th, retention_25th,
+#              refund_p, refund_amt, direct_recruits
+# =========================
+CONTRACT_COLUMNS = ["agent_id", "product", "type", "pay_year", "premium"]
+OPTIONAL_CONTRACT_COLUMNS = ["sale_date", "contract_id"]  # sale_date 없으면 기준일(as_of) 적용 성적률, contract_id는 출력에 그대로 (대사 키)
+AGENT_COLUMNS = [
+    "agent_id", "year", "month", "std_activity",
+    "retention_1st", "retention_13th", "retention_25th",
+    "refund_p", "refund_amt", "direct_recruits",
+]
+
+# =========================
+# 수수료 규정 (data/tier_tables.json, 기준일 버전)
+# =========================
+def as_of_day(as_of: datetime = None) -> int:
+    return int(np.datetime64((as_of or datetime.today()).date(), "D").astype(np.int64))
+
+def resolve_tiers(tiers=None, as_of: datetime = None) -> TierSet:
+    # TierSet 그대로, TierTables/None(기본 파일)은 기준일 버전 선택
+    if isinstance(tiers, TierSet):
+        return tiers
+    return (tiers or default_tiers()).at(as_of_day(as_of))
+
+def std_retention(month_idx: int, tiers=None):
+    v = float(resolve_tiers(tiers).std_retention(month_idx))
+    return None if np.isnan(v) else int(v)
+
+# =========================
+# 고정소수점 금액/비율
+#   금액 = int64 원, 비율 = int64 bp (1bp = 0.01%, 1.0 = 10000)
+#   성적률(%)은 × 100, 규정 테이블의 소수 비율(지급률/유지계수/직도입 가산)은 × 10000 후 반올림
+#   항목별 절사 규칙 (계약 건별 원 미만 절사, 설계사 합계 = 건별 금액의 정수 합):
+#     환산 y1/y2/y3        = 월초 × 성적률bp // 10^4
+#     모집수수료           = y1
+#     성과수수료1          = y1 × (지급률bp × 유지계수bp + 직도입bp × 10^4) // 10^8  (지급률 0이면 직도입 가산 없음)
+#     성과수수료2/3        = y2(y3) × 지급률bp × 13(25)회차 유지계수bp // 10^8
+#     초기정착수수료2-1/2/3 = y1(y2/y3) × 초기정착2율bp × 해당 유지계수bp // 10^8
+#     유지수수료1/2        = y2(y3) // 12
+#     전략건강 보너스      = 건수 × 건당 보너스 (0.5건 원 미만 절사)
+#     정착보장             = 보장금액 − max(0, 기본수수료 − 환수금) (정수 연산, 절사 없음)
+#   환수성적/환수금 입력은 원 단위 반올림
+# =========================
+BP = 10_000
+TERM_SCALE = BP * BP
+TERM_FIELDS = ("base_bp", "f1_bp", "f13_bp", "f25_bp", "dr_bp", "delta_bp")
+
+def to_bp(x) -> np.ndarray:
+    # 소수 비율 → bp
+    return np.rint(np.asarray(x, dtype=float) * BP).astype(np.int64)
+
+def rate_bp(r) -> np.ndarray:
+    # 성적률(%) → bp
+    return np.rint(np.asarray(r, dtype=float) * 100).astype(np.int64)
+
+def won(x) -> np.ndarray:
+    return np.rint(np.asarray(x, dtype=float)).astype(np.int64)
+
+def mul_div(y, k, d: int = TERM_SCALE) -> np.ndarray:
+    # floor(y × k / d), int64 곱 넘침 없이 (y = q·d + r)
+    q, r = np.divmod(np.asarray(y, dtype=np.int64), d)
+    k = np.asarray(k, dtype=np.int64)
+    return q * k + r * k // d
+
+def int_bincount(pos: np.ndarray, weights, n: int) -> np.ndarray:
+    # 정수 금액 설계사별 합 (원 단위 정수 합은 2^53 미만에서 float 누적도 정확)
+    return np.rint(np.bincount(pos, weights=weights, minlength=n)).astype(np.int64)
+
+def contract_months_between(year, month, as_of: datetime = None):
+    as_of = as_of or datetime.today()
+    return (as_of.year - np.asarray(year)) * 12 + (as_of.month - np.asarray(month)) + 1  # 1=1차월 ...
+
+# =========================
+# 배치 계산
+# =========================
+def agent_positions(agent_ids: pd.Series, contract_agent_ids: pd.Series) -> np.ndarray:
+    pos = pd.Index(agent_ids).get_indexer(contract_agent_ids)
+    if (pos < 0).any():
+        missing = pd.unique(np.asarray(contract_agent_ids)[pos < 0])[:5]
+        raise ValueError(f"agents에 없는 agent_id: {list(missing)}")
+    return pos
+
+SUM_COLUMNS = ["recruit_fee", "perf1", "init2_1", "sh_bonus"]
+
+def sale_days(contracts: pd.DataFrame, as_of: datetime = None) -> np.ndarray:
+    # 계약 판매일(일수), 미기재 행은 기준일
+    day = as_of_day(as_of)
+    if "sale_date" not in contracts.columns:
+        return np.full(len(contracts), day, dtype=np.int64)
+    days = to_days(contracts["sale_date"].to_numpy(), default=day)
+    return days.astype(np.int64)
+
+def contract_base(contracts: pd.DataFrame, master, as_of: datetime = None, tiers=None) -> dict:
+    # 계약 단위 입력 (판매일 기준 성적률 조회, 환산, 전략건강 건수)
+    rates = master.lookup(
+        contracts["product"].to_numpy(), contracts["type"].to_numpy(), contracts["pay_year"].to_numpy(),
+        sale_days(contracts, as_of),
+    )
+    r1, r2, r3 = rates[:, 0], rates[:, 1], rates[:, 2]
+    premium = won(contracts["premium"].to_numpy(dtype=float))
+    r_bp = rate_bp(rates)
+    sh_flag = master.is_strategic(contracts["product"].to_numpy())
+    return {
+        "r1": r1, "r2": r2, "r3": r3,
+        "y1": premium * r_bp[:, 0] // BP,
+        "y2": premium * r_bp[:, 1] // BP,
+        "y3": premium * r_bp[:, 2] // BP,
+        "sh_flag": sh_flag,
+        "sh_count": np.where(sh_flag, resolve_tiers(tiers, as_of).strategic_count(premium), 0.0),
+    }
+
+def agent_context(agents: pd.DataFrame, total_converted_raw, total_sh_count, as_of: datetime = None, tiers=None) -> dict:
+    # 설계사 단위 구간/계수 (계약 전체 집계 후 1회 산정)
+    tiers = resolve_tiers(tiers, as_of)
+    std_activity = agents["std_activity"].to_numpy(dtype=bool)
+    retention_1st = agents["retention_1st"].to_numpy(dtype=float)
+    refund_p = won(agents["refund_p"].to_numpy(dtype=float))
+    direct_recruits = agents["direct_recruits"].to_numpy(dtype=int)
+
+    total_converted_raw = np.asarray(total_converted_raw, dtype=np.int64)
+    effective_converted = np.maximum(0, total_converted_raw - refund_p)
+    contract_months = contract_months_between(agents["year"].to_numpy(), agents["month"].to_numpy(), as_of)
+    base_bp = to_bp(tiers.performance_rate(contract_months, effective_converted))
+    rmax_bp = int(to_bp(tiers.rmax))
+
+    # 초기정착2 전제조건
+    cond_month = contract_months <= tiers.init2_max_months
+    cond_amt_init2 = effective_converted >= tiers.init2_min_eff
+    eligible_init2 = std_activity & cond_month & cond_amt_init2
+    delta_bp = np.where(eligible_init2, np.maximum(0, rmax_bp - base_bp), 0)
+
+    std_now = tiers.std_retention(contract_months)
+    f1_bp = to_bp(tiers.retention_factor(retention_1st, std_now))
+    f13_bp = to_bp(tiers.retention_factor(agents["retention_13th"].to_numpy(dtype=float), tiers.std_retention(13)))
+    f25_bp = to_bp(tiers.retention_factor(agents["retention_25th"].to_numpy(dtype=float), tiers.std_retention(25)))
+    dr_bp = to_bp(tiers.direct_recruit_bonus(direct_recruits))
+    # 표시용 소수 값은 bp에서 환산 (계산은 *_bp만 사용)
+    return {
+        "contract_months": contract_months,
+        "cond_month": cond_month,
+        "cond_amt_init2": cond_amt_init2,
+        "init2_capped": cond_month & cond_amt_init2 & (base_bp >= rmax_bp),
+        "std_retention_now": std_now,
+        "total_converted_raw": total_converted_raw,
+        "effective_converted": effective_converted,
+        "base_rate": base_bp / BP,
+        "f1": f1_bp / BP,
+        "f13": f13_bp / BP,
+        "f25": f25_bp / BP,
+        "dr_bonus": dr_bp / BP,
+        "eligible_init2": eligible_init2,
+        "delta_R": delta_bp / BP,
+        "base_bp": base_bp, "f1_bp": f1_bp, "f13_bp": f13_bp, "f25_bp": f25_bp, "dr_bp": dr_bp, "delta_bp": delta_bp,
+        "total_sh_count": np.asarray(total_sh_count, dtype=float),
+        "sh_unit": won(tiers.per_unit_bonus(total_sh_count)),
+    }
+
+def term_coefficients(base_bp, f1_bp, f13_bp, f25_bp, dr_bp, delta_bp) -> dict:
+    # 항목별 y 계수 (bp², TERM_SCALE = 1.0), 항목 → (y 위치 0/1/2, 계수)
+    base_bp = np.asarray(base_bp, dtype=np.int64)
+    return {
+        "perf1": (0, base_bp * f1_bp + np.where(base_bp > 0, dr_bp, 0) * BP),
+        "perf2": (1, base_bp * f13_bp),
+        "perf3": (2, base_bp * f25_bp),
+        "init2_1": (0, np.asarray(delta_bp, dtype=np.int64) * f1_bp),
+        "init2_2": (1, np.asarray(delta_bp, dtype=np.int64) * f13_bp),
+        "init2_3": (2, np.asarray(delta_bp, dtype=np.int64) * f25_bp),
+    }
+
+def commission_terms(y1, y2, y3, base_bp, f1_bp, f13_bp, f25_bp, dr_bp, delta_bp) -> dict:
+    # 성과/초기정착2 (계약 건별 원 미만 절사, 인자는 TERM_FIELDS 순서)
+    y = (y1, y2, y3)
+    coef = term_coefficients(base_bp, f1_bp, f13_bp, f25_bp, dr_bp, delta_bp)
+    return {name: mul_div(y[i], k) for name, (i, k) in coef.items()}
+
+def term_sums(y, coef) -> np.ndarray:
+    # 계약 y (n) × 계수 후보 (s) → 후보별 건별 절사 합 (s), 고유 계수만 계산
+    y = np.asarray(y, dtype=np.int64)
+    units, inv = np.unique(np.asarray(coef, dtype=np.int64), return_inverse=True)
+    return mul_div(y[:, None], units[None, :]).sum(axis=0)[inv.reshape(-1)]
+
+def sh_bonus_amounts(sh_count, unit) -> np.ndarray:
+    # 전략건강 보너스 건별 절사 (건수 0.5 단위 × 원 단가)
+    return np.floor(np.asarray(sh_count, dtype=float) * unit).astype(np.int64)
+
+def contract_commissions(contracts: pd.DataFrame, base: dict, pos: np.ndarray, ctx: dict) -> pd.DataFrame:
+    # 계약별 수수료 (설계사 값 → 계약 행으로 전개)
+    y1, y2, y3 = base["y1"], base["y2"], base["y3"]
+    terms = commission_terms(y1, y2, y3, *(ctx[f][pos] for f in TERM_FIELDS))
+    return contracts.assign(
+        r1=base["r1"], r2=base["r2"], r3=base["r3"], sh_flag=base["sh_flag"],
+        recruit_fee=y1,
+        **terms,
+        retention1_amt=y2 // 12,
+        retention2_amt=y3 // 12,
+        sh_bonus=sh_bonus_amounts(base["sh_count"], ctx["sh_unit"][pos]),
+    )
+
+def agent_summary(agents: pd.DataFrame, ctx: dict, sums: dict, as_of: datetime = None, tiers=None) -> pd.DataFrame:
+    # sums: SUM_COLUMNS별 설계사 합계 (int64 원)
+    tiers = resolve_tiers(tiers, as_of)
+    sum_recruit, sum_perf1, sum_init2_1, sum_sh_bonus = (np.asarray(sums[c], dtype=np.int64) for c in SUM_COLUMNS)
+    std_activity = agents["std_activity"].to_numpy(dtype=bool)
+    retention_1st = agents["retention_1st"].to_numpy(dtype=float)
+    refund_amt = won(agents["refund_amt"].to_numpy(dtype=float))
+    direct_recruits = agents["direct_recruits"].to_numpy(dtype=int)
+    std_now = ctx["std_retention_now"]
+    cond_month = ctx["cond_month"]
+
+    # ── 정착보장 수수료
+    base_guarantee = won(tiers.guarantee_base(ctx["effective_converted"]))
+    add_guarantee = won(tiers.guarantee_add(direct_recruits))
+    final_guarantee = base_guarantee + add_guarantee
+
+    cond_ret = np.isnan(std_now) | (retention_1st >= std_now)
+    eligible_settle = cond_month & std_activity & cond_ret & (final_guarantee > 0)
+
+    base_comp = sum_recruit + sum_perf1 + sum_init2_1
+    base_comp_after_refund = np.maximum(0, base_comp - refund_amt)
+    settle_bonus = np.where(eligible_settle, np.maximum(0, final_guarantee - base_comp_after_refund), 0)
+
+    next_month_total = sum_recruit + sum_perf1 + sum_init2_1 + sum_sh_bonus + np.where(cond_month, settle_bonus, 0)
+
+    # 컬럼을 한 번에 붙임 (assign은 컬럼마다 블록 재구성)
+    out = pd.DataFrame({
+        **ctx,
+        "sum_recruit": sum_recruit,
+        "sum_perf1": sum_perf1,
+        "sum_init2_1": sum_init2_1,
+        "sum_sh_bonus": sum_sh_bonus,
+        "base_guarantee": base_guarantee,
+        "add_guarantee": add_guarantee,
+        "final_guarantee": final_guarantee,
+        "eligible_settle": eligible_settle,
+        "settle_bonus": settle_bonus,
+        "next_month_total": next_month_total,
+    }, index=agents.index)
+    return pd.concat([agents, out], axis=1)
+
+def compute_commissions(contracts: pd.DataFrame, agents: pd.DataFrame, master, as_of: datetime = None, tiers=None):
+    agents = agents.reset_index(drop=True)
+    contracts = contracts.reset_index(drop=True)
+    if not pd.Index(agents["agent_id"]).is_unique:
+        raise ValueError("agents의 agent_id가 중복되었습니다.")
+
+    n = len(agents)
+    pos = agent_positions(agents["agent_id"], contracts["agent_id"])
+    tiers = resolve_tiers(tiers, as_of)
+    base = contract_base(contracts, master, as_of, tiers)
+
+    ctx = agent_context(
+        agents,
+        int_bincount(pos, base["y1"], n),
+        np.bincount(pos, weights=base["sh_count"], minlength=n),
+        as_of, tiers,
+    )
+    per_contract = contract_commissions(contracts, base, pos, ctx)
+    sums = {c: int_bincount(pos, per_contract[c].to_numpy(), n) for c in SUM_COLUMNS}
+    return per_contract, agent_summary(agents, ctx, sums, as_of, tiers)
+
+# =========================
+# 단일 설계사 (Streamlit 화면용)
+# =========================
+def entries_frame(entries: list, agent_id=0) -> pd.DataFrame:
+    # st.session_state.entries → contracts 프레임
+    return pd.DataFrame(
+        {
+            "agent_id": agent_id,
+            "product": [e["product"] for e in entries],
+            "type": [e["type"] for e in entries],
+            "pay_year": [e["pay_year"] for e in entries],
+            "premium": [e["premium"] for e in entries],
+        },
+        columns=CONTRACT_COLUMNS,
+    )
+
+def compute_single(entries: list, agent: dict, master, as_of: datetime = None, tiers=None):
+    agents = pd.DataFrame([{**agent, "agent_id": 0}], columns=AGENT_COLUMNS)
+    per_contract, per_agent = compute_commissions(entries_frame(entries), agents, master, as_of, tiers)
+    return per_contract.to_dict("records"), per_agent.iloc[0].to_dict()
@@ -0,0 +1,166 @@
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from engine import (
+    AGENT_COLUMNS, TERM_FIELDS, TERM_SCALE, agent_context, agent_summary, as_of_day, commission_terms, contract_base,
+    entries_frame, mul_div, resolve_tiers, sh_bonus_amounts, term_coefficients,
+)
+from memo import AGENT_RESULTS, CONTRACT_RESULTS
+
+# =========================
+# 단일 설계사 증분 계산 (Streamlit 화면용)
+#   계약별 기초값(성적률/환산/전략건강 건수)은 계약 추가·수정 시 1회만 조회
+#   설계사 합계(y1/y2/y3, 전략건강 건수)는 증감분으로 갱신 (int64 원 → 누적 오차 없음)
+#   성과1/초기정착2-1 건별 절사 합은 계수가 같으면 증감분, 계수가 바뀌면 전체 1회 재계산
+#   계약별 표시값/설계사 요약은 프로세스 공용 LRU (memo) — 같은 입력이면 세션·설계사가 달라도 재사용
+#     계약: (상품, 유형, 납기, 월초, 기준일, 설계사 계수 bp) / 설계사: (입력값, 계약 합계, 계약 구성 지문)
+#     마스터/규정 버전이 바뀌면 캐시 전체 무효화
+# =========================
+_ENTRY_FIELDS = ("product", "type", "pay_year", "premium")
+_BASE_FIELDS = ("r1", "r2", "r3", "y1", "y2", "y3", "sh_flag", "sh_count")
+_TOTAL_FIELDS = ("y1", "y2", "y3", "sh_count")
+_CTX_FIELDS = TERM_FIELDS + ("sh_unit",)
+_TERM_SUMS = ("perf1", "init2_1")
+
+class _Row:
+    # 계약 1건 입력값 + 기초값 (슬롯 고정, 세션당 계약 수만큼 보관)
+    __slots__ = _ENTRY_FIELDS + _BASE_FIELDS
+
+    def __init__(self, *values):
+        for f, v in zip(self.__slots__, values):
+            setattr(self, f, v)
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def as_dict(self) -> dict:
+        return {f: getattr(self, f) for f in self.__slots__}
+
+class Portfolio:
+    def __init__(self, master, as_of: datetime = None, tiers=None, contract_cache=CONTRACT_RESULTS, agent_cache=AGENT_RESULTS):
+        self.master = master
+        self.as_of = as_of
+        self.tiers = resolve_tiers(tiers, as_of)
+        self.day = as_of_day(as_of)
+        self.version = (master.version, self.tiers.version)
+        self.contract_cache = contract_cache
+        self.agent_cache = agent_cache
+        self.fingerprint = 0  # 계약 구성(다중집합) 지문: 계약 키 해시의 합 (mod 2^64)
+        self.rows = {}       # entry id → 입력값 + 기초값
+        self.order = []      # 화면 순서
+        self.totals = {"y1": 0, "y2": 0, "y3": 0, "sh_count": 0.0}
+        self.sh_counts = Counter()  # 전략건강 건수값별 계약 수 (보너스 건별 절사용)
+        self.stats = {"lookups": 0, "deltas": 0, "resums": 0}  # resums: 계수 변경으로 건별 합 재계산
+        self._coef = None    # 건별 절사 합의 현재 계수 (perf1, init2_1)
+        self._term_sums = dict.fromkeys(_TERM_SUMS, 0)
+
+    # ── 계약 변경 (증분)
+    def upsert(self, entries: list):
+        # 입력값이 바뀐 계약만 마스터 조회
+        changed = [e for e in entries if self._key(self.rows.get(e["id"])) != self._key(e)]
+        for e in entries:
+            if e["id"] not in self.rows:
+                self.order.append(e["id"])
+        if not changed:
+            return
+        base = contract_base(entries_frame(changed), self.master, self.as_of, self.tiers)
+        self.stats["lookups"] += len(changed)
+        for i, e in enumerate(changed):
+            row = _Row(*(e[f] for f in _ENTRY_FIELDS), *(base[f][i].item() for f in _BASE_FIELDS))
+            self._apply(self.rows.get(e["id"]), -1)
+            self._apply(row, +1)
+            self.rows[e["id"]] = row
+
+    def remove(self, ids):
+        ids = set(ids)
+        for i in ids:
+            self._apply(self.rows.pop(i, None), -1)
+        self.order = [i for i in self.order if i not in ids]
+
+    def sync(self, entries: list):
+        # 화면 entries와 맞춤 (없어진 계약 삭제, 바뀐 계약만 재조회, 순서 반영)
+        ids = [e["id"] for e in entries]
+        self.remove(set(self.rows) - set(ids))
+        self.upsert(entries)
+        self.order = ids
+
+    def _key(self, e):
+        return None if e is None else tuple(e[f] for f in _ENTRY_FIELDS)
+
+    def _apply(self, row, sign):
+        if row is None:
+            return
+        self.fingerprint = (self.fingerprint + sign * hash(self._key(row))) % (1 << 64)
+        for f in _TOTAL_FIELDS:
+            self.totals[f] += sign * row[f]
+        if row["sh_count"]:
+            self.sh_counts[row["sh_count"]] += sign
+            if not self.sh_counts[row["sh_count"]]:
+                del self.sh_counts[row["sh_count"]]
+        if self._coef is not None:
+            for name, k in zip(_TERM_SUMS, self._coef):
+                self._term_sums[name] += sign * (row["y1"] * k // TERM_SCALE)
+        self.stats["deltas"] += 1
+
+    def _sums_for(self, coef: tuple) -> dict:
+        # 계수가 바뀐 경우에만 전체 계약 재합산 (구간 이동/유지율 변경 시)
+        if coef != self._coef:
+            y1 = np.array([r["y1"] for r in self.rows.values()], dtype=np.int64)
+            self._term_sums = {name: int(mul_div(y1, k).sum()) for name, k in zip(_TERM_SUMS, coef)}
+            self._coef = coef
+            self.stats["resums"] += 1
+        return self._term_sums
+
+    # ── 설계사 요약
+    def context(self, agent: dict):
+        agents = pd.DataFrame([{**agent, "agent_id": 0}], columns=AGENT_COLUMNS)
+        ctx = agent_context(agents, np.array([self.totals["y1"]]), np.array([self.totals["sh_count"]]), self.as_of, self.tiers)
+        return agents, ctx
+
+    def agent_result(self, agent: dict) -> dict:
+        self.agent_cache.bind(self.version)
+        key = (
+            self.day, tuple(agent.get(c) for c in AGENT_COLUMNS[1:]),
+            len(self.rows), self.fingerprint, tuple(self.totals[f] for f in _TOTAL_FIELDS),
+        )
+        hit = self.agent_cache.get(key)
+        if hit is not None:
+            return dict(hit)
+        agents, ctx = self.context(agent)
+        coef = term_coefficients(*(ctx[f] for f in TERM_FIELDS))
+        terms = self._sums_for(tuple(int(coef[name][1][0]) for name in _TERM_SUMS))
+        unit = int(ctx["sh_unit"][0])
+        sh_bonus = sum(int(sh_bonus_amounts(c, unit)) * n for c, n in self.sh_counts.items())
+        sums = {"recruit_fee": [self.totals["y1"]], "perf1": [terms["perf1"]], "init2_1": [terms["init2_1"]], "sh_bonus": [sh_bonus]}
+        result = agent_summary(agents, ctx, sums, self.as_of, self.tiers).iloc[0].to_dict()
+        self.agent_cache.put(key, result)
+        return dict(result)
+
+    # ── 계약별 표시값 (요청한 계약만, 같은 계약·계수는 캐시)
+    def contract_results(self, agent: dict, ids=None) -> list:
+        result = self.agent_result(agent)  # 설계사 계수 (같은 입력이면 캐시)
+        sig = tuple(int(result[f]) for f in _CTX_FIELDS)
+        ids = self.order if ids is None else ids
+        cache = self.contract_cache
+        cache.bind(self.version)
+        keys = [(self._key(self.rows[i]), self.day, sig) for i in ids]
+        first = {}
+        for i, k in zip(ids, keys):
+            first.setdefault(k, i)
+        found = cache.get_many(first)
+        stale = [k for k, rec in found.items() if rec is None]
+        if stale:
+            rows = [self.rows[first[k]] for k in stale]
+            col = {f: np.array([r[f] for r in rows], dtype=np.int64) for f in ("y1", "y2", "y3")}
+            terms = commission_terms(col["y1"], col["y2"], col["y3"], *sig[:6])
+            sh_bonus = sh_bonus_amounts([r["sh_count"] for r in rows], sig[6])
+            for j, (k, r) in enumerate(zip(stale, rows)):
+                rec = {**r.as_dict(), "recruit_fee": r["y1"], "retention1_amt": r["y2"] // 12, "retention2_amt": r["y3"] // 12,
+                       "sh_bonus": int(sh_bonus[j])}
+                rec.update({name: int(v[j]) for name, v in terms.items()})
+                cache.put(k, rec)
+                found[k] = rec
+        return [{"id": i, **found[k]} for i, k in zip(ids, keys)]
@@ -0,0 +1,278 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from urllib.parse import unquote
+
+import numpy as np
+import pandas as pd
+
+from store import month_key
+
+# =========================
+# 계약 원장 컬럼형 저장 (Parquet, 기준월 · 지점 파티션)
+#   <root>/ym=2025-08/branch=<지점>/part-0.parquet   (hive 형식 디렉터리, 지점명의 경로 예약 문자만 %XX)
+#     파티션 안은 (상품, 유형, 납기, 설계사) 정렬 → 상품 조건은 행 그룹 범위로 바로 좁혀짐
+#     premium은 int64, 나머지 컬럼은 문자열 (CSV 원장과 같은 값, 반복 값은 사전 인코딩으로 압축)
+#   사이드카 (파티션마다): products.json (상품 사전, 정렬 순) + product_code.npy (행별 상품 코드, mmap 로드)
+#     상품 조건 → 코드 searchsorted로 행 범위 → 해당 행 그룹만 읽음 (Parquet 본문은 필요한 그룹만)
+#     상품 구성(건수)은 Parquet 없이 코드 컬럼만으로 집계
+#   읽기 순서: 기준월/지점은 디렉터리 이름으로 거르고 (다른 파티션 파일은 열지 않음)
+#            → 필요한 컬럼만 (projection) → 상품/위임년월 조건은 pandas 변환 전에 적용
+#   배치 원장 경로로 "data/ledger#2025-08" 또는 "data/ledger#2025-08/강남,서초"를 주면 해당 파티션만 사용
+#   CSV 원장 → 파티션 변환은 convert (1회, 같은 기준월·지점 파티션은 교체)
+# =========================
+MARKER = "_ledger.json"
+LEDGER_FORMAT = 1
+DATA_FILE = "part-0.parquet"
+PRODUCTS_FILE = "products.json"
+CODES_FILE = "product_code.npy"
+ROW_GROUP_ROWS = 65_536
+SORT_KEYS = ["product", "type", "pay_year", "agent_id"]
+
+def is_ledger_root(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, MARKER))
+
+def parse_ledger_ref(path: str):
+    # "data/ledger#2025-08/강남,서초" → ("data/ledger", "2025-08", ["강남", "서초"]), 원장 디렉터리가 아니면 None
+    root, _, rest = str(path).partition("#")
+    if not is_ledger_root(root):
+        return None
+    ym, _, branches = rest.partition("/")
+    if not ym:
+        raise ValueError(f"파티션 원장을 쓸 때는 기준월이 필요합니다: {root}#YYYY-MM[/지점,...]")
+    return root, month_key(ym), [b.strip() for b in branches.split(",") if b.strip()] or None
+
+_PATH_UNSAFE = set('%/\\=:*?"<>|#')
+
+def _escape(name) -> str:
+    return "".join(f"%{ord(ch):02X}" if ch in _PATH_UNSAFE or ord(ch) < 32 else ch for ch in str(name))
+
+def _digits(values) -> list:
+    return ["".join(ch for ch in str(v) if ch.isdigit()) for v in values]
+
+# =========================
+# 파티션 목록 (디렉터리 이름만 사용)
+# =========================
+def month_dir(root: str, ym: str) -> str:
+    return os.path.join(root, f"ym={month_key(ym)}")
+
+def branch_dir(root: str, ym: str, branch: str) -> str:
+    return os.path.join(month_dir(root, ym), "branch=" + _escape(branch))
+
+def months(root: str) -> list:
+    return sorted(d[3:] for d in os.listdir(root) if d.startswith("ym=") and os.path.isdir(os.path.join(root, d)))
+
+def branches(root: str, ym: str) -> list:
+    path = month_dir(root, ym)
+    if not os.path.isdir(path):
+        return []
+    return sorted(unquote(d[7:]) for d in os.listdir(path) if d.startswith("branch=") and os.path.isfile(os.path.join(path, d, DATA_FILE)))
+
+def partitions(root: str, ym: str, branch_filter=None) -> list:
+    # → [(지점, 파티션 디렉터리)]
+    names = branches(root, ym)
+    if branch_filter is not None:
+        wanted = {str(b) for b in branch_filter}
+        names = [b for b in names if b in wanted]
+    return [(b, branch_dir(root, ym, b)) for b in names]
+
+# =========================
+# 상품 코드 사이드카 (mmap)
+# =========================
+def load_product_codes(part: str):
+    # → (상품 사전, 행별 코드 mmap) — 코드는 파티션 정렬 순서라 오름차순
+    with open(os.path.join(part, PRODUCTS_FILE), encoding="utf-8") as f:
+        products = json.load(f)
+    return products, np.load(os.path.join(part, CODES_FILE), mmap_mode="r")
+
+def product_ranges(part: str, products) -> list:
+    # 상품 조건 → 해당 행 범위 [(시작, 끝)], 코드 컬럼에서 이분 탐색만 (전체 행을 읽지 않음)
+    names, codes = load_product_codes(part)
+    index = {p: i for i, p in enumerate(names)}
+    wanted = sorted(index[p] for p in set(products) if p in index)
+    return [(int(np.searchsorted(codes, c, "left")), int(np.searchsorted(codes, c, "right"))) for c in wanted]
+
+def product_mix(root: str, ym: str, branch_filter=None) -> pd.Series:
+    # 상품별 계약 건수 (Parquet 본문은 읽지 않음)
+    total = {}
+    for _, part in partitions(root, ym, branch_filter):
+        names, codes = load_product_codes(part)
+        for name, n in zip(names, np.bincount(codes, minlength=len(names))):
+            total[name] = total.get(name, 0) + int(n)
+    return pd.Series(total, dtype=np.int64, name="contracts").sort_values(ascending=False)
+
+# =========================
+# 읽기 (파티션 → 행 그룹 → 조건 → pandas 청크)
+# =========================
+def _row_group_slices(pf, ranges) -> list:
+    # 행 범위 → [(행 그룹, [(그룹 내 시작, 끝)])], ranges=None이면 그룹 전체
+    out, start = [], 0
+    for g in range(pf.metadata.num_row_groups):
+        n = pf.metadata.row_group(g).num_rows
+        if ranges is None:
+            out.append((g, [(0, n)]))
+        else:
+            hits = [(max(lo, start) - start, min(hi, start + n) - start) for lo, hi in ranges if lo < start + n and hi > start]
+            if hits:
+                out.append((g, hits))
+        start += n
+    return out
+
+def iter_partitions(root: str, ym: str, chunksize: int, branch_filter=None, columns=None, products=None, appointed=None):
+    # 파티션 원장 청크 스트리밍 (배치 원장 형식), columns는 표준 컬럼명 (없는 컬럼은 무시)
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    appointed = pa.array(_digits(appointed)) if appointed is not None else None
+    pending, rows = [], 0
+    for branch, part in partitions(root, ym, branch_filter):
+        ranges = product_ranges(part, products) if products is not None else None
+        if ranges == []:
+            continue
+        pf = pq.ParquetFile(os.path.join(part, DATA_FILE), memory_map=True)
+        names = pf.schema_arrow.names
+        read_cols = None if columns is None else [c for c in names if c in columns or (c == "위임년월" and appointed is not None)]
+        for g, hits in _row_group_slices(pf, ranges):
+            group = pf.read_row_group(g, columns=read_cols)
+            table = pa.concat_tables([group.slice(lo, hi - lo) for lo, hi in hits])
+            if appointed is not None and "위임년월" in table.column_names:
+                table = table.filter(pc.is_in(table["위임년월"], value_set=appointed))
+                if columns is not None and "위임년월" not in columns:
+                    table = table.drop_columns(["위임년월"])
+            if columns is not None and "branch" in columns:
+                table = table.append_column("branch", pa.array([branch] * table.num_rows, pa.string()))
+            if table.num_rows:
+                pending.append(table)
+                rows += table.num_rows
+            while rows >= chunksize:
+                merged = pa.concat_tables(pending, promote_options="default")
+                yield merged.slice(0, chunksize).to_pandas()
+                pending, rows = [merged.slice(chunksize)], rows - chunksize
+    if rows:
+        yield pa.concat_tables(pending, promote_options="default").to_pandas()
+
+# =========================
+# CSV 원장 → 파티션 변환 (1회)
+#   청크를 지점별 임시 Parquet에 이어쓰고, 지점마다 정렬 후 최종 파일 + 상품 코드 사이드카 기록
+#   완성된 파티션 디렉터리를 기존 위치와 교체 (읽는 쪽은 이전 또는 새 파티션 전체만 봄)
+# =========================
+def _write_marker(root: str):
+    path = os.path.join(root, MARKER)
+    if not os.path.exists(path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"format": LEDGER_FORMAT, "partitioning": ["ym", "branch"], "sort": SORT_KEYS}, f, ensure_ascii=False)
+
+def _branch_column(contracts: pd.DataFrame, hierarchy: pd.DataFrame):
+    from orgs import UNASSIGNED
+    if "branch" in contracts.columns:
+        s = contracts["branch"].astype(str).str.strip()
+    elif hierarchy is not None:
+        s = contracts["agent_id"].map(hierarchy.set_index("agent_id")["branch"]).fillna("").astype(str)
+    else:
+        return pd.Series(UNASSIGNED, index=contracts.index)
+    return s.where(s != "", UNASSIGNED)
+
+def _finish_partition(spool: str, target: str):
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    table = pq.read_table(spool)
+    table = table.sort_by([(c, "ascending") for c in SORT_KEYS if c in table.column_names])
+    os.makedirs(target)
+    pq.write_table(table, os.path.join(target, DATA_FILE), row_group_size=ROW_GROUP_ROWS, compression="zstd")
+    encoded = pc.dictionary_encode(table["product"].combine_chunks())  # 정렬된 컬럼 → 등장 순 사전 = 정렬 순
+    with open(os.path.join(target, PRODUCTS_FILE), "w", encoding="utf-8") as f:
+        json.dump(encoded.dictionary.to_pylist(), f, ensure_ascii=False)
+    np.save(os.path.join(target, CODES_FILE), encoded.indices.to_numpy(zero_copy_only=False).astype(np.int32))
+
+def _swap_in(built: str, target: str):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    old = None
+    if os.path.isdir(target):
+        old = target + f".old-{os.getpid()}"
+        os.rename(target, old)
+    os.rename(built, target)
+    if old:
+        shutil.rmtree(old, ignore_errors=True)
+
+def convert(ledger_path: str, root: str, ym: str, hierarchy_path: str = None, chunksize: int = 200_000, progress: bool = True) -> dict:
+    # → {지점: 계약 수}
+    from batch import Progress, TableWriter, iter_ledger, prepare_contracts
+    from orgs import read_hierarchy
+    ym = month_key(ym)
+    os.makedirs(root, exist_ok=True)
+    _write_marker(root)
+    hierarchy = read_hierarchy(hierarchy_path) if hierarchy_path else None
+    build = tempfile.mkdtemp(dir=root, prefix=".build-")
+    prog = Progress("convert", progress)
+    writers, counts = {}, {}
+    try:
+        for chunk in iter_ledger(ledger_path, chunksize):
+            contracts = prepare_contracts(chunk)
+            if "위임년월" in contracts.columns:
+                contracts["위임년월"] = contracts["위임년월"].astype(str).str.replace(r"[^0-9]", "", regex=True)
+            branch = _branch_column(contracts, hierarchy)
+            contracts = contracts.drop(columns=["branch"], errors="ignore")
+            for name, part in contracts.groupby(branch, sort=False):
+                if name not in writers:
+                    writers[name] = TableWriter(os.path.join(build, f"spool-{len(writers):05d}.parquet"))
+                writers[name].write(part)
+                counts[name] = counts.get(name, 0) + len(part)
+            prog.update(len(chunk))
+        for w in writers.values():
+            w.close()
+        prog.done()
+        for name, w in writers.items():
+            built = os.path.join(build, "branch=" + _escape(name))
+            _finish_partition(w.path, built)
+            _swap_in(built, branch_dir(root, ym, name))
+    finally:
+        shutil.rmtree(build, ignore_errors=True)
+    return counts
+
+# =========================
+# CLI
+# =========================
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="계약 원장 컬럼형 저장 (Parquet, 기준월 · 지점 파티션)")
+    p.add_argument("--root", default=os.environ.get("COMMISSION_LEDGER", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "ledger")))
+    sub = p.add_subparsers(dest="cmd", required=True)
+    conv = sub.add_parser("convert", help="원장 CSV → 파티션 (같은 기준월·지점 파티션은 교체)")
+    conv.add_argument("ledger")
+    conv.add_argument("--month", required=True, help="기준월 YYYY-MM")
+    conv.add_argument("--hierarchy", help="설계사 → 조직 매핑 CSV (원장에 지점 컬럼이 없을 때)")
+    conv.add_argument("--chunksize", type=int, default=200_000)
+    exp = sub.add_parser("export", help="파티션 → 원장 CSV/Parquet (조건 적용)")
+    exp.add_argument("out")
+    mix = sub.add_parser("products", help="상품별 계약 건수 (상품 코드 컬럼만 읽음)")
+    for s in (exp, mix):
+        s.add_argument("--month", required=True, help="기준월 YYYY-MM")
+        s.add_argument("--branch", action="append", help="지점 (여러 번 지정 가능)")
+    exp.add_argument("--product", action="append", help="상품명 (여러 번 지정 가능)")
+    exp.add_argument("--appointed", action="append", help="위임년월 YYYYMM (여러 번 지정 가능)")
+    exp.add_argument("--columns", help="쉼표 구분 컬럼 (기본: 전체)")
+    exp.add_argument("--chunksize", type=int, default=200_000)
+    return p
+
+def main(argv=None):
+    from batch import Progress, TableWriter
+    args = build_parser().parse_args(argv)
+    if args.cmd == "convert":
+        t0 = datetime.now()
+        counts = convert(args.ledger, args.root, args.month, args.hierarchy, args.chunksize)
+        print(f"{sum(counts.values()):,} contracts → {len(counts)} partitions ({month_dir(args.root, args.month)}, {(datetime.now() - t0).total_seconds():.1f}s)")
+    elif args.cmd == "export":
+        columns = [c.strip() for c in args.columns.split(",")] if args.columns else None
+        writer, prog = TableWriter(args.out), Progress("export")
+        for chunk in iter_partitions(args.root, args.month, args.chunksize, args.branch, columns, args.product, args.appointed):
+            writer.write(chunk)
+            prog.update(len(chunk))
+        writer.close()
+        prog.done()
+    else:
+        print(product_mix(args.root, args.month, args.branch).to_string())
+
+if __name__ == "__main__":
+    main()
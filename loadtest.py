@@ -0,0 +1,257 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import urllib.request
+
+from editor import PAGE_SIZE
+from metrics import LatencyStats, process_rss
+
+# =========================
+# 동시 세션 부하 테스트 (월말 동시 접속 재현)
+#   로컬에서 demo2.py 서버를 띄우고(또는 --url로 기존 서버), 브라우저 대신 웹소켓으로 세션 N개를 동시에 실행
+#   세션 시나리오 (생각 시간 사이사이): 상품 선택(product_selector) → 표에서 월초 수정 → 유지율 슬라이더 이동
+#   프로토콜: BackMsg.rerun_script(위젯 상태 전체) → ForwardMsg delta … script_finished
+#     위젯 id는 화면이 보내는 요소에서 key로 찾고, 서버가 값을 바꾼 위젯(set_value)은 브라우저처럼 받은 값으로 갱신
+#   지연 = rerun 요청 전송 ~ script_finished 수신 (화면 재실행 1회)
+#   동시 세션 수를 단계별로 늘리며 단계마다 p50/p95/p99, 처리량(rerun/s), 오류, 서버 RSS(최대)를 보고
+# =========================
+HERE = os.path.dirname(os.path.abspath(__file__))
+RAMP = (1, 5, 10, 25, 50)
+STAGE_SECONDS = 60.0
+THINK = (1.0, 3.0)
+MAX_CONTRACTS = 20
+RSS_INTERVAL = 1.0
+PLACEHOLDER_PREFIX = "—"
+
+def start_server(port: int, script: str = "demo2.py", env: dict = None) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", script, "--server.headless", "true", "--server.port", str(port),
+         "--browser.gatherUsageStats", "false"],
+        cwd=HERE, env={**os.environ, **(env or {})}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as r:
+                if r.status == 200:
+                    return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("Streamlit 서버가 60초 안에 뜨지 않았습니다.")
+
+# =========================
+# 세션 1개 (웹소켓)
+# =========================
+class Session:
+    def __init__(self, url: str):
+        self.url = url
+        self.ws = None
+        self.widgets = {}  # key → (위젯 id, 요소 종류, 요소 proto)
+        self.states = {}   # 위젯 id → WidgetState (브라우저가 보내는 전체 상태)
+
+    async def connect(self):
+        import websockets
+        self.ws = await websockets.connect(self.url, subprotocols=["streamlit"], max_size=None)
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+
+    async def rerun(self) -> bool:
+        # → 오류 없이 끝났는지 (예외 요소 / 실행 실패면 False)
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        msg.rerun_script.page_script_hash = ""
+        msg.rerun_script.widget_states.widgets.extend(self.states.values())
+        await self.ws.send(msg.SerializeToString())
+        seen, ok = {}, True
+        while True:
+            fwd = ForwardMsg()
+            fwd.ParseFromString(await self.ws.recv())
+            kind = fwd.WhichOneof("type")
+            if kind == "delta" and fwd.delta.WhichOneof("type") == "new_element":
+                element = fwd.delta.new_element
+                name = element.WhichOneof("type")
+                if name == "exception":
+                    ok = False
+                    continue
+                proto = getattr(element, name)
+                wid = getattr(proto, "id", "")
+                if wid.startswith("$$ID-"):
+                    key = wid.split("-", 2)[2]
+                    seen[key] = (wid, name, proto)
+                    if getattr(proto, "set_value", False):
+                        self._sync(wid, name, proto)
+            elif kind == "script_finished":
+                # 이번 실행에 없는 위젯은 브라우저처럼 상태에서 제외
+                self.widgets = seen
+                live = {wid for wid, _, _ in seen.values()}
+                self.states = {wid: s for wid, s in self.states.items() if wid in live}
+                return ok and fwd.script_finished == 0  # FINISHED_SUCCESSFULLY
+
+    def _sync(self, wid: str, name: str, proto):
+        # 서버가 값을 바꾼 위젯 (콜백에서 세션 상태 변경 등)
+        if name == "selectbox":
+            self.set(wid, string_value=proto.raw_value)
+        elif name in ("text_input", "text_area"):
+            self.set(wid, string_value=proto.value)
+        elif name == "slider":
+            self.set(wid, double_array_value=list(proto.value))
+        elif name == "number_input":
+            self.set(wid, double_value=proto.value)
+        elif name == "checkbox":
+            self.set(wid, bool_value=proto.value)
+
+    def set(self, wid: str, **value):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+        state = WidgetState(id=wid)
+        for field, v in value.items():
+            if field == "double_array_value":
+                state.double_array_value.data.extend(v)
+            else:
+                setattr(state, field, v)
+        self.states[wid] = state
+
+    def find(self, key_prefix: str):
+        return next(((key, *w) for key, w in self.widgets.items() if key.startswith(key_prefix)), None)
+
+# =========================
+# 시나리오
+# =========================
+async def user_session(url: str, stage: dict, stop: asyncio.Event, rng: random.Random, think: tuple, max_contracts: int):
+    session = Session(url)
+    try:
+        await session.connect()
+        await timed_rerun(session, stage["stats"], "initial")
+        contracts = 0
+        while not stop.is_set():
+            await asyncio.sleep(rng.uniform(*think))
+            if stop.is_set():
+                break
+            action = "select_product" if contracts < max_contracts and rng.random() < 0.5 else rng.choice(["edit_premium", "slider"])
+            if action == "select_product":
+                _, wid, _, proto = session.find("product_selector")
+                session.set(wid, string_value=rng.choice([o for o in proto.options if not o.startswith(PLACEHOLDER_PREFIX)]))
+                contracts += 1
+            elif action == "edit_premium" and session.find("entries_editor_"):
+                _, wid, _, _ = session.find("entries_editor_")
+                row = rng.randrange((contracts - 1) % PAGE_SIZE + 1) if contracts else 0  # 추가 후에는 마지막 페이지
+                edit = {"edited_rows": {str(row): {"premium": rng.randrange(10, 300) * 1_000}}, "added_rows": [], "deleted_rows": []}
+                session.set(wid, string_value=json.dumps(edit))
+            else:
+                action = "slider"
+                key, wid, _, proto = session.find(rng.choice(["retention_1st_val", "retention_13th_val", "retention_25th_val"]))
+                session.set(wid, double_array_value=[float(rng.randrange(int(proto.min), int(proto.max) + 1))])
+            await timed_rerun(session, stage["stats"], action)
+    except Exception as exc:  # 연결 끊김/시간 초과 등은 오류로 집계하고 세션 종료
+        stage["stats"].incr("errors")
+        stage["stats"].incr(f"error_{type(exc).__name__}")
+    finally:
+        await session.close()
+
+async def timed_rerun(session: Session, stats: LatencyStats, action: str, timeout: float = 120.0):
+    t0 = time.perf_counter()
+    ok = await asyncio.wait_for(session.rerun(), timeout)
+    dt = time.perf_counter() - t0
+    stats.record("rerun", dt)
+    stats.record(action, dt)
+    stats.incr("reruns")
+    if not ok:
+        stats.incr("errors")
+
+async def sample_rss(pid, stop: asyncio.Event, out: list):
+    while not stop.is_set():
+        out.append(process_rss(pid))
+        try:
+            await asyncio.wait_for(stop.wait(), RSS_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+async def run_ramp(url: str, ramp: tuple, stage_seconds: float, think: tuple, max_contracts: int, pid=None, seed: int = 0) -> list:
+    # 단계마다 세션을 목표 수까지 추가 (이전 단계 세션은 계속 실행), 세션은 stage["stats"] (현재 단계 통계)에 기록
+    rng = random.Random(seed)
+    stop_all = asyncio.Event()
+    tasks, report, stage = [], [], {}
+    for target in ramp:
+        stage["stats"] = stats = LatencyStats()
+        stage_stop, rss = asyncio.Event(), []
+        sampler = asyncio.create_task(sample_rss(pid, stage_stop, rss)) if pid else None
+        while len(tasks) < target:
+            tasks.append(asyncio.create_task(user_session(url, stage, stop_all, random.Random(rng.random()), think, max_contracts)))
+            await asyncio.sleep(min(0.05, stage_seconds / max(target, 1) / 4))  # 접속 폭주 완화
+        t0 = time.perf_counter()
+        await asyncio.sleep(stage_seconds)
+        elapsed = time.perf_counter() - t0
+        stage_stop.set()
+        if sampler:
+            await sampler
+        snap = stats.snapshot()
+        report.append({
+            "sessions": target,
+            "active": sum(not t.done() for t in tasks),
+            "reruns": stats.counters.get("reruns", 0),
+            "throughput": stats.counters.get("reruns", 0) / elapsed,
+            "errors": stats.counters.get("errors", 0),
+            "error_kinds": {k[6:]: v for k, v in stats.counters.items() if k.startswith("error_")},
+            "latency_ms": snap.get("rerun", {}),
+            "actions_ms": {k: v for k, v in snap.items() if k != "rerun"},
+            "server_rss_mb": round(max(rss) / 2 ** 20, 1) if rss else None,
+        })
+        print_stage(report[-1])
+    stop_all.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return report
+
+def print_stage(r: dict):
+    lat = r["latency_ms"]
+    print(
+        f"sessions {r['sessions']:>4} (active {r['active']:>4})  reruns {r['reruns']:>6}  {r['throughput']:7.2f}/s  "
+        f"p50 {lat.get('p50_ms', 0):8.1f}  p95 {lat.get('p95_ms', 0):8.1f}  p99 {lat.get('p99_ms', 0):8.1f} ms  "
+        f"errors {r['errors']:>4}  rss {r['server_rss_mb'] if r['server_rss_mb'] is not None else '-'} MB",
+        flush=True,
+    )
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="demo2.py 동시 세션 부하 테스트 (지연 분위수 · 처리량 · 서버 RSS)")
+    p.add_argument("--url", help="기존 서버 주소 (예: http://127.0.0.1:8501, 없으면 로컬 서버 실행)")
+    p.add_argument("--pid", type=int, help="--url 서버의 프로세스 id (RSS 측정용)")
+    p.add_argument("--port", type=int, default=8599, help="로컬 서버 포트")
+    p.add_argument("--ramp", default=",".join(map(str, RAMP)), help="단계별 동시 세션 수 (예: 1,5,10,25,50)")
+    p.add_argument("--stage-seconds", type=float, default=STAGE_SECONDS)
+    p.add_argument("--think", type=float, nargs=2, default=THINK, metavar=("MIN", "MAX"), help="생각 시간 (초, 균등 분포)")
+    p.add_argument("--max-contracts", type=int, default=MAX_CONTRACTS, help="세션당 추가할 최대 계약 수")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", help="단계별 결과 JSON")
+    return p
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    proc = None
+    if args.url:
+        base, pid = args.url.rstrip("/"), args.pid
+    else:
+        proc = start_server(args.port)
+        base, pid = f"http://127.0.0.1:{args.port}", proc.pid
+    url = base.replace("http://", "ws://").replace("https://", "wss://") + "/_stcore/stream"
+    try:
+        report = asyncio.run(run_ramp(
+            url, tuple(int(x) for x in args.ramp.split(",")), args.stage_seconds, tuple(args.think), args.max_contracts, pid, args.seed,
+        ))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(10)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"url": base, "ramp": args.ramp, "think": args.think, "stages": report}, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
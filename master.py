@@ -0,0 +1,393 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+
+# =========================
+# 상품 마스터 로드 (Streamlit 비의존)
+# =========================
+def _norm(c: str) -> str:
+    k = c.strip().lower().replace(" ", "")
+    mapping = {
+        "상품명": ["상품명", "product", "상품"],
+        "유형": ["유형", "type", "상품유형"],
+        "납기": ["납기", "납입", "납입년도", "payyears", "납입년수"],
+        "1차년성적률": ["1차년성적률", "성적률1", "rate1", "yr1", "y1"],
+        "2차년성적률": ["2차년성적률", "성적률2", "rate2", "yr2", "y2"],
+        "3차년성적률": ["3차년성적률", "성적률3", "rate3", "yr3", "y3"],
+        "전략건강여부": ["전략건강여부", "전략건강", "strategic", "strategic_health", "sh"],
+        "적용시작일": ["적용시작일", "적용일", "시행일", "effective_from", "from"],
+        "적용종료일": ["적용종료일", "종료일", "effective_to", "to"],
+    }
+    for std, alts in mapping.items():
+        if k in [a.lower().replace(" ", "") for a in alts]:
+            return std
+    return c
+
+REQUIRED_COLUMNS = ["상품명", "유형", "납기", "1차년성적률", "2차년성적률", "3차년성적률", "전략건강여부"]
+STRATEGIC_TOKENS = ["Y", "YES", "1", "TRUE"]
+INDEX_FORMAT = 2  # 사이드카 배열 구성이 바뀌면 올림 (이전 사이드카 무시)
+
+# =========================
+# 적용일자 (1970-01-01 기준 일수, 미기재는 무기한)
+# =========================
+DAY_MIN = -(1 << 21)
+DAY_MAX = (1 << 21) - 1
+_DAY_SPAN = 1 << 22
+
+def to_days(values, default: int = DAY_MIN) -> np.ndarray:
+    # "2024-04-01", "20240401", "202404"(→1일) 등 허용, 고유값만 파싱
+    s = pd.Series(values, dtype=object)
+    if s.empty:
+        return np.zeros(0, dtype=np.int32)
+    codes, uniq = pd.factorize(s, use_na_sentinel=True)
+    digits = pd.Series(uniq, dtype=object).astype(str).str.replace(r"[^0-9]", "", regex=True)
+    digits = digits.where(digits.str.len() != 6, digits + "01")
+    parsed = pd.to_datetime(digits, format="%Y%m%d", errors="coerce")
+    days = np.where(parsed.isna(), default, parsed.to_numpy("datetime64[D]").astype(np.int64))
+    out = np.full(len(s), default, dtype=np.int64)
+    out[codes >= 0] = days[codes[codes >= 0]]
+    return np.clip(out, DAY_MIN, DAY_MAX).astype(np.int32)
+
+def today_days() -> int:
+    return int(np.datetime64("today", "D").astype(np.int64))
+
+def _decode(data_bytes: bytes) -> str:
+    # 인코딩 가변 처리
+    try:
+        return data_bytes.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return data_bytes.decode("cp949")
+
+def parse_master_csv(data_bytes: bytes):
+    df = pd.read_csv(StringIO(_decode(data_bytes)))
+    # 컬럼 정규화
+    df = df.rename(columns={c: _norm(c) for c in df.columns})
+    if not set(REQUIRED_COLUMNS).issubset(set(df.columns)):
+        return None
+
+    # 정제
+    df["상품명"] = df["상품명"].astype(str).str.strip()
+    df["유형"] = df["유형"].astype(str).str.strip()
+    df["납기"] = df["납기"].astype(str).str.strip()
+    for col in ["1차년성적률", "2차년성적률", "3차년성적률"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype(float)
+    df["전략건강여부"] = df["전략건강여부"].astype(str).str.upper().str.strip()
+    return df
+
+# =========================
+# 컴파일된 마스터 인덱스
+#   상품/유형/납기 → 정수 코드, 성적률 행렬, 전략건강 비트마스크
+#   동일 키의 적용일자별 버전은 (key, eff_from) 정렬 → as-of 조회는 searchsorted 1회
+# =========================
+_ARRAYS = ["key", "eff_from", "eff_to", "prod_code", "type_code", "pay_code", "rates", "node_strategic", "first_seen", "strategic_bits"]
+
+class MasterIndex:
+    def __init__(self, meta: dict, arrays: dict):
+        self.meta = meta
+        self.version = meta["version"]
+        self.products = meta["products"]
+        self.types = meta["types"]
+        self.payyears = meta["payyears"]
+        for name in _ARRAYS:
+            setattr(self, name, arrays[name])
+        self._product_index = pd.Index(self.products)
+        self._type_index = pd.Index(self.types)
+        self._pay_index = pd.Index(self.payyears)
+        self._packed = np.asarray(self.key, dtype=np.int64) * _DAY_SPAN + (np.asarray(self.eff_from, dtype=np.int64) - DAY_MIN)
+        self._tree = None
+
+    def __len__(self):
+        return len(self.key)
+
+    # ── 코드 변환
+    def encode(self, products, types, pay_years) -> np.ndarray:
+        # 미등록 값은 -1
+        p = self._product_index.get_indexer(products)
+        t = self._type_index.get_indexer(types)
+        y = self._pay_index.get_indexer(pay_years)
+        key = (p.astype(np.int64) * len(self.types) + t) * len(self.payyears) + y
+        return np.where((p < 0) | (t < 0) | (y < 0), -1, key)
+
+    def find_keys(self, key, days=None) -> np.ndarray:
+        # (key, 판매일)에 적용되는 버전 행 위치: eff_from <= day <= eff_to 중 최신 (없으면 -1)
+        key = np.asarray(key, dtype=np.int64)
+        if len(self.key) == 0:
+            return np.full(len(key), -1)
+        day = np.full(len(key), today_days(), dtype=np.int64) if days is None else np.broadcast_to(np.asarray(days, dtype=np.int64), key.shape)
+        pos = np.searchsorted(self._packed, key * _DAY_SPAN + (day - DAY_MIN), side="right") - 1
+        safe = np.clip(pos, 0, None)
+        ok = (key >= 0) & (pos >= 0) & (self.key[safe] == key) & (day <= self.eff_to[safe])
+        return np.where(ok, pos, -1)
+
+    def find(self, products, types, pay_years, days=None) -> np.ndarray:
+        # 성적률 행 위치 (미등록/적용기간 외 -1), days 미지정 시 오늘 기준
+        return self.find_keys(self.encode(products, types, pay_years), days)
+
+    def lookup(self, products, types, pay_years, days=None) -> np.ndarray:
+        # 미등록 조합은 get_rates와 동일하게 (0, 0, 0)
+        pos = self.find(products, types, pay_years, days)
+        out = np.zeros((len(pos), 3), dtype=float)
+        hit = pos >= 0
+        out[hit] = self.rates[pos[hit]]
+        return out
+
+    def is_strategic_code(self, prod_code) -> np.ndarray:
+        c = np.asarray(prod_code)
+        bits = np.unpackbits(self.strategic_bits, count=len(self.products)).astype(bool)
+        return np.where(c >= 0, bits[np.clip(c, 0, None)], False)
+
+    def is_strategic(self, products) -> np.ndarray:
+        return self.is_strategic_code(self._product_index.get_indexer(products))
+
+    def strategic_names(self) -> set:
+        bits = np.unpackbits(self.strategic_bits, count=len(self.products)).astype(bool)
+        return {p for p, b in zip(self.products, bits) if b}
+
+    # ── 화면용 PRODUCTS_TREE (오늘 적용 버전 기준, 일자당 1회 생성)
+    def tree(self, day: int = None) -> dict:
+        day = today_days() if day is None else day
+        if self._tree is not None and self._tree[0] == day:
+            return self._tree[1]
+        pos = self.find_keys(np.unique(self.key), day)
+        pos = pos[pos >= 0]
+        tree = {}
+        for i in pos[np.argsort(self.first_seen[pos], kind="stable")]:
+            name, tpe, py = self.products[self.prod_code[i]], self.types[self.type_code[i]], self.payyears[self.pay_code[i]]
+            node = tree.setdefault(name, {}).setdefault(tpe, {"payyears": [], "rates": {}, "strategic": False})
+            node["payyears"].append(py)
+            node["rates"][py] = tuple(float(x) for x in self.rates[i])
+            node["strategic"] = node["strategic"] or bool(self.node_strategic[i])
+        for nm in tree:
+            for tp in tree[nm]:
+                tree[nm][tp]["payyears"].sort(key=lambda s: (len(s), s))
+        self._tree = (day, tree)
+        return tree
+
+def compile_master(df: pd.DataFrame, version: str) -> MasterIndex:
+    # 납기 "5년납/10년납" 같은 복수 표기를 행으로 전개 (빈 값은 "기타")
+    splits = {v: ([x for x in re.split(r"[,\s/]+", v) if x] or ["기타"]) for v in df["납기"].unique()}
+    rows = df.assign(납기=df["납기"].map(splits), _row=np.arange(len(df))).explode("납기", ignore_index=True)
+
+    products = list(dict.fromkeys(rows["상품명"]))
+    types = list(dict.fromkeys(rows["유형"]))
+    payyears = list(dict.fromkeys(rows["납기"]))
+    p = pd.Index(products).get_indexer(rows["상품명"]).astype(np.int32)
+    t = pd.Index(types).get_indexer(rows["유형"]).astype(np.int32)
+    y = pd.Index(payyears).get_indexer(rows["납기"]).astype(np.int32)
+    key = (p.astype(np.int64) * len(types) + t) * len(payyears) + y
+    sh = rows["전략건강여부"].isin(STRATEGIC_TOKENS).to_numpy()
+
+    eff_from = to_days(rows["적용시작일"], DAY_MIN) if "적용시작일" in rows.columns else np.full(len(rows), DAY_MIN, np.int32)
+    eff_to = to_days(rows["적용종료일"], DAY_MAX) if "적용종료일" in rows.columns else np.full(len(rows), DAY_MAX, np.int32)
+
+    table = pd.DataFrame({
+        "key": key, "eff_from": eff_from, "eff_to": eff_to, "prod_code": p, "type_code": t, "pay_code": y,
+        "r1": rows["1차년성적률"].to_numpy(float), "r2": rows["2차년성적률"].to_numpy(float), "r3": rows["3차년성적률"].to_numpy(float),
+        "order": np.arange(len(rows)),
+    })
+    # 상품/유형 노드 단위 전략건강 여부, 동일 키·적용일은 마지막 행 성적률 사용
+    table["node_strategic"] = pd.Series(sh).groupby([p, t]).transform("any").to_numpy()
+    table["first_seen"] = table.groupby("key")["order"].transform("min")
+    table = table.drop_duplicates(["key", "eff_from"], keep="last").sort_values(["key", "eff_from"], kind="stable")
+
+    prod_sh = np.zeros(len(products), dtype=bool)
+    prod_sh[p[sh]] = True
+
+    arrays = {
+        "key": table["key"].to_numpy(np.int64),
+        "eff_from": table["eff_from"].to_numpy(np.int32),
+        "eff_to": table["eff_to"].to_numpy(np.int32),
+        "prod_code": table["prod_code"].to_numpy(np.int32),
+        "type_code": table["type_code"].to_numpy(np.int32),
+        "pay_code": table["pay_code"].to_numpy(np.int32),
+        "rates": np.ascontiguousarray(table[["r1", "r2", "r3"]].to_numpy(np.float64)),
+        "node_strategic": table["node_strategic"].to_numpy(np.uint8),
+        "first_seen": table["first_seen"].to_numpy(np.int64),
+        "strategic_bits": np.packbits(prod_sh),
+    }
+    meta = {"version": version, "products": products, "types": types, "payyears": payyears}
+    return MasterIndex(meta, arrays)
+
+def content_version(data_bytes: bytes) -> str:
+    return hashlib.sha256(f"{INDEX_FORMAT}:".encode() + data_bytes).hexdigest()[:16]
+
+def read_products_tree(path: str):
+    if not os.path.exists(path):
+        return None, None, None  # TREE, DF, STRATEGIC
+    with open(path, "rb") as f:
+        data_bytes = f.read()
+    df = parse_master_csv(data_bytes)
+    if df is None:
+        return None, None, None
+    index = compile_master(df, content_version(data_bytes))
+    return index.tree(), df, index.strategic_names()
+
+# =========================
+# 바이너리 사이드카 (<csv>.idx/<content-hash>/*.npy, mmap 로드)
+#   CSV 옆에 쓸 수 없으면 (읽기 전용 이미지 등) 캐시 디렉터리 → 그것도 안 되면 메모리 인덱스
+# =========================
+def sidecar_dir(csv_path: str) -> str:
+    return csv_path + ".idx"
+
+def cache_sidecar_dir(csv_path: str) -> str:
+    # COMMISSION_CACHE_DIR (없으면 임시 디렉터리) 아래, CSV 절대 경로별 1개
+    root = os.environ.get("COMMISSION_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "commission_cache")
+    path_key = hashlib.sha256(os.path.abspath(csv_path).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(root, f"{os.path.basename(csv_path)}-{path_key}.idx")
+
+def sidecar_roots(csv_path: str) -> list:
+    return [sidecar_dir(csv_path), cache_sidecar_dir(csv_path)]
+
+def _stat_key(csv_path: str) -> dict:
+    st_ = os.stat(csv_path)
+    return {"mtime_ns": st_.st_mtime_ns, "size": st_.st_size}
+
+def _load_sidecar(path: str) -> MasterIndex:
+    with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in _ARRAYS}
+    return MasterIndex(meta, arrays)
+
+def _write_json_atomic(path: str, obj: dict):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+def _save_sidecar(root: str, index: MasterIndex) -> str:
+    target = os.path.join(root, index.version)
+    if os.path.isdir(target):
+        return target
+    tmp = tempfile.mkdtemp(dir=root, prefix=".build-")
+    try:
+        for name in _ARRAYS:
+            np.save(os.path.join(tmp, f"{name}.npy"), np.asarray(getattr(index, name)))
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(index.meta, f, ensure_ascii=False)
+        os.rename(tmp, target)  # 동시 컴파일 시 먼저 끝난 쪽 사용
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not os.path.isdir(target):
+            raise
+    return target
+
+def _read_latest(root: str, stat_key: dict):
+    # LATEST가 현재 CSV(mtime/size)와 같으면 그 사이드카 경로, 아니면 None (읽기만)
+    try:
+        with open(os.path.join(root, "LATEST.json"), encoding="utf-8") as f:
+            latest = json.load(f)
+        if latest.get("format") == INDEX_FORMAT and latest.get("mtime_ns") == stat_key["mtime_ns"] and latest.get("size") == stat_key["size"]:
+            target = os.path.join(root, latest["version"])
+            if os.path.isdir(target):
+                return target
+    except (OSError, ValueError, KeyError):
+        pass
+    return None
+
+def load_master_index(csv_path: str):
+    # 1) mtime/size가 LATEST와 같으면 해시 없이 사이드카 mmap (CSV 옆 → 캐시 디렉터리 순)
+    # 2) 다르면 내용 해시 → 해당 사이드카가 있으면 사용, 없으면 컴파일 후 쓸 수 있는 첫 위치에 저장
+    # 3) 어디에도 쓸 수 없으면 컴파일한 인덱스를 메모리에서 그대로 사용
+    if not os.path.exists(csv_path):
+        return None
+    roots = sidecar_roots(csv_path)
+    stat_key = _stat_key(csv_path)
+    for root in roots:
+        target = _read_latest(root, stat_key)
+        if target is not None:
+            return _load_sidecar(target)
+
+    with open(csv_path, "rb") as f:
+        data_bytes = f.read()
+    version = content_version(data_bytes)
+    latest = {**stat_key, "format": INDEX_FORMAT, "version": version}
+    for root in roots:
+        target = os.path.join(root, version)
+        if os.path.isdir(target):
+            try:
+                _write_json_atomic(os.path.join(root, "LATEST.json"), latest)
+            except OSError:
+                pass  # 읽기 전용이어도 사이드카는 사용 (다음 로드도 해시 후 같은 경로)
+            return _load_sidecar(target)
+
+    df = parse_master_csv(data_bytes)
+    if df is None:
+        return None
+    index = compile_master(df, version)
+    for root in roots:
+        try:
+            os.makedirs(root, exist_ok=True)
+            target = _save_sidecar(root, index)
+            _write_json_atomic(os.path.join(root, "LATEST.json"), latest)
+        except OSError:
+            continue
+        return _load_sidecar(target)
+    return index
+
+# =========================
+# 프로세스 공유 마스터 (변경 감지 시 백그라운드 교체)
+# =========================
+class WatchedStore:
+    # 파일 하나를 감시하며 loader(path) 결과(.version 보유)를 보관
+    loader = None
+    name = "store"
+
+    def __init__(self, path: str, poll_interval: float = 5.0):
+        self.path = path
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._stat = None
+        self._current = None
+        self._watcher = None
+        self.refresh()
+
+    def get(self):
+        return self._current
+
+    def refresh(self) -> bool:
+        # 파일 상태가 바뀐 경우에만 재로드, 참조 교체는 원자적
+        with self._lock:
+            try:
+                stat_key = _stat_key(self.path)
+            except OSError:
+                return False
+            if stat_key == self._stat and self._current is not None:
+                return False
+            try:
+                loaded = type(self).loader(self.path)
+            except Exception:
+                # 배포 중 부분 쓰기 등: 보관 중인 값이 있으면 그대로 쓰고 _stat을 두어 다음 호출에 재시도
+                if self._current is None:
+                    raise
+                return False
+            self._stat = stat_key
+            if loaded is None or (self._current is not None and loaded.version == self._current.version):
+                return False
+            self._current = loaded
+            return True
+
+    def start_watcher(self):
+        if self._watcher is not None:
+            return
+        def _loop():
+            while True:
+                time.sleep(self.poll_interval)
+                try:
+                    self.refresh()
+                except Exception:
+                    pass  # 배포 중 일시적인 부분 쓰기 등은 다음 주기에 재시도
+        self._watcher = threading.Thread(target=_loop, name=f"{self.name}-watcher", daemon=True)
+        self._watcher.start()
+
+class MasterStore(WatchedStore):
+    loader = staticmethod(load_master_index)
+    name = "master"
@@ -0,0 +1,89 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+# =========================
+# 결과 메모이제이션 (프로세스 공용 LRU)
+#   키 = 정규화된 입력, 값 = 계산 결과 (읽기 전용으로 공유, 호출 측에서 복사 후 수정)
+#   bind(버전): 상품 마스터/수수료 규정 버전이 바뀌면 전체 비움
+#   Streamlit 세션 스레드·서비스 워커가 함께 쓰므로 잠금
+# =========================
+class LRUCache:
+    def __init__(self, maxsize: int = 4096, name: str = "cache"):
+        self.maxsize = maxsize
+        self.name = name
+        self.version = None
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def bind(self, version):
+        # 버전이 바뀌었으면 비움 (첫 bind는 무효화로 세지 않음)
+        if version == self.version:
+            return
+        with self._lock:
+            if version != self.version:
+                if self.version is not None:
+                    self.stats["invalidations"] += 1
+                self._data.clear()
+                self.version = version
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.stats["misses"] += 1
+                return default
+            self._data.move_to_end(key)
+            self.stats["hits"] += 1
+            return value
+
+    def get_many(self, keys) -> dict:
+        # 여러 키를 잠금 1회로 조회, 없는 키는 None
+        out = {}
+        with self._lock:
+            for key in keys:
+                value = self._data.get(key)
+                if value is None:
+                    self.stats["misses"] += 1
+                else:
+                    self._data.move_to_end(key)
+                    self.stats["hits"] += 1
+                out[key] = value
+        return out
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def snapshot(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {"size": len(self._data), "maxsize": self.maxsize, **self.stats,
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else None}
+
+def input_key(*parts) -> str:
+    # 큰 입력(계약 목록 등)의 정규화 해시 (키 순서 무관 JSON → blake2b 128bit)
+    text = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+# 계약별 표시값 (상품/유형/납기/월초/기준일 + 설계사 계수), 설계사 요약 (정규화 입력 해시)
+CONTRACT_RESULTS = LRUCache(200_000, "contract_results")
+AGENT_RESULTS = LRUCache(20_000, "agent_results")
+# 다음 구간 상품 후보표 ((마스터 버전, 기준일)당 1개)
+PRODUCT_OPTIONS = LRUCache(64, "product_options")
+
+def cache_stats() -> dict:
+    return {c.name: c.snapshot() for c in (CONTRACT_RESULTS, AGENT_RESULTS, PRODUCT_OPTIONS)}
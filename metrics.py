@@ -0,0 +1,242 @@
+import json
+import os
+import sys
+import threading
+import time
+import types
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+# =========================
+# 단계별 지연 계측 (프로세스 공용, 세션 스레드에서 동시 기록)
+#   record(단계, 초) → 단계별 최근 window건 p50/p95/p99 + 누적 건수/합계
+#   StageClock.lap(단계): 직전 lap 이후 경과 시간을 그 단계로 기록 (화면 코드 들여쓰기 변경 없이 구간 계측)
+#   내보내기 (로컬 수집기용, 환경 변수로 경로 지정 시 최소 간격마다):
+#     COMMISSION_METRICS_PROM : Prometheus 텍스트 파일 (node_exporter textfile collector 형식, 원자적 교체)
+#     COMMISSION_METRICS_JSON : JSON 줄 로그 (1회 내보내기 = 1줄 추가)
+#   메모리: 프로세스 RSS 게이지, 세션 상태 근사 크기 (공유 객체 제외) — 세션 예산과 비교
+# =========================
+LATENCY_WINDOW = 10_000
+QUANTILES = (50, 95, 99)
+EXPORT_INTERVAL = 15.0
+# 4GB 파드 × 80% / 500 세션 (공유 마스터/캐시 제외, 세션 고유 상태만)
+SESSION_BUDGET_BYTES = int(os.environ.get("COMMISSION_SESSION_BUDGET", 4 * 1024 ** 3 * 8 // 10 // 500))
+
+class LatencyStats:
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self.samples = {}
+        self.counts = {}
+        self.totals = {}
+        self.counters = {}
+        self.gauges = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            self.samples.setdefault(name, deque(maxlen=self.window)).append(seconds)
+            self.counts[name] = self.counts.get(name, 0) + 1
+            self.totals[name] = self.totals.get(name, 0.0) + seconds
+
+    def incr(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def set_gauge(self, name: str, value: float):
+        self.gauges[name] = value
+
+    @contextmanager
+    def time(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - t0)
+
+    def _quantiles(self) -> dict:
+        with self._lock:
+            samples = {name: np.fromiter(values, dtype=float) for name, values in self.samples.items()}
+        return {name: np.percentile(v, QUANTILES) for name, v in samples.items()}
+
+    def snapshot(self) -> dict:
+        # 단계 → 건수, p50/p95/p99 (ms)
+        out = {}
+        for name, q in self._quantiles().items():
+            out[name] = {"count": self.counts[name], **{f"p{p}_ms": round(float(v) * 1000.0, 3) for p, v in zip(QUANTILES, q)}}
+        return out
+
+    def prometheus(self, prefix: str = "commission") -> str:
+        lines = [
+            f"# HELP {prefix}_stage_seconds Stage latency (recent {self.window} samples per stage)",
+            f"# TYPE {prefix}_stage_seconds summary",
+        ]
+        for name, q in sorted(self._quantiles().items()):
+            label = _label(name)
+            for p, v in zip(QUANTILES, q):
+                lines.append(f'{prefix}_stage_seconds{{stage="{label}",quantile="{p / 100:g}"}} {float(v):.6f}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{label}"}} {self.totals[name]:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{label}"}} {self.counts[name]}')
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        for name, value in sorted(self.gauges.items()):
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+def _label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class StageClock:
+    # 1회 실행(rerun) 구간 계측: lap()마다 직전 구간을 기록, finish()는 전체
+    def __init__(self, stats: LatencyStats):
+        self.stats = stats
+        self.t0 = self.last = time.perf_counter()
+        self.stages = {}
+
+    def lap(self, name: str):
+        now = time.perf_counter()
+        self.stats.record(name, now - self.last)
+        self.stages[name] = self.stages.get(name, 0.0) + (now - self.last)
+        self.last = now
+
+    def finish(self, name: str = "total") -> float:
+        elapsed = time.perf_counter() - self.t0
+        self.stats.record(name, elapsed)
+        return elapsed
+
+# =========================
+# 내보내기 (최소 간격, 실패해도 화면/요청에는 영향 없음)
+# =========================
+class MetricsExporter:
+    def __init__(self, stats: LatencyStats, prom_path: str = None, json_path: str = None, interval: float = EXPORT_INTERVAL):
+        self.stats = stats
+        self.prom_path = prom_path
+        self.json_path = json_path
+        self.interval = interval
+        self._last = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, stats: LatencyStats):
+        return cls(
+            stats, os.environ.get("COMMISSION_METRICS_PROM") or None, os.environ.get("COMMISSION_METRICS_JSON") or None,
+            float(os.environ.get("COMMISSION_METRICS_INTERVAL", EXPORT_INTERVAL)),
+        )
+
+    def maybe_export(self) -> bool:
+        if not (self.prom_path or self.json_path):
+            return False
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last < self.interval:
+                return False
+            self._last = now
+        try:
+            self.export()
+        except OSError:
+            return False
+        return True
+
+    def export(self):
+        if self.prom_path:
+            tmp = f"{self.prom_path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(self.stats.prometheus())
+            os.replace(tmp, self.prom_path)
+        if self.json_path:
+            line = json.dumps({"ts": time.time(), "pid": os.getpid(), "stages": self.stats.snapshot(),
+                               "counters": dict(self.stats.counters), "gauges": dict(self.stats.gauges)}, ensure_ascii=False)
+            with open(self.json_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+# =========================
+# 메모리
+# =========================
+def process_rss(pid="self") -> int:
+    # 현재 RSS (bytes), /proc 없으면 자기 프로세스는 최대 RSS, 다른 프로세스는 0
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        if pid != "self":
+            return 0
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+_CODE_TYPES = (type, types.ModuleType, types.FunctionType, types.MethodType, types.BuiltinFunctionType)
+
+def approx_size(obj, skip_types: tuple = ()) -> int:
+    # 컨테이너/슬롯/__dict__를 따라간 근사 크기 (같은 객체는 1회, skip_types는 공유 객체로 보고 제외)
+    seen, stack, total = set(), [obj], 0
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, skip_types + _CODE_TYPES):
+            continue
+        seen.add(id(o))
+        if hasattr(o, "memory_usage") and hasattr(o, "columns"):
+            total += int(o.memory_usage(deep=True).sum())
+            continue
+        if hasattr(o, "nbytes") and hasattr(o, "dtype"):
+            total += int(o.nbytes)
+            continue
+        total += sys.getsizeof(o, 0)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset, deque)):
+            stack.extend(o)
+        else:
+            stack.extend(getattr(o, f) for f in getattr(type(o), "__slots__", ()) if hasattr(o, f))
+            if hasattr(o, "__dict__"):
+                stack.append(vars(o))
+    return total
+
+# =========================
+# 프로파일링 (1회 실행 캡처, pyinstrument는 설치된 경우만)
+# =========================
+PROFILERS = ("cProfile", "pyinstrument")
+
+class Profiler:
+    def __init__(self, mode: str = "cProfile"):
+        self.mode = mode
+        self.note = ""
+        self._profiler = None
+
+    def start(self):
+        import cProfile
+        if self.mode == "pyinstrument":
+            try:
+                from pyinstrument import Profiler as _Pyinstrument
+            except ImportError:
+                self.mode, self.note = "cProfile", "pyinstrument 미설치 → cProfile\n"
+            else:
+                self._profiler = _Pyinstrument()
+                self._profiler.start()
+                return
+        self._profiler = cProfile.Profile()
+        try:
+            self._profiler.enable()
+        except ValueError:  # 다른 세션이 프로파일 중 (프로세스당 1개)
+            self._profiler, self.note = None, "다른 세션에서 프로파일 중이라 이번 실행은 건너뜀\n"
+
+    def stop(self, top: int = 40) -> str:
+        # 두 번 불려도 안전 (끊긴 실행의 프로파일러를 다음 실행에서 해제할 때)
+        profiler, self._profiler = self._profiler, None
+        if profiler is None:
+            return self.note
+        if self.mode == "pyinstrument":
+            profiler.stop()
+            return profiler.output_text(unicode=True, color=False)
+        import io
+        import pstats
+        profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(top)
+        return self.note + out.getvalue()
+
+# 화면(Streamlit) 프로세스 공용
+APP_METRICS = LatencyStats()
+APP_EXPORTER = MetricsExporter.from_env(APP_METRICS)
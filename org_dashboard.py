@@ -0,0 +1,63 @@
+import io
+
+import streamlit as st
+
+from orgs import LEVEL_LABELS, LEVELS, OrgCube, read_agent_results, read_hierarchy
+
+# =========================
+# 조직 집계 화면 (운영용)
+#   batch.py 설계사 출력 + 조직 매핑 업로드 → 지역/지점/채널 합계·분포
+#   OrgCube는 업로드 파일당 1회 생성, 필터 변경 시 부분 집계만 재합산
+# =========================
+st.set_page_config(page_title="DB생명 조직별 수수료 집계", layout="wide")
+st.title("🏢 조직별 수수료 집계")
+
+@st.cache_resource(show_spinner="조직 집계 준비 중…", max_entries=4)
+def get_cube(agents_bytes: bytes, agents_name: str, hierarchy_bytes: bytes) -> OrgCube:
+    agents = read_agent_results(io.BytesIO(agents_bytes), agents_name)  # CLI(orgs.py)와 같은 읽기
+    return OrgCube(agents, read_hierarchy(io.BytesIO(hierarchy_bytes)))
+
+c1, c2 = st.columns(2)
+with c1:
+    agents_file = st.file_uploader("설계사별 산출 결과 (batch.py --out-agents)", type=["csv", "parquet"])
+with c2:
+    hierarchy_file = st.file_uploader("설계사 → 조직 매핑 (설계사, 지역, 지점, 채널)", type=["csv"])
+if agents_file is None or hierarchy_file is None:
+    st.info("두 파일을 올리면 조직별 집계가 표시됩니다.")
+    st.stop()
+
+cube = get_cube(agents_file.getvalue(), agents_file.name, hierarchy_file.getvalue())
+
+# ── 집계 단위 / 필터
+by = st.multiselect("집계 단위", LEVELS, default=["region", "branch"], format_func=LEVEL_LABELS.get)
+cols = st.columns(len(LEVELS))
+filters = {}
+for col, level in zip(cols, LEVELS):
+    with col:
+        filters[level] = st.multiselect(f"{LEVEL_LABELS[level]} 필터", cube.options(level), key=f"filter_{level}")
+
+result = cube.rollup(by, filters)
+if result.empty:
+    st.warning("선택한 조건에 해당하는 설계사가 없습니다.")
+    st.stop()
+
+total = cube.rollup([], filters).iloc[0]
+m1, m2, m3, m4 = st.columns(4)
+m1.metric("설계사 수", f"{int(total['agents']):,}명")
+m2.metric("익월 총합", f"{int(total['next_month_total']):,}원")
+m3.metric("정착보장 대상 비율", f"{total['eligible_settle_share']:.1%}")
+m4.metric("익월 총합 P50 / P90", f"{total['next_month_total_p50']:,.0f} / {total['next_month_total_p90']:,.0f}")
+
+labels = {
+    **LEVEL_LABELS, "agents": "설계사 수", "eligible_settle": "정착보장 대상", "eligible_settle_share": "정착보장 대상 비율",
+    "next_month_total": "익월 총합", "sum_recruit": "모집", "sum_perf1": "성과1", "sum_init2_1": "초기정착2-1",
+    "sum_sh_bonus": "전략건강", "settle_bonus": "정착보장", "effective_converted": "유효환산P",
+    "next_month_total_p50": "익월 총합 P50", "next_month_total_p90": "익월 총합 P90",
+}
+st.dataframe(
+    result.rename(columns=lambda c: labels.get(c, c.replace("tier_", "성과 "))),
+    hide_index=True, use_container_width=True,
+)
+st.download_button(
+    "⬇️ CSV 다운로드", result.to_csv(index=False).encode("utf-8-sig"), file_name="org_rollup.csv", mime="text/csv",
+)
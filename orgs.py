@@ -0,0 +1,139 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from batch import LEDGER_ALIASES, TableWriter, iter_table
+from engine import to_bp
+
+# =========================
+# 조직 집계 (지역 > 지점 > 채널)
+#   입력: batch.py 설계사 출력 + 설계사→조직 매핑 파일
+#   최하위 조직(지역·지점·채널 조합)별 부분 집계를 1회 만들고,
+#   필터/집계 단위가 바뀌면 부분 집계만 다시 합산 (계약/설계사 재스캔 없음)
+#   P50/P90은 선택 조직의 익월 총합만 모아 정렬 (설계사 값 1열, 조직 순으로 보관)
+# =========================
+LEVELS = ["region", "branch", "channel"]
+LEVEL_LABELS = {"region": "지역", "branch": "지점", "channel": "채널"}
+HIERARCHY_ALIASES = {
+    "agent_id": LEDGER_ALIASES["agent_id"],
+    "region": ["지역", "지역단", "본부", "region"],
+    "branch": LEDGER_ALIASES["branch"],
+    "channel": ["채널", "조직구분", "channel"],
+}
+_HIERARCHY_LOOKUP = {a.lower().replace(" ", ""): std for std, alts in HIERARCHY_ALIASES.items() for a in alts}
+UNASSIGNED = "(미지정)"
+SUM_METRICS = [
+    "next_month_total", "sum_recruit", "sum_perf1", "sum_init2_1", "sum_sh_bonus", "settle_bonus", "effective_converted",
+]
+PERCENTILES = (50, 90)
+
+def read_hierarchy(path: str) -> pd.DataFrame:
+    # agent_id, region, branch, channel (없는 단계는 미지정)
+    df = pd.read_csv(path, dtype=str, encoding="utf-8-sig", keep_default_na=False)
+    df = df.rename(columns={c: _HIERARCHY_LOOKUP.get(str(c).strip().lower().replace(" ", ""), c) for c in df.columns})
+    if "agent_id" not in df.columns:
+        raise ValueError("조직 매핑 파일에 agent_id(설계사) 컬럼이 없습니다.")
+    out = pd.DataFrame({"agent_id": df["agent_id"].astype(str).str.strip()})
+    for level in LEVELS:
+        out[level] = df[level].astype(str).str.strip().replace("", UNASSIGNED) if level in df.columns else UNASSIGNED
+    return out.drop_duplicates("agent_id", keep="last").reset_index(drop=True)
+
+def read_agent_results(source, name: str = None) -> pd.DataFrame:
+    # source: 경로 또는 업로드 파일 객체 (형식은 name, 없으면 경로 확장자로 판단) — CLI와 화면이 같은 읽기 사용
+    columns = ["agent_id", "base_rate", "eligible_settle"] + SUM_METRICS
+    if str(name or source).lower().endswith((".parquet", ".pq")):
+        return pd.read_parquet(source, columns=columns)
+    return pd.concat(iter_table(source, 500_000, columns), ignore_index=True)
+
+def tier_column(rate_bp: int) -> str:
+    return f"tier_{rate_bp / 100:g}%"
+
+class OrgCube:
+    def __init__(self, per_agent: pd.DataFrame, hierarchy: pd.DataFrame):
+        agents = per_agent.assign(agent_id=per_agent["agent_id"].astype(str)).reset_index(drop=True)
+        org = hierarchy.set_index("agent_id").reindex(agents["agent_id"]).fillna(UNASSIGNED).reset_index(drop=True)
+
+        # 최하위 조직 코드 → 설계사를 조직 순으로 정렬
+        leaf_codes, leaf_keys = pd.MultiIndex.from_frame(org[LEVELS]).factorize(sort=True)
+        order = np.lexsort((agents["next_month_total"].to_numpy(float), leaf_codes))
+        leaf_codes = leaf_codes[order]
+        agents = agents.iloc[order].reset_index(drop=True)
+        n_leaf = len(leaf_keys)
+        self.starts = np.searchsorted(leaf_codes, np.arange(n_leaf + 1))
+        self.values = agents["next_month_total"].to_numpy(float)  # 조직별 오름차순
+
+        # 부분 집계 (조직 × 지표)
+        rate_bp = to_bp(agents["base_rate"].to_numpy(float))
+        self.tiers = np.unique(rate_bp)
+        leaves = pd.DataFrame(list(leaf_keys), columns=LEVELS)
+        leaves["agents"] = np.diff(self.starts)
+        leaves["eligible_settle"] = np.bincount(
+            leaf_codes, weights=agents["eligible_settle"].astype(str).str.upper().isin(["TRUE", "1"]).to_numpy(float), minlength=n_leaf,
+        ).astype(np.int64)
+        for m in SUM_METRICS:
+            leaves[m] = np.rint(np.bincount(leaf_codes, weights=agents[m].to_numpy(float), minlength=n_leaf)).astype(np.int64)
+        counts = np.zeros((n_leaf, len(self.tiers)), dtype=np.int64)
+        np.add.at(counts, (leaf_codes, np.searchsorted(self.tiers, rate_bp)), 1)
+        for j, t in enumerate(self.tiers):
+            leaves[tier_column(t)] = counts[:, j]
+        self.leaves = leaves
+
+    def options(self, level: str) -> list:
+        return sorted(self.leaves[level].unique())
+
+    def rollup(self, by: list = None, filters: dict = None) -> pd.DataFrame:
+        # by: 집계 단위 (LEVELS 부분집합, 없으면 전체 1행), filters: {단계: 허용 값 목록}
+        by = [lv for lv in LEVELS if lv in (by or [])]
+        mask = np.ones(len(self.leaves), dtype=bool)
+        for level, allowed in (filters or {}).items():
+            if allowed:
+                mask &= self.leaves[level].isin(allowed).to_numpy()
+        leaves = self.leaves[mask]
+        keys = [leaves[c] for c in by] if by else [pd.Series(0, index=leaves.index, name="_all")]
+        grouped = leaves.drop(columns=LEVELS).groupby(keys, sort=True)
+        out = grouped.sum()
+        out["eligible_settle_share"] = np.where(out["agents"] > 0, out["eligible_settle"] / out["agents"].clip(lower=1), np.nan)
+
+        # 분위수: 선택 조직의 설계사 값을 그룹 순으로 모아 한 번 정렬 (numpy linear 보간과 동일)
+        leaf_pos = np.flatnonzero(mask)
+        sizes = np.diff(self.starts)[leaf_pos]
+        group = np.repeat(grouped.ngroup().to_numpy(), sizes)
+        offsets = np.repeat(self.starts[leaf_pos] - np.concatenate([[0], np.cumsum(sizes)[:-1]]), sizes)
+        vals = self.values[offsets + np.arange(sizes.sum())]
+        order = np.lexsort((vals, group))
+        vals, group = vals[order], group[order]
+        bounds = np.searchsorted(group, np.arange(len(out) + 1))  # 그룹마다 설계사 1명 이상
+        for q in PERCENTILES:
+            pos = bounds[:-1] + (np.diff(bounds) - 1) * (q / 100.0)
+            lo = np.floor(pos).astype(np.int64)
+            hi = np.minimum(lo + 1, bounds[1:] - 1)
+            out[f"next_month_total_p{q}"] = vals[lo] + (vals[hi] - vals[lo]) * (pos - lo)
+        return out.reset_index(drop=not by)
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="batch.py 설계사 출력 → 지역/지점/채널 집계")
+    p.add_argument("agents", help="batch.py 설계사 출력 (.csv/.parquet)")
+    p.add_argument("hierarchy", help="설계사→조직 매핑 CSV (설계사, 지역, 지점, 채널)")
+    p.add_argument("--by", nargs="*", choices=LEVELS, default=["region", "branch"], help="집계 단위")
+    p.add_argument("--filter", action="append", default=[], metavar="단계=값[,값]", help="예: channel=GA,TM")
+    p.add_argument("--out", default="org_rollup.csv", help=".csv 또는 .parquet")
+    return p
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    filters = {}
+    for f in args.filter:
+        level, _, values = f.partition("=")
+        if level not in LEVELS:
+            raise SystemExit(f"알 수 없는 조직 단계: {level}")
+        filters[level] = [v.strip() for v in values.split(",") if v.strip()]
+    cube = OrgCube(read_agent_results(args.agents), read_hierarchy(args.hierarchy))
+    out = cube.rollup(args.by, filters)
+    w = TableWriter(args.out)
+    w.write(out)
+    w.close()
+    print(f"{len(out):,} rows → {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import multiprocessing as mp
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from batch import (
+    Progress, TableWriter, iter_ledger, ledger_columns, load_master, normalize_ledger_columns,
+    prepare_contracts, run_batch,
+)
+
+# =========================
+# 설계사 샤딩 병렬 배치
+#   pass 0: 원장을 agent_id 해시로 샤드 파일 분할 (ledger_row 보존)
+#   shard : 워커별 run_batch (설계사 집계는 샤드 안에서 완결)
+#   merge : 설계사 최초 등장 순서 / ledger_row 순서로 병합 → 단일 프로세스 결과와 동일
+# =========================
+_MASTER = None  # 워커 공유 마스터 (fork 상속, 아니면 initializer에서 사이드카 mmap 1회 로드)
+
+def _init_worker(master_path: str):
+    global _MASTER
+    if _MASTER is None:
+        _MASTER = load_master(master_path)
+
+def shard_of(agent_ids: pd.Series, shards: int) -> np.ndarray:
+    # 프로세스와 무관한 고정 해시 (PYTHONHASHSEED 영향 없음)
+    h = pd.util.hash_pandas_object(agent_ids.astype(str), index=False).to_numpy()
+    return (h % np.uint64(shards)).astype(np.int64)
+
+def split_ledger(ledger_path: str, workdir: str, shards: int, chunksize: int,
+                 agents_path: str = None, progress: bool = True):
+    prog = Progress("split", progress)
+    ledger_parts = [os.path.join(workdir, f"ledger_{i:04d}.csv") for i in range(shards)]
+    writers = [TableWriter(p) for p in ledger_parts]
+    order, seen, row, columns = [], set(), 0, None
+    for chunk in iter_ledger(ledger_path, chunksize, columns=ledger_columns(agents_path is None)):
+        contracts = prepare_contracts(chunk)
+        contracts.insert(0, "ledger_row", np.arange(row, row + len(contracts), dtype=np.int64))
+        row += len(contracts)
+        columns = contracts.columns
+        if agents_path is None:
+            first = contracts["agent_id"].drop_duplicates()
+            first = first[~first.isin(seen)]
+            seen.update(first)
+            order.extend(first)
+        sid = shard_of(contracts["agent_id"], shards)
+        for i, part in contracts.groupby(sid, sort=True):
+            writers[i].write(part)
+        prog.update(len(chunk))
+    for w in writers:
+        if w._first:
+            w.write(pd.DataFrame(columns=columns if columns is not None else ["ledger_row", "agent_id", "product", "type", "pay_year", "premium"]))
+        w.close()
+    prog.done()
+
+    agent_parts = [None] * shards
+    if agents_path is not None:
+        agents = normalize_ledger_columns(pd.read_csv(agents_path, dtype=str, encoding="utf-8-sig", keep_default_na=False))
+        agents["agent_id"] = agents["agent_id"].astype(str).str.strip()
+        order = list(agents["agent_id"])
+        sid = shard_of(agents["agent_id"], shards)
+        for i in range(shards):
+            agent_parts[i] = os.path.join(workdir, f"agents_{i:04d}.csv")
+            agents[sid == i].to_csv(agent_parts[i], index=False, encoding="utf-8-sig")
+    return ledger_parts, agent_parts, order, row
+
+def _run_shard(task):
+    ledger_part, agents_part, out_part, master_path, chunksize, as_of = task
+    return run_batch(
+        ledger_part, master_path, out_part, None, agents_path=agents_part,
+        chunksize=chunksize, as_of=as_of, progress=False, master=_MASTER,
+        extra_columns=["ledger_row"],
+    )
+
+def _iter_part(path: str, chunksize: int):
+    # CSV 샤드 출력은 전부 문자열로 읽어 그대로 다시 씀 (증권번호 앞자리 0 등 단일 프로세스 출력과 동일), ledger_row만 정수화
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        chunks = (b.to_pandas() for b in pq.ParquetFile(path).iter_batches(batch_size=chunksize))
+    elif os.path.getsize(path) > 0:
+        chunks = pd.read_csv(path, chunksize=chunksize, encoding="utf-8-sig", dtype=str, keep_default_na=False)
+    else:
+        return
+    for df in chunks:
+        df["ledger_row"] = df["ledger_row"].astype(np.int64)
+        yield df
+
+def merge_contract_parts(parts: list, out_path: str, total_rows: int, chunksize: int):
+    # 각 샤드 출력은 ledger_row 오름차순 → ledger_row 윈도우 단위 병합 (메모리 = 윈도우 크기)
+    iters = [_iter_part(p, chunksize) for p in parts]
+    buffers = [pd.DataFrame() for _ in parts]
+    exhausted = [False] * len(parts)
+    writer = TableWriter(out_path)
+    try:
+        for lo in range(0, total_rows, chunksize):
+            hi = lo + chunksize
+            window = []
+            for i, it in enumerate(iters):
+                while not exhausted[i] and (buffers[i].empty or buffers[i]["ledger_row"].iloc[-1] < hi):
+                    nxt = next(it, None)
+                    if nxt is None:
+                        exhausted[i] = True
+                    else:
+                        buffers[i] = pd.concat([buffers[i], nxt], ignore_index=True) if not buffers[i].empty else nxt
+                if not buffers[i].empty:
+                    take = buffers[i]["ledger_row"].to_numpy() < hi
+                    window.append(buffers[i][take])
+                    buffers[i] = buffers[i][~take].reset_index(drop=True)
+            merged = pd.concat(window, ignore_index=True).sort_values("ledger_row", kind="stable")
+            writer.write(merged.drop(columns="ledger_row"))
+    finally:
+        writer.close()
+
+def run_batch_parallel(ledger_path: str, master_path: str, out_contracts: str, out_agents: str,
+                       agents_path: str = None, chunksize: int = 200_000, as_of: datetime = None,
+                       progress: bool = True, workers: int = None, shards: int = None, workdir: str = None):
+    global _MASTER
+    workers = workers or os.cpu_count() or 1
+    shards = shards or workers * 4
+    as_of = as_of or datetime.today()  # 워커 간 기준일 고정
+
+    tmp = tempfile.mkdtemp(prefix="commission_shards_", dir=workdir)
+    try:
+        ledger_parts, agent_parts, order, total_rows = split_ledger(ledger_path, tmp, shards, chunksize, agents_path, progress)
+        ext = ".parquet" if out_contracts and out_contracts.lower().endswith((".parquet", ".pq")) else ".csv"
+        out_parts = [os.path.join(tmp, f"out_{i:04d}{ext}") if out_contracts else None for i in range(shards)]
+        tasks = [(ledger_parts[i], agent_parts[i], out_parts[i], master_path, chunksize, as_of) for i in range(shards)]
+
+        # fork 가능하면 부모에서 1회 로드한 마스터를 워커가 그대로 상속 (작업마다 피클링하지 않음)
+        if "fork" in mp.get_all_start_methods():
+            ctx = mp.get_context("fork")
+            _MASTER = load_master(master_path)
+        else:
+            ctx = mp.get_context("spawn")
+        prog = Progress("shards", progress)
+        results = []
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker, initargs=(master_path,)) as pool:
+            for res in pool.map(_run_shard, tasks):
+                results.append(res)
+                prog.update(1)
+        prog.done()
+
+        per_agent = pd.concat(results, ignore_index=True).set_index("agent_id").reindex(pd.Index(order, name="agent_id")).reset_index()
+        if out_contracts:
+            merge_contract_parts(out_parts, out_contracts, total_rows, chunksize)
+        if out_agents:
+            writer = TableWriter(out_agents)
+            writer.write(per_agent)
+            writer.close()
+        return per_agent
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
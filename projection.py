@@ -0,0 +1,171 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from batch import Progress, TableWriter, iter_table
+from engine import agent_positions
+
+# =========================
+# 36개월 수수료 현금흐름 (계약 × 회차 행렬)
+#   열 m = m회차 보험료 납입분 (1 = 초회, 익월 지급)
+#   1차년 항목은 1회차, 2·3차년 일시 항목은 13·25회차, 유지수수료는 13~24 / 25~36회차 매월
+#   유지 곡선: 13회차/25회차 예상 유지율을 지나는 월 단위 기하 보간 (25회차 이후는 13→25 구간 월 유지율 유지)
+# =========================
+PROJECTION_MONTHS = 36
+
+# (흐름, 계약 출력 컬럼, 시작 회차, 종료 회차)
+SCHEDULE = [
+    ("recruit_fee", "recruit_fee", 1, 1),
+    ("perf1", "perf1", 1, 1),
+    ("init2_1", "init2_1", 1, 1),
+    ("sh_bonus", "sh_bonus", 1, 1),
+    ("retention1", "retention1_amt", 13, 24),
+    ("perf2", "perf2", 13, 13),
+    ("init2_2", "init2_2", 13, 13),
+    ("retention2", "retention2_amt", 25, 36),
+    ("perf3", "perf3", 25, 25),
+    ("init2_3", "init2_3", 25, 25),
+]
+STREAM_LABELS = {
+    "recruit_fee": "모집수수료", "perf1": "성과수수료1", "init2_1": "초기정착수수료2-1", "sh_bonus": "전략건강 보너스",
+    "retention1": "유지수수료1", "perf2": "성과수수료2", "init2_2": "초기정착수수료2-2",
+    "retention2": "유지수수료2", "perf3": "성과수수료3", "init2_3": "초기정착수수료2-3",
+}
+AMOUNT_COLUMNS = [col for _, col, _, _ in SCHEDULE]
+DTYPES = {"float64": np.float64, "float32": np.float32, "int64": np.int64}
+
+def survival_curve(retention_13th, retention_25th, months: int = PROJECTION_MONTHS, dtype=np.float64) -> np.ndarray:
+    # (설계사/계약 수, months) 회차별 유지 확률, 1회차 = 1
+    r13 = np.clip(np.asarray(retention_13th, dtype=float).reshape(-1, 1) / 100.0, 0.0, 1.0)
+    r25 = np.minimum(np.clip(np.asarray(retention_25th, dtype=float).reshape(-1, 1) / 100.0, 0.0, 1.0), r13)
+    m = np.arange(1, months + 1, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(r13 > 0, r25 / r13, 0.0)
+        first = r13 ** ((np.minimum(m, 13) - 1) / 12.0)
+        later = ratio ** (np.maximum(m - 13, 0) / 12.0)
+    return (first * later).astype(dtype, copy=False)
+
+def project(contracts: pd.DataFrame, survival: np.ndarray, dtype="float64", by_stream: bool = False):
+    # contracts: 계약 출력 (AMOUNT_COLUMNS), survival: 계약 행별 유지 곡선 (n, 36)
+    # → (n, 36) 회차별 예상 지급액, by_stream이면 {흐름: (n, 36)}
+    n, months = survival.shape
+    work = np.float32 if dtype == "float32" else np.float64
+    out = {} if by_stream else np.zeros((n, months), dtype=work)
+    for stream, col, lo, hi in SCHEDULE:
+        if lo > months:
+            continue
+        hi = min(hi, months)
+        amount = contracts[col].to_numpy(dtype=work).reshape(-1, 1)
+        if by_stream:
+            mat = np.zeros((n, months), dtype=work)
+            mat[:, lo - 1:hi] = amount * survival[:, lo - 1:hi]
+            out[stream] = _cast(mat, dtype)
+        else:
+            out[:, lo - 1:hi] += amount * survival[:, lo - 1:hi]
+    return out if by_stream else _cast(out, dtype)
+
+def _cast(mat: np.ndarray, dtype: str) -> np.ndarray:
+    # int64: 회차별 원 단위 반올림
+    return np.rint(mat).astype(np.int64) if dtype == "int64" else mat
+
+def stream_totals(contracts: pd.DataFrame, survival: np.ndarray) -> np.ndarray:
+    # (흐름 수, 36) 계약 합계 (행렬을 흐름별로 만들지 않고 구간 열만 합산)
+    n, months = survival.shape
+    out = np.zeros((len(SCHEDULE), months))
+    for k, (_, col, lo, hi) in enumerate(SCHEDULE):
+        if lo <= months:
+            hi = min(hi, months)
+            out[k, lo - 1:hi] = contracts[col].to_numpy(dtype=float) @ survival[:, lo - 1:hi]
+    return out
+
+def book_frame(totals: np.ndarray) -> pd.DataFrame:
+    months = totals.shape[1]
+    df = pd.DataFrame(totals.T, columns=[s for s, _, _, _ in SCHEDULE])
+    df.insert(0, "month", np.arange(1, months + 1))
+    df["total"] = totals.sum(axis=0)
+    return df
+
+# =========================
+# 전체 계약 (배치 출력) 스트리밍 투영
+#   메모리 = 청크 × 36 + 설계사 × 36 (행렬 출력은 .npy memmap에 청크 단위로 기록)
+# =========================
+def _count_rows(path: str, chunksize: int = 200_000) -> int:
+    if path.lower().endswith((".parquet", ".pq")):
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).metadata.num_rows
+    # CSV는 본 읽기와 같은 청크 파서로 셈 (따옴표 안 줄바꿈 · 빈 줄을 개행 수로 세면 행렬 끝에 0행이 남음)
+    return sum(len(chunk) for chunk in iter_table(path, chunksize, ["agent_id"]))
+
+def read_agents(path: str) -> pd.DataFrame:
+    if path.lower().endswith((".parquet", ".pq")):
+        df = pd.read_parquet(path, columns=["agent_id", "retention_13th", "retention_25th"])
+    else:
+        df = pd.read_csv(path, usecols=["agent_id", "retention_13th", "retention_25th"], encoding="utf-8-sig", dtype={"agent_id": str})
+    df["agent_id"] = df["agent_id"].astype(str)
+    return df
+
+def project_book(contracts_path: str, agents_path: str, out_book: str = None, out_agents: str = None,
+                 out_matrix: str = None, chunksize: int = 200_000, dtype: str = "float64", progress: bool = True):
+    agents = read_agents(agents_path)
+    survival = survival_curve(agents["retention_13th"], agents["retention_25th"])
+    months = survival.shape[1]
+    book = np.zeros((len(SCHEDULE), months))
+    per_agent = np.zeros((len(agents), months)) if out_agents else None
+    matrix = None
+    if out_matrix:
+        matrix = np.lib.format.open_memmap(out_matrix, mode="w+", dtype=DTYPES[dtype], shape=(_count_rows(contracts_path, chunksize), months))
+
+    prog = Progress("projection", progress)
+    row = 0
+    for chunk in iter_table(contracts_path, chunksize, ["agent_id"] + AMOUNT_COLUMNS):
+        pos = agent_positions(agents["agent_id"], chunk["agent_id"].astype(str))
+        s = survival[pos]
+        book += stream_totals(chunk, s)
+        if matrix is not None or per_agent is not None:
+            mat = project(chunk, s, dtype)
+            if matrix is not None:
+                matrix[row:row + len(chunk)] = mat
+            if per_agent is not None:
+                for j in range(months):
+                    per_agent[:, j] += np.bincount(pos, weights=mat[:, j], minlength=len(agents))
+        row += len(chunk)
+        prog.update(len(chunk))
+    prog.done()
+    if matrix is not None:
+        matrix.flush()
+
+    result = book_frame(book)
+    if out_book:
+        w = TableWriter(out_book)
+        w.write(result)
+        w.close()
+    if out_agents:
+        df = pd.DataFrame(per_agent.astype(DTYPES[dtype]) if dtype == "int64" else per_agent, columns=[f"m{j + 1:02d}" for j in range(months)])
+        df.insert(0, "agent_id", agents["agent_id"].to_numpy())
+        w = TableWriter(out_agents)
+        w.write(df)
+        w.close()
+    return result
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="배치 출력 → 36개월 수수료 현금흐름 (유지율 반영)")
+    p.add_argument("contracts", help="batch.py 계약별 출력 (.csv/.parquet)")
+    p.add_argument("agents", help="batch.py 설계사 출력 (.csv/.parquet)")
+    p.add_argument("--out-book", default="projection_book.csv", help="회차별 × 흐름별 전체 합계")
+    p.add_argument("--out-agents", default="", help="설계사 × 회차 합계 (선택)")
+    p.add_argument("--out-matrix", default="", help="계약 × 회차 행렬 .npy (선택, memmap 기록)")
+    p.add_argument("--dtype", choices=list(DTYPES), default="float64", help="행렬/설계사 출력 자료형 (int64 = 원 단위 반올림)")
+    p.add_argument("--chunksize", type=int, default=200_000)
+    p.add_argument("--quiet", action="store_true")
+    return p
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    project_book(
+        args.contracts, args.agents, args.out_book or None, args.out_agents or None, args.out_matrix or None,
+        chunksize=args.chunksize, dtype=args.dtype, progress=not args.quiet,
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+import argparse
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from batch import LEDGER_ALIASES, Progress, TableWriter, _to_number, iter_ledger, iter_table
+from parallel import shard_of
+
+# =========================
+# 지급 원장 대사 (예측 vs 실지급)
+#   예측: batch.py 계약별/설계사별 출력 (기준 월 1개)
+#   실지급: 급여 지급 내역 (설계사, 계약, 지급월, 항목, 지급액) 세로형
+#   키 = 설계사 + 계약 + 지급월 + 항목 (정착보장은 설계사 단위, 계약 키 "")
+#   양쪽 계약번호가 없으면 설계사 + 항목 합계로 대사
+#
+#   메모리 상한: 설계사 수 + 버킷 1개
+#     pass 1: 양쪽을 청크 단위로 agent_id 해시 버킷 파일에 분할 (parallel.shard_of)
+#     pass 2: 버킷별 키 합산 후 해시 조인 → 허용오차 초과분만 기록 (버킷 순, 버킷 안은 설계사/계약 순)
+# =========================
+ITEMS = {
+    "recruit_fee": "모집",
+    "perf1": "성과1",
+    "init2_1": "초기정착2-1",
+    "sh_bonus": "전략건강",
+    "settle_bonus": "정착보장",
+}
+CONTRACT_ITEMS = ["recruit_fee", "perf1", "init2_1", "sh_bonus"]
+ITEM_ALIASES = {
+    "recruit_fee": ["모집", "모집수수료", "recruit", "recruit_fee"],
+    "perf1": ["성과1", "성과수수료1", "perf1"],
+    "init2_1": ["초기정착2-1", "초기정착수수료2-1", "init2_1"],
+    "sh_bonus": ["전략건강", "전략건강보너스", "sh_bonus"],
+    "settle_bonus": ["정착보장", "정착보장수수료", "settle", "settle_bonus"],
+}
+PAID_ALIASES = {
+    "agent_id": LEDGER_ALIASES["agent_id"],
+    "contract_id": LEDGER_ALIASES["contract_id"],
+    "month": ["지급월", "지급년월", "month", "pay_month"],
+    "item": ["항목", "지급항목", "수수료항목", "item"],
+    "amount": ["지급액", "지급금액", "금액", "amount", "paid"],
+}
+_PAID_LOOKUP = {a.lower().replace(" ", ""): std for std, alts in PAID_ALIASES.items() for a in alts}
+_PAID_LOOKUP_CONTRACT = [a.lower().replace(" ", "") for a in PAID_ALIASES["contract_id"]]
+_ITEM_LOOKUP = {a.lower().replace(" ", ""): std for std, alts in ITEM_ALIASES.items() for a in alts}
+KEY_COLUMNS = ["agent_id", "contract_id", "item"]
+AGENT_FLAGS = [
+    "std_activity", "cond_month", "cond_amt_init2", "init2_capped", "eligible_init2",
+    "retention_1st", "std_retention_now", "final_guarantee", "eligible_settle",
+]
+
+# =========================
+# 사유 코드 (엔진 eligible_init2 / eligible_settle 조건 분해)
+#   reason_codes 조건 목록과 같은 순서, 조건이 여러 개 어긋나면 먼저 나열된 사유
+# =========================
+REASONS = {
+    "UNKNOWN_AGENT": "예측 설계사 출력에 없는 설계사",
+    "INIT2_NO_STD_ACTIVITY": "초기정착2 미대상: 표준활동 미달성",
+    "INIT2_OVER_MONTHS": "초기정착2 미대상: 위임차월 초과",
+    "INIT2_BELOW_MIN_EFF": "초기정착2 미대상: 유효환산 하한 미달",
+    "INIT2_CAPPED": "초기정착2 없음: 성과 지급률이 최대 지급률 이상",
+    "SETTLE_OVER_MONTHS": "정착보장 미대상: 위임차월 초과",
+    "SETTLE_NO_STD_ACTIVITY": "정착보장 미대상: 표준활동 미달성",
+    "SETTLE_LOW_RETENTION": "정착보장 미대상: 당월 유지율 기준 미달",
+    "SETTLE_NO_GUARANTEE": "정착보장 미대상: 보장금액 구간 미달",
+    "NOT_PAID": "예측 금액 미지급",
+    "NOT_PREDICTED": "예측에 없는 지급",
+    "AMOUNT_DIFF": "금액 차이",
+}
+
+def reason_codes(df: pd.DataFrame) -> np.ndarray:
+    # df: item, predicted, paid, known(설계사 존재) + AGENT_FLAGS
+    item = df["item"].to_numpy()
+    paid_extra = df["paid"].to_numpy() > df["predicted"].to_numpy()
+    init2 = (item == "init2_1") & paid_extra & ~df["eligible_init2"].to_numpy(bool)
+    settle = (item == "settle_bonus") & paid_extra & ~df["eligible_settle"].to_numpy(bool)
+    ret = df["retention_1st"].to_numpy(float)
+    std_now = df["std_retention_now"].to_numpy(float)
+    low_retention = ~np.isnan(std_now) & (ret < np.nan_to_num(std_now))
+    conditions = [
+        ~df["known"].to_numpy(bool),
+        init2 & ~df["std_activity"].to_numpy(bool),
+        init2 & ~df["cond_month"].to_numpy(bool),
+        init2 & ~df["cond_amt_init2"].to_numpy(bool),
+        (item == "init2_1") & paid_extra & df["init2_capped"].to_numpy(bool),
+        settle & ~df["cond_month"].to_numpy(bool),
+        settle & ~df["std_activity"].to_numpy(bool),
+        settle & low_retention,
+        settle & ~(df["final_guarantee"].to_numpy(float) > 0),
+        df["paid_rows"].to_numpy() == 0,
+        df["predicted_rows"].to_numpy() == 0,
+    ]
+    return np.select(conditions, list(REASONS)[:len(conditions)], default="AMOUNT_DIFF")
+
+# =========================
+# 입력 정리
+# =========================
+def normalize_paid(df: pd.DataFrame, month: str, by_contract: bool) -> pd.DataFrame:
+    # 실지급 청크 → agent_id, contract_id, item, paid (기준 월·대사 항목만)
+    df = df.rename(columns={c: _PAID_LOOKUP.get(str(c).strip().lower().replace(" ", ""), c) for c in df.columns})
+    missing = {"agent_id", "item", "amount"} - set(df.columns)
+    if missing:
+        raise ValueError(f"지급 원장에 필수 컬럼이 없습니다: {sorted(missing)}")
+    if "month" in df.columns:
+        df = df[df["month"].astype(str).str.replace(r"[^0-9]", "", regex=True).str[:6] == month.replace("-", "")]
+    item = df["item"].astype(str).str.strip().str.lower().str.replace(" ", "", regex=False).map(_ITEM_LOOKUP)
+    out = pd.DataFrame({
+        "agent_id": df["agent_id"].astype(str).str.strip(),
+        "contract_id": df["contract_id"].astype(str).str.strip() if by_contract and "contract_id" in df.columns else "",
+        "item": item,
+        "paid": np.rint(_to_number(df["amount"]).to_numpy(float)).astype(np.int64),
+    })
+    out.loc[out["item"] == "settle_bonus", "contract_id"] = ""
+    return out.dropna(subset=["item"])
+
+def predicted_long(contracts: pd.DataFrame, by_contract: bool) -> pd.DataFrame:
+    # 계약별 출력 청크 → 세로형 (0원 항목 제외: 지급이 있으면 NOT_PREDICTED로 잡힘)
+    ids = contracts["contract_id"].astype(str).str.strip() if by_contract else pd.Series("", index=contracts.index)
+    parts = [
+        pd.DataFrame({"agent_id": contracts["agent_id"].astype(str), "contract_id": ids.to_numpy(), "item": item,
+                      "predicted": contracts[item].to_numpy(np.int64)})
+        for item in CONTRACT_ITEMS
+    ]
+    out = pd.concat(parts, ignore_index=True)
+    return out[out["predicted"] != 0]
+
+def _columns(path: str) -> set:
+    if path.lower().endswith((".parquet", ".pq")):
+        import pyarrow.parquet as pq
+        names = pq.ParquetFile(path).schema_arrow.names
+    else:
+        names = pd.read_csv(path, nrows=0, encoding="utf-8-sig").columns
+    return {str(c).strip().lower().replace(" ", "") for c in names}
+
+def read_agents(path: str) -> pd.DataFrame:
+    # batch.py 설계사 출력 (사유 판정 컬럼 + 정착보장 예측액)
+    columns = ["agent_id", "settle_bonus"] + AGENT_FLAGS
+    if path.lower().endswith((".parquet", ".pq")):
+        df = pd.read_parquet(path, columns=columns)
+    else:
+        df = pd.read_csv(path, usecols=columns, encoding="utf-8-sig", dtype={"agent_id": str})
+    df["agent_id"] = df["agent_id"].astype(str)
+    for col in ["std_activity", "cond_month", "cond_amt_init2", "init2_capped", "eligible_init2", "eligible_settle"]:
+        df[col] = df[col].astype(str).str.upper().isin(["TRUE", "1"])
+    return df.reset_index(drop=True)
+
+# =========================
+# 대사 실행
+# =========================
+def _sum_keys(df: pd.DataFrame, value: str) -> pd.DataFrame:
+    # 같은 키 여러 행(정정/추가 지급) 합산, 행 수 유지
+    return df.groupby(KEY_COLUMNS, sort=False).agg(**{value: (value, "sum"), f"{value}_rows": (value, "size")}).reset_index()
+
+def _join_bucket(pred: pd.DataFrame, paid: pd.DataFrame, agents: pd.DataFrame, tolerance: int) -> pd.DataFrame:
+    merged = _sum_keys(pred, "predicted").merge(_sum_keys(paid, "paid"), on=KEY_COLUMNS, how="outer")
+    for col in ["predicted", "paid", "predicted_rows", "paid_rows"]:
+        merged[col] = merged[col].fillna(0).astype(np.int64)
+    merged["delta"] = merged["paid"] - merged["predicted"]
+    merged = merged[merged["delta"].abs() > tolerance]
+    if merged.empty:
+        return None
+    pos = pd.Index(agents["agent_id"]).get_indexer(merged["agent_id"])
+    flags = agents[AGENT_FLAGS].reindex(pos).reset_index(drop=True)  # 없는 설계사 = NaN 행
+    merged = pd.concat([merged.reset_index(drop=True), flags], axis=1)
+    merged["known"] = pos >= 0
+    merged["reason"] = reason_codes(merged)
+    merged["item_label"] = merged["item"].map(ITEMS)
+    merged["reason_text"] = merged["reason"].map(REASONS)
+    merged = merged.sort_values(["agent_id", "contract_id", "item"], kind="stable")
+    return merged[["agent_id", "contract_id", "item", "item_label", "predicted", "paid", "delta", "reason", "reason_text"]]
+
+def reconcile(contracts_path: str, agents_path: str, paid_path: str, month: str, out_path: str,
+              out_summary: str = None, tolerance: int = 0, buckets: int = 64, chunksize: int = 200_000,
+              progress: bool = True) -> dict:
+    # → 항목별 {예측 합, 지급 합, 차이 건수}
+    agents = read_agents(agents_path)
+    by_contract = "contract_id" in _columns(contracts_path) and bool(_columns(paid_path) & set(_PAID_LOOKUP_CONTRACT))
+    totals = {item: {"predicted": 0, "paid": 0, "deltas": 0} for item in ITEMS}
+    per_agent = {}  # (agent_id, item) → [예측, 지급]
+
+    def _accumulate(df: pd.DataFrame, value: str):
+        k = 0 if value == "predicted" else 1
+        for (agent, item), amount in df.groupby(["agent_id", "item"], sort=False)[value].sum().items():
+            per_agent.setdefault((agent, item), [0, 0])[k] += int(amount)
+            totals[item][value] += int(amount)
+
+    tmp = tempfile.mkdtemp(prefix="commission_recon_")
+    try:
+        # pass 1: 버킷 분할
+        pred_parts = [TableWriter(os.path.join(tmp, f"pred_{i:04d}.csv")) for i in range(buckets)]
+        paid_parts = [TableWriter(os.path.join(tmp, f"paid_{i:04d}.csv")) for i in range(buckets)]
+
+        def _split(df: pd.DataFrame, writers: list, value: str):
+            _accumulate(df, value)
+            for i, part in df.groupby(shard_of(df["agent_id"], buckets), sort=True):
+                writers[i].write(part)
+
+        prog = Progress("split", progress)
+        settle = agents.loc[agents["settle_bonus"] != 0, ["agent_id"]].assign(
+            contract_id="", item="settle_bonus", predicted=agents.loc[agents["settle_bonus"] != 0, "settle_bonus"].to_numpy(np.int64))
+        _split(settle, pred_parts, "predicted")
+        for chunk in iter_table(contracts_path, chunksize):
+            _split(predicted_long(chunk, by_contract), pred_parts, "predicted")
+            prog.update(len(chunk))
+        for chunk in iter_ledger(paid_path, chunksize):
+            _split(normalize_paid(chunk, month, by_contract), paid_parts, "paid")
+            prog.update(len(chunk))
+        for w in pred_parts + paid_parts:
+            w.close()
+        prog.done()
+
+        # pass 2: 버킷별 해시 조인
+        prog = Progress("join", progress)
+        writer = TableWriter(out_path)
+        read = dict(dtype={"agent_id": str, "contract_id": str}, keep_default_na=False, encoding="utf-8-sig")
+        empty = {"predicted": pd.DataFrame(columns=KEY_COLUMNS + ["predicted"]), "paid": pd.DataFrame(columns=KEY_COLUMNS + ["paid"])}
+        for i in range(buckets):
+            frames = {}
+            for value, writers in (("predicted", pred_parts), ("paid", paid_parts)):
+                path = writers[i].path
+                frames[value] = pd.read_csv(path, **read) if os.path.getsize(path) > 0 else empty[value]
+            out = _join_bucket(frames["predicted"], frames["paid"], agents, tolerance)
+            if out is not None:
+                for item, n in out["item"].value_counts().items():
+                    totals[item]["deltas"] += int(n)
+                out.insert(2, "month", month)
+                writer.write(out)
+            prog.update(1)
+        writer.close()
+        prog.done()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    if out_summary:
+        summary = pd.DataFrame(
+            [(a, i, p, q) for (a, i), (p, q) in per_agent.items()], columns=["agent_id", "item", "predicted", "paid"],
+        )
+        summary["delta"] = summary["paid"] - summary["predicted"]
+        summary = summary[summary["delta"].abs() > tolerance].sort_values(["agent_id", "item"], kind="stable")
+        summary.insert(2, "item_label", summary["item"].map(ITEMS))
+        w = TableWriter(out_summary)
+        w.write(summary.reset_index(drop=True))
+        w.close()
+    return totals
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="예측 수수료(batch.py 출력) ↔ 실지급 원장 대사")
+    p.add_argument("contracts", help="batch.py 계약별 출력 (.csv/.parquet)")
+    p.add_argument("agents", help="batch.py 설계사 출력 (.csv/.parquet)")
+    p.add_argument("paid", help="지급 원장 CSV (설계사, 계약번호, 지급월, 항목, 지급액)")
+    p.add_argument("--month", required=True, type=lambda s: datetime.strptime(s, "%Y-%m").strftime("%Y-%m"), help="지급 년월 YYYY-MM (배치 기준 년월)")
+    p.add_argument("--out", default="reconcile_deltas.csv", help="계약 × 항목 차이 (.csv/.parquet)")
+    p.add_argument("--out-summary", default="", help="설계사 × 항목 합계 차이 (선택)")
+    p.add_argument("--tolerance", type=int, default=0, help="허용 오차 (원, 절댓값 초과분만 출력)")
+    p.add_argument("--buckets", type=int, default=64, help="해시 버킷 수 (메모리 = 전체 / 버킷 수)")
+    p.add_argument("--chunksize", type=int, default=200_000)
+    p.add_argument("--quiet", action="store_true")
+    return p
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    totals = reconcile(
+        args.contracts, args.agents, args.paid, args.month, args.out, args.out_summary or None,
+        tolerance=args.tolerance, buckets=args.buckets, chunksize=args.chunksize, progress=not args.quiet,
+    )
+    for item, t in totals.items():
+        print(f"{ITEMS[item]:<8} 예측 {t['predicted']:>16,} 지급 {t['paid']:>16,} 차이 {t['paid'] - t['predicted']:>+14,} ({t['deltas']:,}건)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import itertools
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from engine import (
+    AGENT_COLUMNS, TERM_FIELDS, agent_context, agent_summary, contract_base, entries_frame,
+    resolve_tiers, sh_bonus_amounts, term_coefficients, term_sums,
+)
+
+# =========================
+# What-if 시나리오 스윕
+#   시나리오 1개 = 가상 설계사 1명 (계약 구성은 동일)
+#   구간/계수는 계약합으로 시나리오 전체를 한 번에 평가
+#   건별 절사 금액은 시나리오 계수(고유값)별로 계약 × 계수 합산
+# =========================
+SWEEP_PARAMS = {
+    "retention_1st": "당월 유지율(%)",
+    "retention_13th": "13회차 유지율(%)",
+    "retention_25th": "25회차 유지율(%)",
+    "refund_p": "당월 예상 환수성적",
+    "refund_amt": "당월 예상 환수금",
+    "direct_recruits": "직도입 인원(명)",
+    "std_activity": "표준활동 달성",
+}
+RESULT_COLUMNS = [
+    "effective_converted", "base_rate", "sum_recruit", "sum_perf1", "sum_init2_1",
+    "sum_sh_bonus", "settle_bonus", "next_month_total",
+]
+
+def scenario_grid(base_agent: dict, axes: dict) -> pd.DataFrame:
+    # axes: {파라미터: 값 목록} → 데카르트 곱, 나머지는 base_agent 값
+    unknown = set(axes) - set(SWEEP_PARAMS)
+    if unknown:
+        raise ValueError(f"스윕할 수 없는 항목: {sorted(unknown)}")
+    names = list(axes)
+    combos = list(itertools.product(*(axes[n] for n in names))) if names else [()]
+    grid = pd.DataFrame(combos, columns=names)
+    for col in AGENT_COLUMNS:
+        if col not in grid.columns:
+            grid[col] = base_agent.get(col, 0) if col != "agent_id" else 0
+    grid["agent_id"] = np.arange(len(grid))
+    return grid[AGENT_COLUMNS]
+
+def sweep(entries: list, base_agent: dict, axes: dict, master, as_of: datetime = None, tiers=None) -> pd.DataFrame:
+    tiers = resolve_tiers(tiers, as_of)
+    agents = scenario_grid(base_agent, axes)
+    n = len(agents)
+
+    contracts = entries_frame(entries)
+    base = contract_base(contracts, master, as_of, tiers)
+    y1 = int(base["y1"].sum())
+
+    ctx = agent_context(agents, np.full(n, y1), np.full(n, base["sh_count"].sum()), as_of, tiers)
+    coef = term_coefficients(*(ctx[f] for f in TERM_FIELDS))
+
+    # 전략건강 보너스도 건별 절사 → 단가(고유값)별로 계약합 계산
+    units, inv = np.unique(ctx["sh_unit"], return_inverse=True)
+    sh_bonus = sh_bonus_amounts(base["sh_count"][None, :], units[:, None]).sum(axis=1)[inv]
+
+    sums = {
+        "recruit_fee": np.full(n, y1), "perf1": term_sums(base["y1"], coef["perf1"][1]),
+        "init2_1": term_sums(base["y1"], coef["init2_1"][1]), "sh_bonus": sh_bonus,
+    }
+    per_agent = agent_summary(agents, ctx, sums, as_of, tiers)
+    return per_agent[list(axes) + RESULT_COLUMNS]
+
+def value_range(lo, hi, step) -> list:
+    # 슬라이더 범위 → 값 목록 (끝값 포함)
+    return list(np.arange(lo, hi + step / 2, step).round(6)) if step > 0 else [lo]
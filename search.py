@@ -0,0 +1,141 @@
+import re
+import unicodedata
+
+import numpy as np
+
+# =========================
+# 상품명 검색 색인 (마스터 버전당 1회 생성)
+#   정규화: NFC, 소문자, 공백 제거 ("더드림" = "더 드림")
+#   초성: 완성형 한글 → 초성 자모 ("종신" → "ㅈㅅ"), 그 외 문자는 그대로 (원문과 같은 길이)
+#   후보: 검색어 bigram(1글자면 unigram)의 역색인(정렬 int32 배열) 교집합 → 부분 문자열 확인
+#     자모가 섞인 검색어("ㅈㅅ", "종ㅅ")는 초성 문자열 색인으로 후보, 자모 자리는 해당 초성 음절 범위로 확인
+#   순위: 상품코드 일치 > 단어 시작 일치 > 부분 일치 > (일치 없으면) 초성 일치 > bigram 겹침 수
+#     같은 순위는 짧은 이름 우선 — 번호를 (길이, 이름) 순으로 매겨 두고 후보를 번호 순으로 보다가 k개가 차면 중단
+# =========================
+CHOSEONG = "ㄱㄲㄴㄷㄸㄹㅁㅂㅃㅅㅆㅇㅈㅉㅊㅋㅌㅍㅎ"
+_HANGUL_FIRST, _HANGUL_LAST, _PER_INITIAL = 0xAC00, 0xD7A3, 588
+_CODE_RE = re.compile(r"\((\d{4})\)")
+_WORD_START = set(" ()[]-/·")
+_EMPTY = np.zeros(0, dtype=np.int32)
+
+def normalize(text: str) -> str:
+    return "".join(unicodedata.normalize("NFC", str(text)).lower().split())
+
+def choseong(text: str) -> str:
+    out = []
+    for ch in text:
+        code = ord(ch)
+        out.append(CHOSEONG[(code - _HANGUL_FIRST) // _PER_INITIAL] if _HANGUL_FIRST <= code <= _HANGUL_LAST else ch)
+    return "".join(out)
+
+def _grams(text: str) -> set:
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+def _pattern(query: str):
+    # 자모 자리는 "그 초성으로 시작하는 음절 또는 자모 자체"
+    parts = []
+    for ch in query:
+        i = CHOSEONG.find(ch)
+        if i >= 0:
+            lo = chr(_HANGUL_FIRST + i * _PER_INITIAL)
+            hi = chr(_HANGUL_FIRST + (i + 1) * _PER_INITIAL - 1)
+            parts.append(f"[{ch}{lo}-{hi}]")
+        else:
+            parts.append(re.escape(ch))
+    return re.compile("".join(parts))
+
+class ProductSearch:
+    def __init__(self, names):
+        self.names = sorted(dict.fromkeys(names), key=lambda n: (len(n), n))  # 번호 = 같은 순위 안의 우선순위
+        self.texts, self.chos, self.starts, self.codes = [], [], [], {}
+        text_index, cho_index, text_prefix, cho_prefix = {}, {}, {}, {}
+        for pid, name in enumerate(self.names):
+            # 공백 제거 문자열 + 단어 시작 위치 (공백/괄호 다음)
+            text, starts, prev = [], set(), " "
+            for ch in unicodedata.normalize("NFC", name).lower():
+                if ch.isspace():
+                    prev = ch
+                    continue
+                if prev in _WORD_START or prev.isspace():
+                    starts.add(len(text))
+                text.append(ch)
+                prev = ch
+            text = "".join(text)
+            cho = choseong(text)
+            self.texts.append(text)
+            self.chos.append(cho)
+            self.starts.append(starts)
+            for code in _CODE_RE.findall(name):
+                self.codes.setdefault(code, []).append(pid)
+            for g in _grams(text) | set(text):
+                text_index.setdefault(g, []).append(pid)
+            for g in _grams(cho) | set(cho):
+                cho_index.setdefault(g, []).append(pid)
+            # 단어 첫 1~2글자 (prefix 색인)
+            for g in {text[p:p + n] for p in starts for n in (1, 2)}:
+                text_prefix.setdefault(g, []).append(pid)
+            for g in {cho[p:p + n] for p in starts for n in (1, 2)}:
+                cho_prefix.setdefault(g, []).append(pid)
+        self._text_index, self._cho_index, self._text_prefix, self._cho_prefix = (
+            {g: np.array(p, dtype=np.int32) for g, p in index.items()}
+            for index in (text_index, cho_index, text_prefix, cho_prefix)
+        )
+
+    def __len__(self):
+        return len(self.names)
+
+    def _candidates(self, index: dict, grams: set) -> np.ndarray:
+        postings = sorted((index.get(g, _EMPTY) for g in grams), key=len)
+        if not postings:
+            return _EMPTY
+        out = postings[0]
+        for p in postings[1:]:
+            if not len(out):
+                break
+            out = np.intersect1d(out, p, assume_unique=True)
+        return out
+
+    def search(self, query: str, k: int = 20) -> list:
+        # → 상위 k개 상품명 (검색어가 비면 빈 목록)
+        q = normalize(query)
+        if not q or k <= 0:
+            return []
+        jamo = any(ch in CHOSEONG for ch in q)
+        key = choseong(q) if jamo else q
+        index, prefix = (self._cho_index, self._cho_prefix) if jamo else (self._text_index, self._text_prefix)
+        candidates = self._candidates(index, _grams(key))
+        pattern = _pattern(q)
+
+        found = list(dict.fromkeys(self.codes.get(q, [])))[:k]
+        seen = set(found)
+        # 1) 단어 시작 일치: prefix 색인 ∩ 후보를 번호 순으로, k개가 차면 중단
+        for pid in np.intersect1d(candidates, prefix.get(key[:2], _EMPTY), assume_unique=True).tolist():
+            if len(found) >= k:
+                break
+            if pid not in seen and any(m.start() in self.starts[pid] for m in pattern.finditer(self.texts[pid])):
+                found.append(pid)
+                seen.add(pid)
+        # 2) 부분 일치
+        for pid in candidates.tolist():
+            if len(found) >= k:
+                break
+            if pid not in seen and pattern.search(self.texts[pid]):
+                found.append(pid)
+        if not found:
+            found = self._fuzzy(q, k)
+        return [self.names[pid] for pid in found]
+
+    def _fuzzy(self, q: str, k: int) -> list:
+        # 일치가 없을 때: 초성이 같은 철자 오류("유니벌셜") → bigram 절반 이상 겹침
+        cho = choseong(q)
+        grams = _grams(cho)
+        found = [pid for pid in self._candidates(self._cho_index, grams).tolist() if cho in self.chos[pid]][:k]
+        if found:
+            return found
+        grams = _grams(q)
+        hits = np.bincount(np.concatenate([self._text_index.get(g, _EMPTY) for g in grams] + [_EMPTY]), minlength=len(self.names))
+        need = max(1, (len(grams) + 1) // 2)
+        ok = np.flatnonzero(hits >= need)
+        return ok[np.lexsort((ok, -hits[ok]))][:k].tolist()
@@ -0,0 +1,349 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from batch import prepare_agents, prepare_contracts
+from engine import CONTRACT_COLUMNS, OPTIONAL_CONTRACT_COLUMNS, compute_commissions, resolve_tiers
+from master import MasterStore
+from metrics import LATENCY_WINDOW, LatencyStats
+from memo import LRUCache, input_key
+from tiers import default_tiers
+
+# =========================
+# 계산 API (ASGI, 프레임워크 없음)
+#   POST /v1/agent   : 설계사 1명 {"agent": {...}, "contracts": [...], "as_of": "YYYY-MM"}
+#   POST /v1/agents  : 여러 명 {"agents": [{..., "contracts": [...]}], "as_of": "YYYY-MM"}
+#   GET  /v1/health  : 마스터/규정 버전
+#   GET  /v1/metrics : 경로별 지연 p50/p95/p99, 마이크로배치 크기, 결과 캐시 적중률
+#   GET  /metrics    : 같은 지연/카운터의 Prometheus 텍스트
+#   동시 요청은 MicroBatcher가 max_wait 동안 모아 compute_commissions 1회로 평가
+#   워커 프로세스마다 MasterStore (컴파일 사이드카 mmap → 프로세스 간 페이지 공유)
+#   설계사 결과는 정규화 입력 해시로 LRU 캐시 (agent_id 제외 → 같은 계약 구성이면 설계사가 달라도 재사용)
+# =========================
+DEFAULT_MASTER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "product_master.csv")
+AGENT_FIELDS = [
+    "agent_id", "contract_months", "total_converted_raw", "effective_converted", "base_rate", "f1", "dr_bonus",
+    "eligible_init2", "delta_R", "total_sh_count", "sh_unit", "sum_recruit", "sum_perf1", "sum_init2_1", "sum_sh_bonus",
+    "final_guarantee", "eligible_settle", "settle_bonus", "next_month_total",
+]
+CONTRACT_FIELDS = [
+    "product", "type", "pay_year", "premium", "r1", "r2", "r3", "sh_flag", "recruit_fee", "perf1", "init2_1", "sh_bonus",
+    "perf2", "init2_2", "retention1_amt", "perf3", "init2_3", "retention2_amt",
+]
+
+class RequestError(ValueError):
+    # 400 응답 (입력 오류)
+    pass
+
+def _json_default(o):
+    if isinstance(o, np.integer):
+        return int(o)
+    if isinstance(o, np.floating):
+        return None if np.isnan(o) else float(o)
+    if isinstance(o, np.bool_):
+        return bool(o)
+    raise TypeError(type(o).__name__)
+
+def parse_as_of(text) -> datetime:
+    if not text:
+        return datetime.combine(date.today(), datetime.min.time())
+    try:
+        return datetime.strptime(str(text), "%Y-%m")
+    except ValueError as exc:
+        raise RequestError("as_of는 YYYY-MM 형식입니다.") from exc
+
+# =========================
+# 마이크로배치: 동시 요청 → 설계사 행을 이어 붙여 벡터 평가 1회
+# =========================
+class MicroBatcher:
+    def __init__(self, evaluate, max_batch: int = 1024, max_wait: float = 0.002):
+        self.evaluate = evaluate      # jobs → 결과 목록 (동기, 스레드에서 실행)
+        self.max_batch = max_batch    # 배치당 설계사 수 상한
+        self.max_wait = max_wait      # 첫 요청 후 대기 (초)
+        self.queue = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="calc")
+        self.batches = deque(maxlen=LATENCY_WINDOW)  # 배치당 설계사 수
+        self._worker = None
+
+    async def submit(self, job: dict):
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.get_loop() is not loop:
+            self.queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+        fut = loop.create_future()
+        await self.queue.put((job, fut))
+        return await fut
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            size = len(batch[0][0]["agents"])
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch:
+                try:
+                    item = self.queue.get_nowait() if not self.queue.empty() else \
+                        await asyncio.wait_for(self.queue.get(), max(deadline - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                size += len(item[0]["agents"])
+            self.batches.append(size)
+            jobs = [job for job, _ in batch]
+            try:
+                results = await loop.run_in_executor(self.executor, self.evaluate, jobs)
+            except Exception:
+                # 한 요청의 오류가 배치 전체로 번지지 않도록 요청별로 다시 평가
+                results = []
+                for job in jobs:
+                    try:
+                        results.append((await loop.run_in_executor(self.executor, self.evaluate, [job]))[0])
+                    except Exception as exc:
+                        results.append(exc)
+            for (_, fut), res in zip(batch, results):
+                if fut.done():
+                    continue
+                if isinstance(res, Exception):
+                    fut.set_exception(res)
+                else:
+                    fut.set_result(res)
+
+    def snapshot(self) -> dict:
+        sizes = np.fromiter(self.batches, dtype=float)
+        if not len(sizes):
+            return {"batches": 0}
+        return {"batches": len(sizes), "mean_agents": round(float(sizes.mean()), 2), "max_agents": int(sizes.max())}
+
+# =========================
+# 계산
+# =========================
+def parse_job(agents: list, as_of) -> dict:
+    # 요청 본문 → 설계사/계약 행 목록 (형식만 확인, 정리는 배치 단위로 evaluate_jobs에서 1회)
+    if not isinstance(agents, list) or not agents:
+        raise RequestError("agents는 1명 이상의 목록입니다.")
+    agent_rows, contract_rows = [], []
+    for i, a in enumerate(agents):
+        if not isinstance(a, dict):
+            raise RequestError("설계사 항목은 객체입니다.")
+        contracts = a.get("contracts") or []
+        if not isinstance(contracts, list) or not all(isinstance(c, dict) for c in contracts):
+            raise RequestError("contracts는 객체 목록입니다.")
+        agent_rows.append({k: v for k, v in a.items() if k != "contracts"})
+        contract_rows.extend((i, c) for c in contracts)
+    as_of = parse_as_of(as_of)
+    ids = [str(a.get("agent_id", i)) for i, a in enumerate(agent_rows)]
+    # 캐시 키: 기준일 + 설계사 입력 + 계약 목록 (agent_id 제외)
+    #   as_of 생략 시 오늘(일 단위)이고 마스터/규정 버전도 일 단위로 정해지므로 월이 아닌 일로 구분
+    keys = [
+        input_key(as_of.date().isoformat(), _without_id(a), [_without_id(c) for c in (agents[i].get("contracts") or [])])
+        for i, a in enumerate(agent_rows)
+    ]
+    # 컬럼 구성이 같은 요청끼리만 이어 붙임 (위임년월 vs year/month 등 별칭 혼용 방지)
+    schema = (frozenset(k for a in agent_rows for k in a), frozenset(k for _, c in contract_rows for k in c))
+    return {"as_of": as_of, "ids": ids, "keys": keys, "schema": schema, "agents": agent_rows, "contracts": contract_rows}
+
+def _without_id(row: dict) -> dict:
+    return {k: v for k, v in row.items() if k != "agent_id"}
+
+def subset_job(job: dict, idx: list) -> dict:
+    # 요청 중 일부 설계사만 (캐시 미적중분)
+    pos = {i: n for n, i in enumerate(idx)}
+    return {
+        **job,
+        "ids": [job["ids"][i] for i in idx], "keys": [job["keys"][i] for i in idx],
+        "agents": [job["agents"][i] for i in idx], "contracts": [(pos[i], c) for i, c in job["contracts"] if i in pos],
+    }
+
+def _prepare(jobs: list, as_of: datetime):
+    # 여러 요청의 행을 이어 붙여 배치 원장과 같은 별칭/기본값으로 정리 (설계사 번호 = 배치 내 위치)
+    agent_rows, contract_rows, offset = [], [], 0
+    for job in jobs:
+        agent_rows.extend({**a, "agent_id": str(offset + k)} for k, a in enumerate(job["agents"]))
+        contract_rows.extend({**c, "agent_id": str(offset + i)} for i, c in job["contracts"])
+        offset += len(job["agents"])
+    try:
+        agents = prepare_agents(pd.DataFrame(agent_rows), as_of)
+        cols = None if contract_rows else CONTRACT_COLUMNS + OPTIONAL_CONTRACT_COLUMNS
+        contracts = prepare_contracts(pd.DataFrame(contract_rows, columns=cols))
+    except (KeyError, ValueError) as exc:
+        raise RequestError(str(exc)) from exc
+    agents["agent_id"] = np.arange(offset)
+    contracts["agent_id"] = contracts["agent_id"].astype(int)
+    return agents, contracts
+
+def evaluate_jobs(jobs: list, master, tiers) -> list:
+    # 기준일·컬럼 구성별로 묶어 1회 계산 → 요청별로 나눔
+    results = [None] * len(jobs)
+    groups = {}
+    for i, job in enumerate(jobs):
+        groups.setdefault((job["as_of"], job["schema"]), []).append(i)
+    for (as_of, _), idx in groups.items():
+        agents, contracts = _prepare([jobs[i] for i in idx], as_of)
+        per_contract, per_agent = compute_commissions(contracts, agents, master, as_of, resolve_tiers(tiers, as_of))
+        # 계약 행은 요청/설계사 순서 그대로 → 설계사별 구간
+        bounds = np.searchsorted(per_contract["agent_id"].to_numpy(), np.arange(len(agents) + 1))
+        agent_records = per_agent[AGENT_FIELDS].to_dict("records")
+        contract_records = per_contract[[c for c in CONTRACT_FIELDS if c in per_contract.columns]].to_dict("records")
+        offset = 0
+        for i in idx:
+            out = []
+            for k, agent_id in enumerate(jobs[i]["ids"]):
+                rec = agent_records[offset + k]
+                rec["agent_id"] = agent_id
+                rec["contracts"] = contract_records[bounds[offset + k]:bounds[offset + k + 1]]
+                out.append(rec)
+            results[i] = out
+            offset += len(out)
+    return results
+
+# =========================
+# ASGI 앱
+# =========================
+class CalculationService:
+    def __init__(self, master_path: str = DEFAULT_MASTER_PATH, max_batch: int = 1024, max_wait: float = 0.002,
+                 cache_size: int = 50_000):
+        self.store = MasterStore(master_path)
+        self.store.start_watcher()
+        self.latency = LatencyStats()
+        self.batcher = MicroBatcher(self._evaluate, max_batch, max_wait)
+        self.cache = LRUCache(cache_size, "agent_results")
+
+    def _version(self) -> tuple:
+        return getattr(self.store.get(), "version", None), getattr(default_tiers(), "version", None)
+
+    async def _submit(self, job: dict) -> list:
+        # 캐시 적중 설계사는 건너뛰고, 같은 요청 안의 동일 입력은 1회만 계산
+        version = self._version()
+        self.cache.bind(version)
+        found = self.cache.get_many(job["keys"])
+        missing = {}
+        for i, key in enumerate(job["keys"]):
+            if found[key] is None:
+                missing.setdefault(key, i)
+        if missing:
+            idx = list(missing.values())
+            for i, rec in zip(idx, await self.batcher.submit(subset_job(job, idx))):
+                found[job["keys"][i]] = rec
+                if self.cache.version == version:
+                    self.cache.put(job["keys"][i], rec)
+        return [{**found[key], "agent_id": agent_id} for key, agent_id in zip(job["keys"], job["ids"])]
+
+    def _evaluate(self, jobs: list) -> list:
+        master = self.store.get()
+        if master is None:
+            raise RuntimeError("상품 마스터를 읽을 수 없습니다.")
+        return evaluate_jobs(jobs, master, default_tiers())
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+        t0 = time.perf_counter()
+        route = f"{scope['method']} {scope['path']}"
+        try:
+            status, payload = await self._dispatch(scope, receive)
+        except RequestError as exc:
+            status, payload = 400, {"error": str(exc)}
+        except Exception as exc:
+            status, payload = 500, {"error": f"{type(exc).__name__}: {exc}"}
+        if isinstance(payload, str):
+            body, content_type = payload.encode("utf-8"), b"text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body, content_type = json.dumps(payload, ensure_ascii=False, default=_json_default).encode("utf-8"), b"application/json; charset=utf-8"
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
+        if status != 404:
+            self.latency.record(route, time.perf_counter() - t0)
+
+    async def _dispatch(self, scope, receive):
+        method, path = scope["method"], scope["path"].rstrip("/")
+        if method == "GET" and path == "/v1/health":
+            master, tiers = self.store.get(), default_tiers()
+            return 200, {"status": "ok" if master is not None else "no_master",
+                         "master_version": getattr(master, "version", None), "tiers_version": getattr(tiers, "version", None)}
+        if method == "GET" and path == "/v1/metrics":
+            return 200, {"latency": self.latency.snapshot(), "batching": self.batcher.snapshot(), "cache": self.cache.snapshot()}
+        if method == "GET" and path == "/metrics":
+            for name, value in (("cache_hits", self.cache.stats["hits"]), ("cache_misses", self.cache.stats["misses"])):
+                self.latency.counters[name] = value
+            return 200, self.latency.prometheus("commission_service")
+        if method == "POST" and path in ("/v1/agent", "/v1/agents"):
+            body = await _read_json(receive)
+            if path == "/v1/agent":
+                agent = body.get("agent")
+                if not isinstance(agent, dict):
+                    raise RequestError("agent 객체가 필요합니다.")
+                job = parse_job([{**agent, "contracts": body.get("contracts", agent.get("contracts"))}], body.get("as_of"))
+                return 200, {"agent": (await self._submit(job))[0]}
+            job = parse_job(body.get("agents"), body.get("as_of"))
+            return 200, {"agents": await self._submit(job)}
+        return 404, {"error": "not found"}
+
+async def _read_json(receive) -> dict:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    try:
+        body = json.loads(b"".join(chunks) or b"{}")
+    except json.JSONDecodeError as exc:
+        raise RequestError(f"JSON 본문 오류: {exc}") from exc
+    if not isinstance(body, dict):
+        raise RequestError("본문은 JSON 객체입니다.")
+    return body
+
+def create_app() -> CalculationService:
+    # uvicorn 워커마다 1회 (설정은 환경 변수: main()이 채움)
+    return CalculationService(
+        os.environ.get("COMMISSION_MASTER_PATH", DEFAULT_MASTER_PATH),
+        max_batch=int(os.environ.get("COMMISSION_MAX_BATCH", 1024)),
+        max_wait=float(os.environ.get("COMMISSION_MAX_WAIT_MS", 2)) / 1000.0,
+        cache_size=int(os.environ.get("COMMISSION_CACHE_SIZE", 50_000)),
+    )
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="수수료 계산 JSON API (ASGI)")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8000)
+    p.add_argument("--workers", type=int, default=1, help="프로세스 수 (마스터는 사이드카 mmap으로 공유)")
+    p.add_argument("--master", default=DEFAULT_MASTER_PATH)
+    p.add_argument("--max-batch", type=int, default=1024, help="배치당 설계사 수 상한")
+    p.add_argument("--max-wait-ms", type=float, default=2.0, help="배치 모음 대기 (ms)")
+    p.add_argument("--cache-size", type=int, default=50_000, help="설계사 결과 캐시 건수 (0=사용 안 함)")
+    return p
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        import uvicorn
+    except ImportError as exc:
+        raise RuntimeError("서비스 실행에는 uvicorn이 필요합니다.") from exc
+    os.environ["COMMISSION_MASTER_PATH"] = os.path.abspath(args.master)
+    os.environ["COMMISSION_MAX_BATCH"] = str(args.max_batch)
+    os.environ["COMMISSION_MAX_WAIT_MS"] = str(args.max_wait_ms)
+    os.environ["COMMISSION_CACHE_SIZE"] = str(args.cache_size)
+    # 사이드카를 미리 컴파일해 워커들이 같은 파일을 mmap
+    MasterStore(args.master)
+    uvicorn.run("service:create_app", factory=True, host=args.host, port=args.port, workers=args.workers,
+                log_level="warning", access_log=False)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+import argparse
+import multiprocessing as mp
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from batch import (
+    Progress, TableWriter, _parse_as_of, _to_number, iter_ledger, load_master, normalize_ledger_columns,
+    prepare_agents, prepare_contracts,
+)
+from engine import (
+    AGENT_COLUMNS, TERM_FIELDS, agent_context, agent_positions, agent_summary, commission_terms, contract_base,
+    entries_frame, int_bincount, mul_div, resolve_tiers, sh_bonus_amounts, term_coefficients, to_bp, won,
+)
+
+# =========================
+# 해지(청철/반송/무효/해지) 몬테카를로
+#   시행 1회 = 계약별 베르누이(해지율) → 해지 계약 제외 후 같은 파이프라인
+#   (유효환산 → 구간 → 성과수수료/초기정착2/정착보장)
+#   환수성적 = 해지 계약 환산 합, 환수금 = 해지 계약의 기준(무해지) 1차년 수수료 합
+#   시행별 생존 계약 합(행렬곱)만으로 평가, 시행 = 가상 설계사 1명
+#   건별 절사 항목은 단가/지급률 후보별 계약 금액 열을 미리 만들어 같은 행렬곱으로 합산
+# =========================
+DEFAULT_LAPSE_RATE = 0.03
+PERCENTILES = (10, 50, 90)
+_BLOCK = 4_000_000  # 시행 × 계약 난수 블록 크기 (메모리 상한)
+_EVAL_ROWS = 250_000  # 설계사 × 시행 평가 블록 행 수
+SINGLE_SHARDS = 16  # 단일 프로세스도 설계사 샤드 단위로 계산 (메모리 = 원장 / 샤드 수)
+
+RATE_ALIASES = ["lapse_rate", "rate", "해지율", "청약철회율", "실효율"]
+
+def load_lapse_rates(path: str) -> pd.DataFrame:
+    # 상품명/유형(선택)/해지율 CSV → product, type, rate (1 초과 값은 %로 간주)
+    df = normalize_ledger_columns(pd.read_csv(path, dtype=str, encoding="utf-8-sig", keep_default_na=False))
+    rate_col = next((c for c in df.columns if str(c).strip().lower() in RATE_ALIASES), None)
+    if rate_col is None:
+        raise ValueError("해지율 컬럼이 없습니다.")
+    out = pd.DataFrame({
+        "product": df["product"].astype(str).str.strip() if "product" in df.columns else "",
+        "type": df["type"].astype(str).str.strip() if "type" in df.columns else "",
+        "rate": _to_number(df[rate_col], np.nan).astype(float),
+    })
+    out["rate"] = np.where(out["rate"] > 1, out["rate"] / 100.0, out["rate"])
+    return out.dropna(subset=["rate"])
+
+def lapse_probabilities(contracts: pd.DataFrame, rates: pd.DataFrame = None, default: float = DEFAULT_LAPSE_RATE) -> np.ndarray:
+    # 우선순위: 상품+유형 → 상품 → 유형 → 기본값
+    p = np.full(len(contracts), float(default))
+    if rates is None or rates.empty:
+        return p
+    filled = np.zeros(len(contracts), dtype=bool)
+    keys = [
+        (rates[(rates["product"] != "") & (rates["type"] != "")], ["product", "type"]),
+        (rates[(rates["product"] != "") & (rates["type"] == "")], ["product"]),
+        (rates[(rates["product"] == "") & (rates["type"] != "")], ["type"]),
+    ]
+    for table, cols in keys:
+        if table.empty:
+            continue
+        table = table.drop_duplicates(cols, keep="last")
+        pos = pd.MultiIndex.from_frame(table[cols]).get_indexer(pd.MultiIndex.from_frame(contracts[cols].astype(str))) if len(cols) > 1 \
+            else pd.Index(table[cols[0]]).get_indexer(contracts[cols[0]].astype(str))
+        hit = (pos >= 0) & ~filled
+        p[hit] = table["rate"].to_numpy()[pos[hit]]
+        filled |= hit
+    return np.clip(p, 0.0, 1.0)
+
+def baseline_context(base: dict, pos: np.ndarray, agents: pd.DataFrame, as_of: datetime = None, tiers=None) -> dict:
+    # 기준(무해지) 구간/계수
+    n = len(agents)
+    return agent_context(
+        agents, int_bincount(pos, base["y1"], n), np.bincount(pos, weights=base["sh_count"], minlength=n), as_of, tiers,
+    )
+
+def clawback_amounts(base: dict, pos: np.ndarray, ctx: dict) -> np.ndarray:
+    # 기준(무해지) 구간으로 계약별 환수 대상 1차년 수수료
+    t = commission_terms(base["y1"], 0, 0, *(ctx[f][pos] for f in TERM_FIELDS))
+    return base["y1"] + t["perf1"] + t["init2_1"] + sh_bonus_amounts(base["sh_count"], ctx["sh_unit"][pos])
+
+def draw_lapses(y: np.ndarray, clawback: np.ndarray, p: np.ndarray, draws: int, rng: np.random.Generator) -> tuple:
+    # 설계사 1명 계약 열 (n, k) → 시행별 생존 합 (draws, k), 환수성적, 환수금
+    n = len(p)
+    kept = np.empty((draws, y.shape[1]))
+    lapsed_p = np.empty(draws)
+    lapsed_amt = np.empty(draws)
+    step = max(1, _BLOCK // max(n, 1))
+    for lo in range(0, draws, step):
+        hi = min(draws, lo + step)
+        keep = (rng.random((hi - lo, n)) >= p).astype(float)
+        kept[lo:hi] = keep @ y
+        lapse = 1.0 - keep
+        lapsed_p[lo:hi] = lapse @ y[:, 0]
+        lapsed_amt[lo:hi] = lapse @ clawback
+    return kept, lapsed_p, lapsed_amt
+
+def evaluate_draws(agents: pd.DataFrame, kept: np.ndarray, units: np.ndarray, bases: np.ndarray,
+                   as_of: datetime = None, tiers=None) -> pd.DataFrame:
+    # 시행 1개 = 가상 설계사 1행 (agents는 시행 수만큼 반복된 설계사 입력, kept 열 구성은 _contract_arrays)
+    nu, nb = len(units), len(bases)
+    rows = np.arange(len(kept))
+    amounts = np.rint(kept).astype(np.int64)  # 정수 금액 합 (float 행렬곱은 2^53 미만에서 정확)
+    ctx = agent_context(agents, amounts[:, 0], kept[:, 3], as_of, tiers)
+    ib = np.searchsorted(bases, ctx["base_bp"])
+    sums = {
+        "recruit_fee": amounts[:, 0],
+        "perf1": amounts[:, 4 + nu:4 + nu + nb][rows, ib],
+        "init2_1": np.where(ctx["delta_bp"] > 0, amounts[:, 4 + nu + nb:][rows, ib], 0),
+        "sh_bonus": amounts[:, 4:4 + nu][rows, np.searchsorted(units, ctx["sh_unit"])],
+    }
+    return agent_summary(agents, ctx, sums, as_of, tiers)
+
+def _contract_arrays(base: dict, pos: np.ndarray, ctx: dict, tiers) -> tuple:
+    # 계약별 열: y1/y2/y3/전략건강 건수 | 단가별 전략건강 보너스 | 지급률 후보별 성과1 | 지급률 후보별 초기정착2-1
+    #   (초기정착2율 = rmax − 지급률, 시행별 대상 여부는 evaluate_draws에서 적용)
+    units = won(np.unique(tiers.per_unit_bonus.values))
+    bases = np.unique(to_bp(tiers.performance_rate_table.values))
+    y1 = base["y1"][:, None]
+    coef = term_coefficients(
+        bases[None, :], ctx["f1_bp"][pos][:, None], 0, 0, ctx["dr_bp"][pos][:, None],
+        np.maximum(0, to_bp(tiers.rmax) - bases)[None, :],
+    )
+    y = np.hstack([
+        np.column_stack([base["y1"], base["y2"], base["y3"], base["sh_count"]]),
+        sh_bonus_amounts(base["sh_count"][:, None], units[None, :]),
+        mul_div(y1, coef["perf1"][1]),
+        mul_div(y1, coef["init2_1"][1]),
+    ]).astype(float)
+    return y, units, bases
+
+def simulate(base: dict, agent: pd.DataFrame, p: np.ndarray, draws: int, rng: np.random.Generator,
+             as_of: datetime = None, tiers=None) -> dict:
+    # base: contract_base 결과 (설계사 1명 계약), agent: AGENT_COLUMNS 1행 → 시행별 표본
+    tiers = resolve_tiers(tiers, as_of)
+    pos = np.zeros(len(p), dtype=np.int64)
+    ctx = baseline_context(base, pos, agent, as_of, tiers)
+    y, units, bases = _contract_arrays(base, pos, ctx, tiers)
+    kept, lapsed_p, lapsed_amt = draw_lapses(y, clawback_amounts(base, pos, ctx), p, draws, rng)
+    summary = evaluate_draws(agent.iloc[np.zeros(draws, dtype=int)].reset_index(drop=True), kept, units, bases, as_of, tiers)
+    return {
+        "next_month_total": summary["next_month_total"].to_numpy(float),
+        "effective_converted": summary["effective_converted"].to_numpy(float),
+        "refund_p": lapsed_p,
+        "refund_amt": lapsed_amt,
+    }
+
+def summarize(samples: dict, percentiles=PERCENTILES) -> dict:
+    # {항목_p10: ..., 항목_p50: ..., 항목_p90: ..., 항목_mean: ...}, 표본이 (설계사, 시행)이면 설계사별 배열
+    out = {}
+    for name, values in samples.items():
+        qs = np.percentile(values, percentiles, axis=-1)
+        for q, v in zip(percentiles, qs):
+            out[f"{name}_p{q}"] = v if np.ndim(v) else float(v)
+        mean = values.mean(axis=-1)
+        out[f"{name}_mean"] = mean if np.ndim(mean) else float(mean)
+    return out
+
+def agent_rng(seed: int, agent_ids) -> list:
+    # 설계사별 독립 난수열 (agent_id 고정 해시 → 샤드/워커 배치와 무관하게 재현)
+    h = pd.util.hash_pandas_object(pd.Series(agent_ids, dtype=str), index=False).to_numpy()
+    return [np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(int(k),))) for k in h]
+
+# =========================
+# 단일 설계사 (Streamlit 화면용)
+# =========================
+def simulate_single(entries: list, agent: dict, master, draws: int = 10_000, seed: int = 0,
+                    rates: pd.DataFrame = None, default_rate: float = DEFAULT_LAPSE_RATE,
+                    as_of: datetime = None, tiers=None) -> dict:
+    tiers = resolve_tiers(tiers, as_of)
+    contracts = entries_frame(entries)
+    base = contract_base(contracts, master, as_of, tiers)
+    agents = pd.DataFrame([{**agent, "agent_id": 0}], columns=AGENT_COLUMNS)
+    p = lapse_probabilities(contracts, rates, default_rate)
+    samples = simulate(base, agents, p, draws, np.random.default_rng(seed), as_of, tiers)
+    return summarize(samples)
+
+# =========================
+# 전체 설계사 (원장 → 설계사별 P10/P50/P90)
+#   parallel.split_ledger로 설계사 샤드 분할 → 샤드별 simulate_ledger (workers > 1이면 프로세스 풀)
+#   원장 경로는 batch와 같이 CSV / portfolios.db#YYYY-MM / data/ledger#YYYY-MM[/지점] (iter_ledger가 해석)
+# =========================
+def simulate_ledger(ledger_path: str, master, agents_path: str = None, draws: int = 10_000, seed: int = 0,
+                    rates: pd.DataFrame = None, default_rate: float = DEFAULT_LAPSE_RATE, chunksize: int = 200_000,
+                    as_of: datetime = None, tiers=None, progress: bool = True) -> pd.DataFrame:
+    tiers = resolve_tiers(tiers, as_of)
+    # 샤드 1개 분량을 메모리에 올려 계산 (전체 원장은 simulate_book이 샤드로 나눠 전달)
+    chunks = list(iter_ledger(ledger_path, chunksize))
+    contracts = prepare_contracts(pd.concat(chunks, ignore_index=True)) if chunks else None
+    if agents_path is not None:
+        agents = prepare_agents(pd.read_csv(agents_path, dtype=str, encoding="utf-8-sig", keep_default_na=False), as_of, tiers)
+    elif contracts is not None:
+        agents = prepare_agents(contracts.drop_duplicates("agent_id"), as_of, tiers)
+    else:
+        return pd.DataFrame(columns=["agent_id"])
+    if contracts is None:
+        contracts = pd.DataFrame(columns=["agent_id", "product", "type", "pay_year", "premium"])
+
+    base = contract_base(contracts, master, as_of, tiers)
+    p = lapse_probabilities(contracts, rates, default_rate)
+    pos = agent_positions(agents["agent_id"], contracts["agent_id"])
+    ctx = baseline_context(base, pos, agents, as_of, tiers)
+    y, units, bases = _contract_arrays(base, pos, ctx, tiers)
+    clawback = clawback_amounts(base, pos, ctx)
+    order = np.argsort(pos, kind="stable")
+    starts = np.searchsorted(pos[order], np.arange(len(agents) + 1))
+    rngs = agent_rng(seed, agents["agent_id"])
+
+    # 설계사 블록 단위: 난수/행렬곱은 설계사별, 구간·수수료 평가는 블록 전체 (설계사 × 시행) 1회
+    prog = Progress("simulate", progress)
+    block = max(1, _EVAL_ROWS // max(draws, 1))
+    parts = []
+    for a0 in range(0, len(agents), block):
+        a1 = min(len(agents), a0 + block)
+        kept, lapsed_p, lapsed_amt = [], [], []
+        for i in range(a0, a1):
+            idx = order[starts[i]:starts[i + 1]]
+            k, lp, la = draw_lapses(y[idx], clawback[idx], p[idx], draws, rngs[i])
+            kept.append(k), lapsed_p.append(lp), lapsed_amt.append(la)
+        rep = agents.iloc[np.repeat(np.arange(a0, a1), draws)].reset_index(drop=True)
+        summary = evaluate_draws(rep, np.concatenate(kept), units, bases, as_of, tiers)
+        shape = (a1 - a0, draws)
+        stats = summarize({
+            "next_month_total": summary["next_month_total"].to_numpy(float).reshape(shape),
+            "effective_converted": summary["effective_converted"].to_numpy(float).reshape(shape),
+            "refund_p": np.concatenate(lapsed_p).reshape(shape),
+            "refund_amt": np.concatenate(lapsed_amt).reshape(shape),
+        })
+        parts.append(pd.DataFrame({"agent_id": agents["agent_id"].iloc[a0:a1].to_numpy(), "contracts": np.diff(starts[a0:a1 + 1]), **stats}))
+        prog.update(a1 - a0)
+    prog.done()
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=["agent_id", "contracts"])
+
+_MASTER = None
+
+def _init_worker(master_path: str):
+    global _MASTER
+    if _MASTER is None:
+        _MASTER = load_master(master_path)
+
+def _run_shard(task):
+    ledger_part, agents_part, kw = task
+    return simulate_ledger(ledger_part, _MASTER, agents_part, progress=False, **kw)
+
+def simulate_book(ledger_path: str, master_path: str, out_path: str, agents_path: str = None, draws: int = 10_000,
+                  seed: int = 0, rates_path: str = None, default_rate: float = DEFAULT_LAPSE_RATE,
+                  chunksize: int = 200_000, as_of: datetime = None, workers: int = 1, shards: int = None,
+                  progress: bool = True) -> pd.DataFrame:
+    global _MASTER
+    as_of = as_of or datetime.today()  # 워커 간 기준일 고정
+    tiers = resolve_tiers(None, as_of)
+    rates = load_lapse_rates(rates_path) if rates_path else None
+    kw = dict(draws=draws, seed=seed, rates=rates, default_rate=default_rate, chunksize=chunksize, as_of=as_of, tiers=tiers)
+
+    from parallel import split_ledger
+    workers = workers or os.cpu_count() or 1
+    shards = shards or (workers * 4 if workers > 1 else SINGLE_SHARDS)
+    tmp = tempfile.mkdtemp(prefix="commission_mc_")
+    try:
+        ledger_parts, agent_parts, order, _ = split_ledger(ledger_path, tmp, shards, chunksize, agents_path, progress)
+        tasks = [(ledger_parts[i], agent_parts[i], kw) for i in range(shards)]
+        prog = Progress("shards", progress)
+        parts = []
+        if workers == 1:
+            _MASTER = load_master(master_path)
+            for task in tasks:
+                parts.append(_run_shard(task))
+                prog.update(1)
+        else:
+            if "fork" in mp.get_all_start_methods():
+                ctx = mp.get_context("fork")
+                _MASTER = load_master(master_path)
+            else:
+                ctx = mp.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker, initargs=(master_path,)) as pool:
+                for res in pool.map(_run_shard, tasks):
+                    parts.append(res)
+                    prog.update(1)
+        prog.done()
+        result = pd.concat(parts, ignore_index=True).set_index("agent_id").reindex(pd.Index(order, name="agent_id")).reset_index()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    if out_path:
+        writer = TableWriter(out_path)
+        writer.write(result)
+        writer.close()
+    return result
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="해지 몬테카를로: 설계사별 익월 총합/환수 P10·P50·P90")
+    p.add_argument("ledger", help="계약 원장 CSV (batch.py와 동일 형식), 저장소 portfolios.db#YYYY-MM 또는 파티션 원장 data/ledger#YYYY-MM[/지점,...]")
+    p.add_argument("--agents", help="설계사 입력 CSV (없으면 원장의 설계사 컬럼 사용)")
+    p.add_argument("--master", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "product_master.csv"))
+    p.add_argument("--lapse-rates", help="상품명/유형/해지율 CSV (없는 상품은 --default-rate)")
+    p.add_argument("--default-rate", type=float, default=DEFAULT_LAPSE_RATE, help="기본 해지율 (0~1)")
+    p.add_argument("--draws", type=int, default=10_000)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", default="agent_simulation.csv", help=".csv 또는 .parquet")
+    p.add_argument("--chunksize", type=int, default=200_000)
+    p.add_argument("--as-of", type=_parse_as_of, help="기준 년월 YYYY-MM (기본: 오늘)")
+    p.add_argument("--workers", type=int, default=1, help="프로세스 수 (0=전체 코어, 1=단일 프로세스)")
+    p.add_argument("--shards", type=int, help=f"설계사 샤드 수 (기본: 워커 수 × 4, 단일 프로세스는 {SINGLE_SHARDS})")
+    p.add_argument("--quiet", action="store_true")
+    return p
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    simulate_book(
+        args.ledger, args.master, args.out, agents_path=args.agents, draws=args.draws, seed=args.seed,
+        rates_path=args.lapse_rates, default_rate=args.default_rate, chunksize=args.chunksize, as_of=args.as_of,
+        workers=args.workers, shards=args.shards, progress=not args.quiet,
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import argparse
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from batch import load_master
+from engine import (
+    AGENT_COLUMNS, BP, TERM_FIELDS, agent_context, agent_summary, as_of_day, commission_terms, rate_bp, resolve_tiers,
+    sh_bonus_amounts,
+)
+from memo import PRODUCT_OPTIONS
+
+# =========================
+# 다음 구간 역산 (break-even)
+#   익월 총합은 추가 계약의 1차년 환산(y1)과 전략건강 건수에만 의존
+#   → 설계사별 "필요 환산P" 1개를 구하고, 상품별 추가 월초 = 필요 환산P / 1차년 성적률
+#   이득(gain)은 환산 합계에 수식을 한 번 적용한 추정값 (건별 절사 차이로 계약 수 이내 원만큼 클 수 있음)
+# =========================
+TIER_SOURCES = ["성과수수료", "정착보장", "초기정착2"]
+
+def _next_break(table, x) -> np.ndarray:
+    # 다음 구간에 진입하는 최소값 ("gt" 경계는 1원 초과), 마지막 구간이면 inf
+    idx = table.index(x)
+    if len(table.breaks) == 0:
+        return np.full(np.shape(x), np.inf)
+    i = np.clip(idx, 0, len(table.breaks) - 1)
+    entry = table.breaks[i] + np.where(table.ge[i], 0.0, 1.0)
+    return np.where(idx < len(table.breaks), entry, np.inf)
+
+def totals_after(per_agent: pd.DataFrame, d_converted, d_sh_count, as_of: datetime = None, tiers=None) -> np.ndarray:
+    # 환산P/전략건강 건수를 더했을 때 익월 총합 (환산 합계 기준 추정)
+    tiers = resolve_tiers(tiers, as_of)
+    agents = per_agent[AGENT_COLUMNS]
+    raw = per_agent["total_converted_raw"].to_numpy(np.int64) + np.asarray(d_converted, dtype=np.int64)
+    sh = per_agent["total_sh_count"].to_numpy(float) + d_sh_count
+    ctx = agent_context(agents, raw, sh, as_of, tiers)
+    terms = commission_terms(raw, 0, 0, *(ctx[f] for f in TERM_FIELDS))
+    sums = {"recruit_fee": raw, "perf1": terms["perf1"], "init2_1": terms["init2_1"], "sh_bonus": sh_bonus_amounts(sh, ctx["sh_unit"])}
+    return agent_summary(agents, ctx, sums, as_of, tiers)["next_month_total"].to_numpy(np.int64)
+
+def solve_next_tier(per_agent: pd.DataFrame, as_of: datetime = None, tiers=None) -> pd.DataFrame:
+    # per_agent: compute_commissions / batch 설계사 출력
+    tiers = resolve_tiers(tiers, as_of)
+    per_agent = per_agent.reset_index(drop=True)
+    eff = per_agent["effective_converted"].to_numpy(float)
+    months = per_agent["contract_months"].to_numpy()
+    std_activity = per_agent["std_activity"].to_numpy(bool)
+    in_window = months <= tiers.init2_max_months
+
+    # 구간별 다음 경계 (해당 없는 구간은 inf)
+    candidates = np.vstack([
+        _next_break(tiers.performance_rate_table.cols, eff),
+        np.where(in_window, _next_break(tiers.guarantee_base, eff), np.inf),
+        np.where(in_window & std_activity & (eff < tiers.init2_min_eff), tiers.init2_min_eff, np.inf),
+    ])
+    target = candidates.min(axis=0)
+    source = np.array([
+        "/".join(s for s, hit in zip(TIER_SOURCES, col) if hit) for col in (candidates == target).T
+    ], dtype=object)
+    reachable = np.isfinite(target)
+
+    # 환수성적 차감 전 기준 필요 환산P (환수성적이 환산보다 커도 그대로 성립)
+    signed_eff = _signed_eff(per_agent)
+    gap = np.where(reachable, np.where(reachable, target, 0.0) - signed_eff, np.nan)
+
+    current = totals_after(per_agent, 0, 0, as_of, tiers)
+    d = np.ceil(np.nan_to_num(gap)).astype(np.int64)
+    out = pd.DataFrame({
+        "agent_id": per_agent["agent_id"],
+        "effective_converted": eff,
+        "next_threshold": np.where(reachable, target, np.nan),
+        "next_tier_source": np.where(reachable, source, ""),
+        "gap_converted": gap,
+        "current_total": current,
+    })
+    # 전략건강 상품은 추가 건수(0 / 0.5 / 1 …)에 따라 보너스가 달라짐 → 건수별 이득
+    for cnt in np.unique(tiers.strategic_count.values):
+        out[gain_column(cnt)] = np.where(reachable, totals_after(per_agent, d, cnt, as_of, tiers) - current, np.nan)
+    return out
+
+def _signed_eff(per_agent: pd.DataFrame) -> np.ndarray:
+    return per_agent["total_converted_raw"].to_numpy(np.int64) - np.rint(per_agent["refund_p"].to_numpy(float)).astype(np.int64)
+
+def gain_column(sh_count: float) -> str:
+    return "gain" if sh_count == 0 else f"gain_sh_{sh_count:g}"
+
+def product_options(master, day: int = None) -> pd.DataFrame:
+    # 판매 중(기준일 적용) 상품/유형/납기별 1차년 성적률, 전략건강 여부
+    # (마스터 버전, 기준일)당 1회만 생성, 호출 측은 복사본을 받아 열 추가
+    day = as_of_day() if day is None else day
+    key = (master.version, day)
+    df = PRODUCT_OPTIONS.get(key)
+    if df is None:
+        tree = master.tree(day)
+        strategic = master.strategic_names()
+        rows = [
+            (nm, tp, py, node["rates"][py][0], nm in strategic)
+            for nm, types in tree.items() for tp, node in types.items() for py in node["payyears"]
+        ]
+        df = pd.DataFrame(rows, columns=["product", "type", "pay_year", "r1", "strategic"])
+        df = df[df["r1"] > 0].reset_index(drop=True)
+        PRODUCT_OPTIONS.put(key, df)
+    return df.copy()
+
+def premium_to_reach(signed_eff, target, r1) -> np.ndarray:
+    # 유효환산이 target에 닿는 최소 월초 보험료 (엔진 환산 premium × r_bp // 10^4 ≥ gap ⇔ premium ≥ ⌈gap × 10^4 / r_bp⌉)
+    gap = np.maximum(np.ceil(np.asarray(target, dtype=float)).astype(np.int64) - np.asarray(signed_eff, dtype=np.int64), 0)
+    return -(-gap * BP // rate_bp(r1))
+
+def products_for_agent(agent_result, master, as_of: datetime = None, tiers=None, top_k: int = None, sol=None) -> pd.DataFrame:
+    # 설계사 1명 (compute_single 결과 / 배치 설계사 행): 상품별 최소 추가 월초 보험료와 익월 총합 증가분
+    # sol: 이미 구한 solve_next_tier 행이 있으면 넘겨서 다시 풀지 않음
+    tiers = resolve_tiers(tiers, as_of)
+    per_agent = pd.DataFrame([dict(agent_result)])
+    if sol is None:
+        sol = solve_next_tier(per_agent, as_of, tiers).iloc[0]
+    opts = product_options(master, as_of_day(as_of))
+    if not np.isfinite(sol["gap_converted"]):
+        return opts.iloc[:0].assign(add_premium=[], gain=[])
+    opts["add_premium"] = premium_to_reach(_signed_eff(per_agent)[0], sol["next_threshold"], opts["r1"])
+    # 실제 추가 환산은 보험료 올림만큼 gap보다 조금 크므로 상품별로 다시 평가
+    rep = per_agent.iloc[np.zeros(len(opts), dtype=int)].reset_index(drop=True)
+    cnt = np.where(opts["strategic"], tiers.strategic_count(opts["add_premium"]), 0.0)
+    opts["gain"] = totals_after(rep, opts["add_premium"].to_numpy() * rate_bp(opts["r1"]) // BP, cnt, as_of, tiers) - sol["current_total"]
+    opts = opts.sort_values(["add_premium", "gain"], ascending=[True, False], kind="stable")
+    return opts.head(top_k) if top_k else opts
+
+TOP_PRODUCT_COLUMNS = ["agent_id", "product", "type", "pay_year", "add_premium", "gain"]
+
+def top_products(per_agent: pd.DataFrame, master, as_of: datetime = None, tiers=None, top_k: int = 5,
+                 sol: pd.DataFrame = None) -> pd.DataFrame:
+    # 배치 (설계사 N명 × 상품 후보 M개): 설계사별 최소 추가 월초 상위 top_k 상품 (long 형식, 순서는 products_for_agent와 같음)
+    #   추가 월초는 N×M 행렬로 한 번에, 익월 총합 재평가는 설계사별 k번째 월초 이하(동률 포함) 후보만
+    tiers = resolve_tiers(tiers, as_of)
+    per_agent = per_agent.reset_index(drop=True)
+    if sol is None:
+        sol = solve_next_tier(per_agent, as_of, tiers)
+    opts = product_options(master, as_of_day(as_of))
+    reach = np.flatnonzero(np.isfinite(sol["gap_converted"].to_numpy(float)))
+    r_bp = rate_bp(opts["r1"])
+    prem = premium_to_reach(_signed_eff(per_agent)[reach, None], sol["next_threshold"].to_numpy(float)[reach, None], opts["r1"].to_numpy()[None, :])
+    k = min(top_k, len(opts))
+    if len(reach) == 0 or k == 0:
+        return pd.DataFrame({c: [] for c in TOP_PRODUCT_COLUMNS})
+    kth = np.partition(prem, k - 1, axis=1)[:, k - 1]
+    ai, oi = np.nonzero(prem <= kth[:, None])
+    add_premium = prem[ai, oi]
+    rows = reach[ai]
+    cnt = np.where(opts["strategic"].to_numpy()[oi], tiers.strategic_count(add_premium), 0.0)
+    rep = per_agent.iloc[rows].reset_index(drop=True)
+    gain = totals_after(rep, add_premium * r_bp[oi] // BP, cnt, as_of, tiers) - sol["current_total"].to_numpy(np.int64)[rows]
+    order = np.lexsort((oi, -gain, add_premium, rows))
+    out = pd.DataFrame({
+        "agent_id": per_agent["agent_id"].to_numpy()[rows],
+        "product": opts["product"].to_numpy()[oi],
+        "type": opts["type"].to_numpy()[oi],
+        "pay_year": opts["pay_year"].to_numpy()[oi],
+        "add_premium": add_premium,
+        "gain": gain,
+    }).iloc[order]
+    rank = out.groupby(rows[order], sort=False).cumcount().to_numpy()
+    return out[rank < k].reset_index(drop=True)
+
+# =========================
+# CLI: 배치 설계사 출력 → 설계사별 다음 구간
+# =========================
+def _read_table(path: str) -> pd.DataFrame:
+    if path.lower().endswith((".parquet", ".pq")):
+        return pd.read_parquet(path)
+    return pd.read_csv(path, encoding="utf-8-sig", dtype={"agent_id": str})
+
+def _write_table(df: pd.DataFrame, path: str):
+    if path.lower().endswith((".parquet", ".pq")):
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False, encoding="utf-8-sig")
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="설계사별 다음 수수료 구간까지 필요 환산P / 익월 총합 증가분")
+    p.add_argument("agents", help="batch.py 설계사 출력 (.csv/.parquet)")
+    p.add_argument("--out", default="next_tier.csv")
+    p.add_argument("--as-of", type=lambda s: datetime.strptime(s, "%Y-%m"), help="배치와 같은 기준 년월 YYYY-MM")
+    p.add_argument("--top-k", type=int, default=0, help="설계사별 최소 추가 월초 상위 N개 상품도 출력 (0이면 생략)")
+    p.add_argument("--products-out", default="next_tier_products.csv", help="--top-k 출력 (agent_id, product, type, pay_year, add_premium, gain)")
+    p.add_argument("--master", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "product_master.csv"))
+    args = p.parse_args(argv)
+    per_agent = _read_table(args.agents)
+    tiers = resolve_tiers(None, args.as_of)
+    out = solve_next_tier(per_agent, args.as_of, tiers)
+    _write_table(out, args.out)
+    print(f"{len(out):,} agents → {os.path.abspath(args.out)}")
+    if args.top_k > 0:
+        products = top_products(per_agent, load_master(args.master), args.as_of, tiers, args.top_k, sol=out)
+        _write_table(products, args.products_out)
+        print(f"{len(products):,} rows → {os.path.abspath(args.products_out)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+import argparse
+import os
+import re
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# =========================
+# 설계사 수수료 명세 (화면 demo2.py와 같은 항목 · 문구 · 금액 표기)
+#   항목 함수(summary_items / settle_reasons / init2_reasons / next_month_items / contract_sections)는
+#   화면과 일괄 명세가 같이 사용 → 문구를 한 곳에서만 관리
+#   a: 설계사 결과 1행 (agent_summary 출력 = 입력값 + 구간/계수 + 합계), r: 계약 결과 1행 (contract_commissions 출력)
+# =========================
+PAY_CONDITIONS = [
+    "성과수수료 : 지급월 기준 환산가동인 자",
+    "초기정착수수료2 : 지급월 기준 표준활동 달성 및 유효환산 100만P 이상인 자",
+]
+
+def _won(v) -> str:
+    return f"{v:,.0f}원"
+
+def std_now_of(a) -> float:
+    # 설계사 결과의 기준 유지율 (없으면 None, 화면 std_retention과 같은 값)
+    v = a.get("std_retention_now")
+    return None if v is None or pd.isna(v) else int(v)
+
+def summary_items(a, std_now) -> list:
+    # 당월 수수료 요약 → [(항목, 값)]
+    base_rate, f1, direct_recruits = a["base_rate"], a["f1"], int(a["direct_recruits"])
+    items = [
+        ("당월환산보험료", f"{int(a['total_converted_raw']):,}P"),
+        ("당월 예상 환수성적", f"{int(a['refund_p']):,}P"),
+        ("유효환산보험료", f"{int(a['effective_converted']):,}P"),
+        ("기준 유지율", "해당사항없음" if std_now is None else f"{std_now}%"),
+        ("현재 유지율", f"{a['retention_1st']:g}%"),
+    ]
+    caption = []
+    if base_rate > 0:
+        if f1 != 1.0:
+            caption.append(f"지급률 {int(base_rate * 100)}% × 유지율 가감 {int(f1 * 100)}%")
+        if direct_recruits >= 1:
+            dr_txt = "5%p" if direct_recruits == 1 else ("10%p" if direct_recruits == 2 else "15%p")
+            caption.append(f"+ 직도입우대 {dr_txt}" if f1 != 1.0 else f"지급률 {int(base_rate * 100)}% + 직도입우대 {dr_txt}")
+    rate = f"{int(base_rate * f1 * 100)}%"
+    items.append(("성과수수료 지급률", f"{rate}  ( * " + " ".join(caption) + " )" if caption else rate))
+    if a["cond_month"]:
+        add, final = int(a["add_guarantee"]), int(a["final_guarantee"])
+        items.append(("정착보장수수료 보장금액", _won(final) + (f" (* 직도입 +{add // 10000:,}만원)" if add > 0 else "")))
+    return items
+
+def settle_reasons(a, std_now) -> list:
+    # 정착보장수수료 미산출 이유 (대상 월인데 0원일 때만)
+    if not a["cond_month"] or a["settle_bonus"] != 0:
+        return []
+    reasons = []
+    if int(a["final_guarantee"]) == 0:
+        reasons.append("유효환산 구간 미달")
+    if not a["std_activity"]:
+        reasons.append("표준활동 미달성")
+    if std_now is not None and a["retention_1st"] < std_now:
+        reasons.append("당월 유지율 기준 미달")
+    return reasons
+
+def init2_reasons(a) -> list:
+    # 초기정착수수료2 미산출 이유
+    if a["eligible_init2"]:
+        return []
+    reasons = []
+    if not a["std_activity"]:
+        reasons.append("표준활동 미달성")
+    if not a["cond_month"]:
+        reasons.append("위임 13차월 이상")
+    if not a["cond_amt_init2"]:
+        reasons.append("유효환산 100만원 미만")
+    if a["init2_capped"]:
+        reasons.append("성과수수료 최대 지급률 달성 상태")
+    return reasons
+
+def next_month_items(a) -> list:
+    # 익월 예상 수수료 → [(항목, 값)] (총합은 별도)
+    items = [
+        ("모집수수료", _won(a["sum_recruit"])),
+        ("성과수수료1", _won(a["sum_perf1"])),
+        ("초기정착수수료2-1", _won(a["sum_init2_1"])),
+        ("전략건강 보너스", _won(a["sum_sh_bonus"])),
+    ]
+    if a["cond_month"]:
+        items.append(("정착보장 수수료", _won(a["settle_bonus"])))
+    return items
+
+def contract_sections(r) -> list:
+    # 상품별 예상 수수료 → [(구간 제목, [(항목, 값)])]
+    first = [("모집수수료", _won(r["recruit_fee"])), ("성과수수료1", _won(r["perf1"])), ("초기정착수수료2-1", _won(r["init2_1"]))]
+    if r["sh_bonus"] > 0:
+        first.append(("전략건강 보너스", _won(r["sh_bonus"])))
+    return [
+        ("1차년(익월) 수수료", first),
+        ("2차년 수수료", [
+            ("유지수수료1 (13~24회차 보험료 납입시)", _won(r["retention1_amt"])),
+            ("성과수수료2", _won(r["perf2"])), ("초기정착수수료2-2", _won(r["init2_2"])),
+        ]),
+        ("3차년 수수료", [
+            ("유지수수료2 (25~36회차 보험료 납입시)", _won(r["retention2_amt"])),
+            ("성과수수료3", _won(r["perf3"])), ("초기정착수수료2-3", _won(r["init2_3"])),
+        ]),
+    ]
+
+def statement(a, contracts: list, month_label: str) -> dict:
+    # 명세 1건 (HTML/엑셀 공통 구조)
+    std_now = std_now_of(a)
+    return {
+        "agent_id": a["agent_id"],
+        "month": month_label,
+        "appointed": f"{int(a['year'])}-{int(a['month']):02d}",
+        "summary": summary_items(a, std_now),
+        "settle_reasons": settle_reasons(a, std_now),
+        "init2_reasons": init2_reasons(a),
+        "next_month": next_month_items(a),
+        "total": _won(a["next_month_total"]),
+        "contracts": [
+            {
+                "title": f"{r['product']} ({r['type']})", "strategic": bool(r["sh_flag"]),
+                "premium": _won(r["premium"]), "pay_year": r["pay_year"], "sections": contract_sections(r),
+            }
+            for r in contracts
+        ],
+        "conditions": PAY_CONDITIONS,
+    }
+
+# =========================
+# 렌더링 (템플릿은 프로세스당 1회 컴파일)
+# =========================
+STATEMENT_FORMATS = ("html", "pdf", "xlsx")
+STATEMENT_TEMPLATE = """<!doctype html>
+<html lang="ko"><head><meta charset="utf-8"><title>{{ s.month }} 수수료 명세 - {{ s.agent_id }}</title>
+<style>
+@page { size: A4; margin: 14mm; }
+body { font-family: "Malgun Gothic", "Apple SD Gothic Neo", "Noto Sans KR", sans-serif; font-size: 10.5pt; color: #111; }
+h1 { font-size: 16pt; margin: 0 0 4px; } h2 { font-size: 13pt; margin: 18px 0 6px; } h3 { font-size: 11pt; margin: 12px 0 4px; }
+.meta { color: #555; margin-bottom: 10px; }
+.box { padding: 8px 12px; border-radius: 6px; margin: 6px 0; }
+.info { background: #e8f1fb; } .warn { background: #fff7e0; } .ok { background: #e9f7ef; }
+ul { margin: 2px 0; padding-left: 18px; } .total { font-weight: 700; margin-top: 6px; }
+.contract { border-top: 1px solid #ccc; padding-top: 6px; page-break-inside: avoid; }
+.sh { color: #dc2626; } .reason { margin: 4px 0; }
+</style></head><body>
+<h1>📊 당월 수수료 명세</h1>
+<div class="meta">설계사 {{ s.agent_id }} · 기준월 {{ s.month }} · 위임년월 {{ s.appointed }}</div>
+<h2>📢당월 수수료 요약</h2>
+<div class="box info"><ul>{% for k, v in s.summary %}<li><b>{{ k }}</b>: {{ v }}</li>{% endfor %}</ul></div>
+{% if s.settle_reasons %}<div class="reason"><b>＊ 정착보장수수료 미산출 이유:</b> {{ s.settle_reasons | join(", ") }}</div>{% endif %}
+{% if s.init2_reasons %}<div class="reason"><b>＊ 초기정착수수료2 미산출 이유:</b> {{ s.init2_reasons | join(", ") }}</div>{% endif %}
+<h2>📢익월 예상 수수료</h2>
+<div class="box warn"><ul>{% for k, v in s.next_month %}<li><b>{{ k }}</b> : {{ v }}</li>{% endfor %}</ul>
+<div class="total">총합 : {{ s.total }}</div></div>
+<h2>📆 상품별 예상 수수료 계산</h2>
+{% for c in s.contracts %}<div class="contract">
+<h3>✅ {{ c.title }}{% if c.strategic %} <span class="sh">[전략건강]</span>{% endif %}</h3>
+<div><b>월초 보험료</b>: {{ c.premium }} · <b>납입년도</b>: {{ c.pay_year }}</div>
+{% for title, items in c.sections %}<h3>{{ title }}</h3><ul>{% for k, v in items %}<li>{{ k }} : {{ v }}</li>{% endfor %}</ul>{% endfor %}
+</div>{% endfor %}
+<div class="box ok"><b>✔️지급조건</b><ul>{% for c in s.conditions %}<li><b>＊ {{ c }}</b></li>{% endfor %}</ul></div>
+</body></html>
+"""
+_TEMPLATE = None
+
+def html_template():
+    global _TEMPLATE
+    if _TEMPLATE is None:
+        import jinja2
+        _TEMPLATE = jinja2.Environment(autoescape=True, trim_blocks=True).from_string(STATEMENT_TEMPLATE)
+    return _TEMPLATE
+
+def check_format(fmt: str):
+    # 선택 의존성은 워커 시작 전에 확인
+    if fmt == "pdf":
+        try:
+            import weasyprint  # noqa: F401
+        except ImportError as exc:
+            raise RuntimeError("PDF 출력에는 weasyprint가 필요합니다. (--format html로 만든 뒤 브라우저 인쇄로 PDF 저장 가능)") from exc
+    elif fmt == "xlsx":
+        try:
+            import openpyxl  # noqa: F401
+        except ImportError as exc:
+            raise RuntimeError("엑셀 출력에는 openpyxl이 필요합니다.") from exc
+
+def write_statement(s: dict, path: str, fmt: str):
+    if fmt == "xlsx":
+        _write_xlsx(s, path)
+        return
+    html = html_template().render(s=s)
+    if fmt == "pdf":
+        import weasyprint
+        weasyprint.HTML(string=html).write_pdf(path)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(html)
+
+def _write_xlsx(s: dict, path: str):
+    # 스트리밍 워크북 (write_only), 화면과 같은 구간 순서로 (항목, 값) 2열
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("명세")
+    ws.column_dimensions["A"].width = 42
+    ws.column_dimensions["B"].width = 48
+
+    def head(text, size=12):
+        c = WriteOnlyCell(ws, value=text)
+        c.font = Font(bold=True, size=size)
+        ws.append([c])
+
+    head("당월 수수료 명세", 14)
+    ws.append([f"설계사 {s['agent_id']} · 기준월 {s['month']} · 위임년월 {s['appointed']}"])
+    head("당월 수수료 요약")
+    for k, v in s["summary"]:
+        ws.append([k, v])
+    if s["settle_reasons"]:
+        ws.append(["＊ 정착보장수수료 미산출 이유", ", ".join(s["settle_reasons"])])
+    if s["init2_reasons"]:
+        ws.append(["＊ 초기정착수수료2 미산출 이유", ", ".join(s["init2_reasons"])])
+    head("익월 예상 수수료")
+    for k, v in s["next_month"]:
+        ws.append([k, v])
+    ws.append(["총합", s["total"]])
+    head("상품별 예상 수수료 계산")
+    for c in s["contracts"]:
+        ws.append([])
+        head(c["title"] + (" [전략건강]" if c["strategic"] else ""), 11)
+        ws.append(["월초 보험료", c["premium"]])
+        ws.append(["납입년도", c["pay_year"]])
+        for title, items in c["sections"]:
+            ws.append([title])
+            for k, v in items:
+                ws.append([k, v])
+    ws.append([])
+    head("지급조건", 11)
+    for c in s["conditions"]:
+        ws.append(["＊ " + c])
+    wb.save(path)
+
+# =========================
+# 일괄 생성 (batch.py 출력 → 설계사별 파일)
+#   pass 0: 설계사/계약 결과를 agent_id 해시로 샤드 분할 (parallel.shard_of, 청크 스트리밍)
+#   shard : 워커가 샤드 1개를 읽어 계약을 설계사별로 묶고 명세를 1건씩 바로 기록 (메모리 = 샤드 크기)
+# =========================
+_UNSAFE = re.compile(r"[^0-9A-Za-z가-힣._-]")
+
+def statement_path(out_dir: str, agent_id: str, fmt: str) -> str:
+    return os.path.join(out_dir, f"{_UNSAFE.sub('_', str(agent_id))}.{fmt}")
+
+def split_results(agents_path: str, contracts_path: str, workdir: str, shards: int, chunksize: int) -> list:
+    from batch import TableWriter, iter_table
+    from parallel import shard_of
+    parts = []
+    for kind, path in (("agents", agents_path), ("contracts", contracts_path)):
+        names = [os.path.join(workdir, f"{kind}_{i:04d}.csv") for i in range(shards)]
+        writers = [TableWriter(p) for p in names]
+        for chunk in iter_table(path, chunksize):
+            chunk["agent_id"] = chunk["agent_id"].astype(str)
+            shard = shard_of(chunk["agent_id"], shards)
+            for i in np.unique(shard):
+                writers[i].write(chunk[shard == i])
+        for w in writers:
+            w.close()
+        parts.append(names)
+    return list(zip(*parts))
+
+def render_shard(task) -> int:
+    agents_part, contracts_part, out_dir, fmt, month_label = task
+    html_template()  # 워커당 1회
+    if not os.path.getsize(agents_part):
+        return 0
+    agents = pd.read_csv(agents_part, dtype={"agent_id": str}, encoding="utf-8-sig")
+    if os.path.getsize(contracts_part):
+        contracts = pd.read_csv(contracts_part, dtype={"agent_id": str, "contract_id": str, "product": str, "type": str, "pay_year": str}, encoding="utf-8-sig")
+    else:
+        contracts = pd.DataFrame(columns=["agent_id"])
+    by_agent = {k: g.to_dict("records") for k, g in contracts.groupby("agent_id", sort=False)}
+    for a in agents.to_dict("records"):
+        write_statement(statement(a, by_agent.get(a["agent_id"], []), month_label), statement_path(out_dir, a["agent_id"], fmt), fmt)
+    return len(agents)
+
+def run_statements(agents_path: str, contracts_path: str, out_dir: str, fmt: str = "html", month_label: str = None,
+                   workers: int = None, shards: int = None, chunksize: int = 200_000, progress: bool = True) -> int:
+    from batch import Progress
+    check_format(fmt)
+    month_label = month_label or datetime.today().strftime("%Y-%m")
+    workers = workers or os.cpu_count() or 1
+    shards = shards or workers * 4
+    os.makedirs(out_dir, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix="statements-")
+    try:
+        parts = split_results(agents_path, contracts_path, tmp, shards, chunksize)
+        tasks = [(a, c, out_dir, fmt, month_label) for a, c in parts]
+        prog = Progress("statements", progress)
+        if workers == 1:
+            for t in tasks:
+                prog.update(render_shard(t))
+        else:
+            with ProcessPoolExecutor(workers) as pool:
+                for fut in as_completed([pool.submit(render_shard, t) for t in tasks]):
+                    prog.update(fut.result())
+        prog.done()
+        return prog.rows
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="batch.py 결과 → 설계사별 수수료 명세 (HTML/PDF/엑셀)")
+    p.add_argument("agents", help="batch.py 설계사 출력 (.csv/.parquet)")
+    p.add_argument("contracts", help="batch.py 계약 출력 (.csv/.parquet)")
+    p.add_argument("--out-dir", default="statements")
+    p.add_argument("--format", choices=STATEMENT_FORMATS, default="html")
+    p.add_argument("--month", help="명세 기준월 표기 YYYY-MM (기본: 이번 달)")
+    p.add_argument("--workers", type=int, default=0, help="프로세스 수 (0=전체 코어)")
+    p.add_argument("--shards", type=int, help="샤드 수 (기본: 워커 수 × 4)")
+    p.add_argument("--chunksize", type=int, default=200_000)
+    p.add_argument("--quiet", action="store_true")
+    return p
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    t0 = time.perf_counter()
+    n = run_statements(
+        args.agents, args.contracts, args.out_dir, args.format, args.month,
+        workers=args.workers or None, shards=args.shards, chunksize=args.chunksize, progress=not args.quiet,
+    )
+    print(f"{n:,} statements → {args.out_dir} ({time.perf_counter() - t0:,.1f}s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+import argparse
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from engine import AGENT_COLUMNS
+
+# =========================
+# 포트폴리오 저장소 (SQLite 파일 1개, 화면 워커 프로세스·배치가 같이 사용)
+#   portfolios: (기준월, 설계사) → 화면 입력값 (위임년월/표준활동/유지율/환수/직도입)
+#   contracts : (기준월, 설계사, seq) → 상품/유형/납기/월초 (+ 증권번호)
+#     두 테이블 모두 WITHOUT ROWID, 기본키 순서로 저장 → 설계사 1명 로드 = 기본키 범위 1회 스캔
+#     배치는 기준월 범위를 그대로 스캔 (원장 CSV와 같은 컬럼으로 청크 스트리밍)
+#   WAL + busy_timeout: 여러 프로세스가 동시에 읽고, 쓰기는 짧은 트랜잭션 1개씩
+#   연결은 스레드마다 1개 (Streamlit 세션 스레드)
+#   배치 원장 경로로 "portfolios.db#2025-08" 형식을 주면 해당 기준월 포트폴리오를 원장으로 사용
+# =========================
+STORE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+INPUT_COLUMNS = AGENT_COLUMNS[1:]  # year, month, std_activity, retention_*, refund_p, refund_amt, direct_recruits
+BUSY_TIMEOUT_MS = 30_000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS portfolios (
+    ym TEXT NOT NULL,
+    agent_id TEXT NOT NULL,
+    year INTEGER, month INTEGER, std_activity INTEGER,
+    retention_1st REAL, retention_13th REAL, retention_25th REAL,
+    refund_p INTEGER, refund_amt INTEGER, direct_recruits INTEGER,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (ym, agent_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS portfolios_agent ON portfolios (agent_id, ym);
+CREATE TABLE IF NOT EXISTS contracts (
+    ym TEXT NOT NULL,
+    agent_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    product TEXT NOT NULL,
+    type TEXT NOT NULL DEFAULT '',
+    pay_year TEXT NOT NULL DEFAULT '',
+    premium INTEGER NOT NULL DEFAULT 0,
+    contract_id TEXT,
+    PRIMARY KEY (ym, agent_id, seq)
+) WITHOUT ROWID;
+CREATE UNIQUE INDEX IF NOT EXISTS contracts_contract_id ON contracts (ym, agent_id, contract_id) WHERE contract_id IS NOT NULL;
+"""
+
+def month_key(value) -> str:
+    # datetime / "2025-08" / "202508" → "2025-08"
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m")
+    digits = "".join(ch for ch in str(value) if ch.isdigit())
+    if len(digits) < 6:
+        raise ValueError(f"기준월 형식이 아닙니다 (YYYY-MM): {value}")
+    return f"{digits[:4]}-{digits[4:6]}"
+
+def parse_store_ref(path: str):
+    # "portfolios.db#2025-08" → ("portfolios.db", "2025-08"), 저장소 경로가 아니면 None
+    file, _, ym = str(path).partition("#")
+    if not file.lower().endswith(STORE_SUFFIXES):
+        return None
+    if not ym:
+        raise ValueError(f"저장소를 원장으로 쓸 때는 기준월이 필요합니다: {file}#YYYY-MM")
+    return file, month_key(ym)
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+def _none(v):
+    # NaN/빈 값 → NULL, numpy 스칼라 → 파이썬 값
+    if v is None or (isinstance(v, float) and np.isnan(v)):
+        return None
+    return v.item() if isinstance(v, np.generic) else v
+
+class PortfolioStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as con:
+            con.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+            self._local.con = con
+        return con
+
+    def close(self):
+        con = getattr(self._local, "con", None)
+        if con is not None:
+            con.close()
+            self._local.con = None
+
+    # ── 화면: 설계사 1명 × 기준월
+    def load(self, agent_id: str, ym: str):
+        # → (입력값 dict 또는 None, [(seq, product, type, pay_year, premium), ...]) — 쿼리 1회
+        rows = self._conn().execute(
+            f"SELECT {', '.join('p.' + c for c in INPUT_COLUMNS)}, c.seq, c.product, c.type, c.pay_year, c.premium "
+            "FROM portfolios p LEFT JOIN contracts c ON c.ym = p.ym AND c.agent_id = p.agent_id "
+            "WHERE p.ym = ? AND p.agent_id = ? ORDER BY c.seq",
+            (month_key(ym), str(agent_id)),
+        ).fetchall()
+        if not rows:
+            return None, []
+        n = len(INPUT_COLUMNS)
+        inputs = {c: v for c, v in zip(INPUT_COLUMNS, rows[0][:n]) if v is not None}
+        if "std_activity" in inputs:
+            inputs["std_activity"] = bool(inputs["std_activity"])
+        return inputs, [r[n:] for r in rows if r[n] is not None]
+
+    def save(self, agent_id: str, ym: str, inputs: dict, entries) -> int:
+        # 포트폴리오 전체 교체 (트랜잭션 1개), entries는 id/product/type/pay_year/premium 키 접근
+        ym, agent_id = month_key(ym), str(agent_id)
+        values = [_none(inputs.get(c)) for c in INPUT_COLUMNS]
+        with self._conn() as con:
+            con.execute(
+                f"INSERT OR REPLACE INTO portfolios (ym, agent_id, {', '.join(INPUT_COLUMNS)}, updated_at) "
+                f"VALUES (?, ?, {', '.join('?' * len(INPUT_COLUMNS))}, ?)",
+                [ym, agent_id, *values, _now()],
+            )
+            con.execute("DELETE FROM contracts WHERE ym = ? AND agent_id = ?", (ym, agent_id))
+            con.executemany(
+                "INSERT INTO contracts (ym, agent_id, seq, product, type, pay_year, premium) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(ym, agent_id, int(e["id"]), e["product"], e["type"] or "", e["pay_year"] or "", int(e["premium"] or 0)) for e in entries],
+            )
+        return len(entries)
+
+    def months(self, agent_id: str) -> list:
+        # 설계사의 저장된 기준월 (최근 순)
+        rows = self._conn().execute("SELECT ym FROM portfolios WHERE agent_id = ? ORDER BY ym DESC", (str(agent_id),))
+        return [r[0] for r in rows]
+
+    def agents(self, ym: str) -> list:
+        rows = self._conn().execute("SELECT agent_id FROM portfolios WHERE ym = ? ORDER BY agent_id", (month_key(ym),))
+        return [r[0] for r in rows]
+
+    # ── 일괄: 원장 형식 프레임 (prepare_contracts 이후 컬럼명)
+    def upsert_ledger(self, df: pd.DataFrame, ym: str) -> int:
+        # 계약 추가, contract_id가 있으면 같은 계약은 갱신 / 설계사 입력 컬럼이 있으면 값이 있는 것만 갱신
+        ym = month_key(ym)
+        con = self._conn()
+        agents = df["agent_id"].astype(str)
+        base = dict(con.execute("SELECT agent_id, MAX(seq) FROM contracts WHERE ym = ? GROUP BY agent_id", (ym,)).fetchall())
+        seq = agents.map(base).fillna(0).astype(np.int64).to_numpy() + agents.groupby(agents, sort=False).cumcount().to_numpy() + 1
+        contract_id = [c or None for c in df["contract_id"]] if "contract_id" in df.columns else [None] * len(df)
+        contracts = zip(
+            agents, seq.tolist(), df["product"], df["type"], df["pay_year"], df["premium"].astype(np.int64).tolist(), contract_id,
+        )
+        inputs = _agent_inputs(df)
+        with con:
+            con.executemany(
+                f"INSERT INTO portfolios (ym, agent_id, {', '.join(INPUT_COLUMNS)}, updated_at) "
+                f"VALUES (?, ?, {', '.join('?' * len(INPUT_COLUMNS))}, ?) "
+                f"ON CONFLICT (ym, agent_id) DO UPDATE SET "
+                + ", ".join(f"{c} = COALESCE(excluded.{c}, {c})" for c in INPUT_COLUMNS) + ", updated_at = excluded.updated_at",
+                [(ym, a, *map(_none, row), _now()) for a, row in zip(inputs.index, inputs.itertuples(index=False))],
+            )
+            con.executemany(
+                "INSERT INTO contracts (ym, agent_id, seq, product, type, pay_year, premium, contract_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (ym, agent_id, contract_id) WHERE contract_id IS NOT NULL DO UPDATE SET "
+                "product = excluded.product, type = excluded.type, pay_year = excluded.pay_year, premium = excluded.premium",
+                ((ym, *row) for row in contracts),
+            )
+        return len(df)
+
+    def delete_month(self, ym: str, agent_ids=None):
+        ym = month_key(ym)
+        with self._conn() as con:
+            if agent_ids is None:
+                con.execute("DELETE FROM contracts WHERE ym = ?", (ym,))
+                con.execute("DELETE FROM portfolios WHERE ym = ?", (ym,))
+            else:
+                ids = [(ym, str(a)) for a in agent_ids]
+                con.executemany("DELETE FROM contracts WHERE ym = ? AND agent_id = ?", ids)
+                con.executemany("DELETE FROM portfolios WHERE ym = ? AND agent_id = ?", ids)
+
+    def iter_ledger(self, ym: str, chunksize: int):
+        # 기준월 전체를 배치 원장 형식(문자열 컬럼)으로 청크 스트리밍 — 설계사 입력값은 계약 행마다 반복 (CSV 원장과 동일)
+        cur = self._conn().execute(
+            "SELECT c.agent_id, printf('%04d%02d', p.year, p.month), CASE WHEN p.std_activity THEN 'Y' ELSE '' END, "
+            f"{', '.join(map(_sql_number, INPUT_COLUMNS[3:]))}, c.product, c.type, c.pay_year, c.premium, c.contract_id "
+            "FROM contracts c LEFT JOIN portfolios p ON p.ym = c.ym AND p.agent_id = c.agent_id "
+            "WHERE c.ym = ? ORDER BY c.agent_id, c.seq",
+            (month_key(ym),),
+        )
+        columns = ["agent_id", "위임년월", "std_activity"] + INPUT_COLUMNS[3:] + ["product", "type", "pay_year", "premium", "contract_id"]
+        try:
+            while True:
+                rows = cur.fetchmany(chunksize)
+                if not rows:
+                    break
+                df = pd.DataFrame.from_records(rows, columns=columns)
+                df = df.drop(columns=[c for c in columns[2:] + ["contract_id"] if c in df.columns and df[c].isna().all()])  # 없는 입력은 컬럼 생략 (CSV와 같은 기본값)
+                yield df.astype(object).where(df.notna(), "").astype(str)
+        finally:
+            cur.close()
+
+def _sql_number(col: str) -> str:
+    # 정수 값은 정수 문자열로 ("85.0" → "85", CSV 원장과 같은 dtype 추론)
+    return f"CASE WHEN p.{col} = CAST(p.{col} AS INTEGER) THEN CAST(p.{col} AS INTEGER) ELSE p.{col} END"
+
+def _agent_inputs(df: pd.DataFrame) -> pd.DataFrame:
+    # 설계사별 첫 행의 입력 컬럼 (없거나 빈 값은 NULL → 기존 값 유지)
+    first = df.drop_duplicates("agent_id")
+    first.index = first["agent_id"].astype(str)
+    out = pd.DataFrame(index=first.index)
+    if "위임년월" in first.columns:
+        ym = first["위임년월"].astype(str).str.replace(r"[^0-9]", "", regex=True)
+        out["year"] = pd.to_numeric(ym.str[:4], errors="coerce")
+        out["month"] = pd.to_numeric(ym.str[4:6], errors="coerce")
+    for col in INPUT_COLUMNS:
+        if col in ("year", "month") and col in out.columns:
+            continue
+        if col not in first.columns:
+            out[col] = None
+        elif col == "std_activity":
+            s = first[col].astype(str).str.upper().str.strip()
+            out[col] = np.where(s == "", None, s.isin(["Y", "YES", "1", "TRUE", "O"]).astype(object))
+        else:
+            out[col] = pd.to_numeric(first[col].astype(str).str.replace(r"[^0-9.\-]", "", regex=True), errors="coerce")
+    return out[INPUT_COLUMNS].astype(object)
+
+# =========================
+# CLI: 원장 CSV → 저장소 (월 1회 적재) / 저장소 → CSV
+# =========================
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="포트폴리오 저장소 (SQLite) 적재/내보내기")
+    p.add_argument("--db", default=os.environ.get("COMMISSION_STORE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "portfolios.db")))
+    sub = p.add_subparsers(dest="cmd", required=True)
+    imp = sub.add_parser("import", help="원장 CSV → 저장소 (contract_id가 있으면 같은 계약은 갱신)")
+    imp.add_argument("ledger")
+    imp.add_argument("--month", required=True, help="기준월 YYYY-MM")
+    imp.add_argument("--replace", action="store_true", help="해당 기준월 기존 포트폴리오를 지우고 적재")
+    imp.add_argument("--chunksize", type=int, default=200_000)
+    exp = sub.add_parser("export", help="저장소 → 원장 CSV/Parquet")
+    exp.add_argument("out")
+    exp.add_argument("--month", required=True, help="기준월 YYYY-MM")
+    exp.add_argument("--chunksize", type=int, default=200_000)
+    return p
+
+def main(argv=None):
+    from batch import Progress, TableWriter, iter_ledger, prepare_contracts
+    args = build_parser().parse_args(argv)
+    store = PortfolioStore(args.db)
+    if args.cmd == "import":
+        if args.replace:
+            store.delete_month(args.month)
+        prog = Progress("import")
+        for chunk in iter_ledger(args.ledger, args.chunksize):
+            prog.update(store.upsert_ledger(prepare_contracts(chunk), args.month))
+        prog.done()
+    else:
+        writer = TableWriter(args.out)
+        for chunk in store.iter_ledger(args.month, args.chunksize):
+            writer.write(chunk)
+        writer.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from master import WatchedStore, to_days, today_days
+
+# =========================
+# 구간(breakpoint) 테이블
+#   breaks 오름차순, values = len(breaks) + 1
+#   closed "ge": x >= b 이면 다음 구간 / "gt": x > b 이면 다음 구간 (구간별 지정 가능)
+#   스칼라/배열 모두 searchsorted로 평가
+# =========================
+DEFAULT_TIERS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "tier_tables.json")
+
+class StepTable:
+    def __init__(self, breaks, values, closed="ge"):
+        self.breaks = np.asarray(breaks, dtype=float)
+        self.values = np.asarray([np.nan if v is None else v for v in values], dtype=float)
+        if len(self.values) != len(self.breaks) + 1:
+            raise ValueError("values 개수는 breaks 개수 + 1 이어야 합니다.")
+        if np.any(np.diff(self.breaks) <= 0):
+            raise ValueError("breaks는 오름차순이어야 합니다.")
+        closed = [closed] * len(self.breaks) if isinstance(closed, str) else list(closed)
+        if len(closed) != len(self.breaks) or set(closed) - {"ge", "gt"}:
+            raise ValueError("closed는 'ge' 또는 'gt' (구간별 목록 가능)입니다.")
+        self.ge = np.array([c == "ge" for c in closed], dtype=bool)
+
+    @classmethod
+    def from_config(cls, cfg: dict):
+        return cls(cfg["breaks"], cfg["values"], cfg.get("closed", "ge"))
+
+    def index(self, x) -> np.ndarray:
+        x = np.asarray(x, dtype=float)
+        lo = np.searchsorted(self.breaks, x, side="left")
+        hi = np.searchsorted(self.breaks, x, side="right")
+        if len(self.ge) == 0:
+            return lo
+        return lo + ((hi > lo) & self.ge[np.clip(lo, 0, len(self.ge) - 1)])
+
+    def __call__(self, x) -> np.ndarray:
+        return self.values[self.index(x)]
+
+class GridTable:
+    # 2차원 구간 테이블 (행 구간 × 열 구간)
+    def __init__(self, rows: StepTable, cols: StepTable, values):
+        self.rows, self.cols = rows, cols
+        self.values = np.asarray(values, dtype=float)
+        if self.values.shape != (len(rows.values), len(cols.values)):
+            raise ValueError("values 크기가 행/열 구간 수와 맞지 않습니다.")
+
+    @classmethod
+    def from_config(cls, cfg: dict):
+        def _axis(a):
+            return StepTable(a["breaks"], list(range(len(a["breaks"]) + 1)), a.get("closed", "ge"))
+        return cls(_axis(cfg["rows"]), _axis(cfg["cols"]), cfg["values"])
+
+    def __call__(self, row_x, col_x) -> np.ndarray:
+        return self.values[self.rows.index(row_x), self.cols.index(col_x)]
+
+# =========================
+# 수수료 규정 1개 버전
+# =========================
+class TierSet:
+    def __init__(self, tables: dict, label: str = ""):
+        self.label = label
+        self.version = hashlib.sha256(json.dumps(tables, sort_keys=True).encode("utf-8")).hexdigest()[:16]  # 캐시 무효화 키
+        self.std_retention_table = StepTable.from_config(tables["std_retention"])
+        self.retention_factor_table = StepTable.from_config(tables["retention_factor"])
+        self.performance_rate_table = GridTable.from_config(tables["performance_rate"])
+        self.strategic_count = StepTable.from_config(tables["strategic_count"])
+        self.per_unit_bonus = StepTable.from_config(tables["per_unit_bonus"])
+        self.direct_recruit_bonus = StepTable.from_config(tables["direct_recruit_bonus"])
+        self.guarantee_base = StepTable.from_config(tables["guarantee_base"])
+        self.guarantee_add = StepTable.from_config(tables["guarantee_add"])
+        init2 = tables["init2"]
+        self.rmax = float(init2["rmax"])
+        self.init2_min_eff = float(init2["min_eff"])
+        self.init2_max_months = int(init2["max_months"])
+
+    def std_retention(self, months) -> np.ndarray:
+        # 해당사항없음은 NaN
+        return self.std_retention_table(months)
+
+    def retention_factor(self, user_rate, standard_rate) -> np.ndarray:
+        # 기준 유지율 NaN → 1.0
+        u = np.asarray(user_rate, dtype=float)
+        s = np.asarray(standard_rate, dtype=float)
+        return np.where(np.isnan(s), 1.0, self.retention_factor_table(np.where(np.isnan(s), 0.0, u - s)))
+
+    def performance_rate(self, months, eff) -> np.ndarray:
+        return self.performance_rate_table(months, eff)
+
+# =========================
+# 버전 묶음 (적용시작일별)
+# =========================
+class TierTables:
+    def __init__(self, config: dict, version: str):
+        self.version = version
+        versions = config["versions"]
+        if not versions:
+            raise ValueError("수수료 규정 버전이 없습니다.")
+        days = to_days([v["effective_from"] for v in versions]).astype(np.int64)
+        order = np.argsort(days, kind="stable")
+        self.effective_from = days[order]
+        self.sets = [TierSet(versions[i]["tables"], versions[i].get("label", "")) for i in order]
+
+    def at(self, day: int = None) -> TierSet:
+        # day(1970-01-01 기준 일수, 기본 오늘) 시점에 적용되는 버전, 이전이면 가장 오래된 버전
+        day = today_days() if day is None else day
+        i = int(np.searchsorted(self.effective_from, day, side="right")) - 1
+        return self.sets[max(i, 0)]
+
+def load_tier_tables(path: str = DEFAULT_TIERS_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        data_bytes = f.read()
+    config = json.loads(data_bytes.decode("utf-8-sig"))
+    return TierTables(config, hashlib.sha256(data_bytes).hexdigest()[:16])
+
+class TierStore(WatchedStore):
+    loader = staticmethod(load_tier_tables)
+    name = "tiers"
+
+_DEFAULT_STORE = None
+
+def default_tiers() -> TierTables:
+    # 프로세스 공용 (파일 변경 시 호출 시점에 재로드)
+    global _DEFAULT_STORE
+    if _DEFAULT_STORE is None:
+        _DEFAULT_STORE = TierStore(DEFAULT_TIERS_PATH)
+    else:
+        _DEFAULT_STORE.refresh()
+    return _DEFAULT_STORE.get()